@@ -0,0 +1,73 @@
+from camera import *
+from servos import Servo, SPEED_SCALE
+import gc, time
+
+def bench_cam(name: str, thresholds, frames: int = 100, **kwargs) -> None:
+    """
+    Measure the blob detection frame rate and memory use of a Cam mode.
+
+    Args:
+        name (str): Label printed with the results.
+        thresholds (list): Thresholds for the mode (LAB or grayscale).
+        frames (int): Number of frames to time.
+        kwargs: Extra arguments passed to Cam (grayscale, channel).
+    """
+    cam = Cam(thresholds, **kwargs)
+    gc.collect()
+    mem_before = gc.mem_free()
+
+    blobs, img = cam.get_blobs()
+    frame_bytes = img.size()
+
+    t_start = time.ticks_ms()
+    for i in range(frames):
+        blobs, img = cam.get_blobs()
+    t_total = time.ticks_diff(time.ticks_ms(), t_start)
+
+    print(name, 'FPS:', 1000 * frames / t_total,
+          'frame (bytes):', frame_bytes,
+          'heap used (bytes):', mem_before - gc.mem_free())
+
+
+def bench_servo(n: int = 1000) -> None:
+    """
+    Compare the float and integer (look up table) Servo command paths, with
+    the I2C write and with the write stubbed out to time the computation alone.
+
+    Args:
+        n (int): Number of commands timed per path.
+    """
+    servo = Servo()
+
+    paths = [('set_angle', lambda i: servo.set_angle((i % 100 - 50) * 0.5)),
+             ('set_angle_i', lambda i: servo.set_angle_i((i % 100 - 50) * 5)),
+             ('set_speed', lambda i: servo.set_speed((i % 100 - 50) * 0.02, 0.5)),
+             ('set_speed_i', lambda i: servo.set_speed_i((i % 100 - 50) * 10, 250)),
+             ('set_differential_drive', lambda i: servo.set_differential_drive(0.5, (i % 100 - 50) * 0.02)),
+             ('set_differential_drive_i', lambda i: servo.set_differential_drive_i(250, (i % 100 - 50) * 10))]
+
+    for label, write in (('with I2C', None), ('compute only', lambda idx, value: None)):
+        if write is not None:
+            servo._write_duty = write
+
+        for name, command in paths:
+            gc.collect()
+            t_start = time.ticks_us()
+            for i in range(n):
+                command(i)
+            t_total = time.ticks_diff(time.ticks_us(), t_start)
+
+            print(name, label, 'us per command:', t_total / n)
+
+    del servo._write_duty
+    servo.set_speed_i(0, 0)
+
+
+if __name__ == "__main__":
+    # Compare the RGB565 path with the 8-bit fast paths on the same scene
+    bench_cam('RGB565', [(45, 55, 40, 55, 15, 35)])
+    bench_cam('GRAYSCALE', [(200, 255)], grayscale=True)
+    bench_cam('RED CHANNEL', [(200, 255)], channel=0)
+
+    # Float versus integer servo commands
+    bench_servo()
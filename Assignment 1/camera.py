@@ -1,4 +1,8 @@
 import sensor, time
+import fastboot
+from recorder import Recorder
+from array import array
+from math import atan, degrees, radians, tan
 
 class Cam(object):
     """
@@ -7,20 +11,57 @@ class Cam(object):
     thresholds for blob detection.
     """
 
-    def __init__(self, thresholds, gain = 25):
+    def __init__(self, thresholds, gain = 25, grayscale = False, channel = None, fast_boot = False,
+                 adaptive = False, gate = False):
         """
         Initialise the Cam object by setting up camera parameters and
         configuring color thresholds.
+
+        For targets separable by brightness, or by a single colour channel, the
+        8-bit modes avoid the LAB conversion find_blobs does on RGB565 images.
+        Thresholds are then (Min, Max) grayscale tuples.
+
+        Args:
+            thresholds (list): Colour thresholds used to find blobs.
+            gain (float): Fixed sensor gain (dB).
+            grayscale (bool): Capture GRAYSCALE (luminance) images, halving the frame size.
+            channel (int): Reduce each RGB565 image in place to one channel (0 R, 1 G, 2 B).
+            fast_boot (bool): Reapply the gain and white balance saved in the fast boot
+                profile instead of waiting 2s for the sensor to settle. The values are
+                saved once locked after the first full warm-up. Auto exposure stays on
+                in both cases.
+            adaptive (bool): Let each threshold follow slow lighting changes, see update_thresholds().
+            gate (bool): Skip blob detection on frames that have not changed, see scene_changed().
         """
+        self.grayscale = grayscale
+        self.channel = channel
+
         # Configure camera settings
         sensor.reset()
-        sensor.set_pixformat(sensor.RGB565)
+        sensor.set_pixformat(sensor.GRAYSCALE if grayscale else sensor.RGB565)
         sensor.set_framesize(sensor.VGA)   # Set frame size to 640x480
-        sensor.skip_frames(time=2000)   # Allow the camera to adjust to light levels
 
-        # Both must be turned off for color tracking
-        sensor.set_auto_gain(False, gain_db = gain)
-        sensor.set_auto_whitebal(False)
+        profile = fastboot.load().get('cam') if fast_boot else None
+
+        if profile and profile['gain'] == gain and profile['grayscale'] == grayscale:
+            # Reapply the locked values saved after a previous warm-up
+            sensor.set_auto_gain(False, gain_db = profile['gain_db'])
+            sensor.set_auto_whitebal(False, rgb_gain_db = tuple(profile['rgb_gain_db']))
+            sensor.skip_frames(2)   # Let the new register values take effect
+        else:
+            sensor.skip_frames(time=2000)   # Allow the camera to adjust to light levels
+
+            # Both must be turned off for color tracking
+            sensor.set_auto_gain(False, gain_db = gain)
+            sensor.set_auto_whitebal(False)
+
+            if fast_boot:
+                # Save the locked values once they have taken effect
+                sensor.skip_frames(2)
+                fastboot.save('cam', {'gain': gain,
+                                      'grayscale': grayscale,
+                                      'gain_db': sensor.get_gain_db(),
+                                      'rgb_gain_db': sensor.get_rgb_gain_db()})
 
         # Initialise sensor properties
         self.w_centre = sensor.width()/2
@@ -28,11 +69,161 @@ class Cam(object):
         self.h_fov = 70.8
         self.v_fov = 55.6
         self.camera_elevation_angle = -11
+        self.camera_height = 8.0   # Height (cm) of the lens above the ground; EDIT as required
         self.clock = time.clock()
+        self.t_capture = 0
+        self.recorder = None
+
+        # Pixel to bearing and ground distance look up tables
+        self.build_luts()
 
         # Define color tracking thresholds for Red, Green, Blue, and Yellow colors
+        # Adaptive thresholds: smoothing weight, largest shift from the baseline per
+        # channel, and consecutive misses before a threshold is reset to its baseline
+        self.adaptive = adaptive
+        self.adapt_alpha = 0.1
+        self.adapt_max_drift = 12
+        self.adapt_reset_after = 10
+        self.adapt_min_pixels = 100
+
         # Thresholds are in the order of (L Min, L Max, A Min, A Max, B Min, B Max)
-        self.thresholds = thresholds
+        self.set_baseline(thresholds)
+
+        # Motion gating: signature decimation, largest block difference below which
+        # a frame counts as unchanged, and frames after which detection is forced
+        self.gate = gate
+        self.gate_div = 16
+        self.gate_threshold = 3
+        self.gate_force_every = 10
+        self.reset_gate()
+
+
+    def set_framesize(self, framesize) -> None:
+        """
+        Change the sensor frame size and rebuild the look up tables for it.
+
+        Args:
+            framesize (int): Sensor frame size, e.g. sensor.QVGA.
+        """
+        sensor.set_framesize(framesize)
+        self.build_luts()
+
+
+    def build_luts(self) -> None:
+        """
+        Build the per-column bearing and per-row ground distance tables for the
+        current frame size, so controllers use a look up instead of float maths.
+
+        Bearings use the pinhole model (atan), the linear pixel/width*fov mapping
+        is only exact at the centre and edges of the frame.
+        """
+        width = sensor.width()
+        height = sensor.height()
+        self.w_centre = width/2
+        self.h_centre = height/2
+
+        # Focal lengths in pixels from the fields of view
+        fx = self.w_centre/tan(radians(self.h_fov/2))
+        fy = self.h_centre/tan(radians(self.v_fov/2))
+
+        # Bearing (deg) of each column wrt. the camera axis, positive to the left
+        self.col_bearing = array('f', [-degrees(atan((x - self.w_centre)/fx)) for x in range(width)])
+
+        # Ground distance (cm) of each row, -1 at or above the horizon
+        self.row_distance = array('f', [0] * height)
+        for y in range(height):
+            depression = -self.camera_elevation_angle + degrees(atan((y - self.h_centre)/fy))
+            if depression > 0.5:
+                self.row_distance[y] = self.camera_height/tan(radians(depression))
+            else:
+                self.row_distance[y] = -1
+
+
+    def bearing(self, x: int) -> float:
+        """
+        Bearing of an image column wrt. the camera axis.
+
+        Args:
+            x (int): Image column, e.g. blob.cx().
+
+        Returns:
+            float: Bearing (deg), positive to the left.
+        """
+        return self.col_bearing[max(min(x, len(self.col_bearing) - 1), 0)]
+
+
+    def ground_distance(self, y: int) -> float:
+        """
+        Distance along the ground to the point imaged at a row, assuming a flat floor.
+
+        Args:
+            y (int): Image row, e.g. the bottom edge of a blob, blob.y() + blob.h().
+
+        Returns:
+            float: Distance (cm), -1 if the row is at or above the horizon.
+        """
+        return self.row_distance[max(min(y, len(self.row_distance) - 1), 0)]
+
+
+    def start_recording(self, path: str, fmt: str = 'jpeg', servo=None, **kwargs) -> Recorder:
+        """
+        Start recording every captured frame to a session directory on the SD card.
+        Call self.recorder.flush() regularly, outside the control path, to write the frames.
+
+        Args:
+            path (str): Session directory.
+            fmt (str): 'jpeg' or 'raw'.
+            servo (Servo): Servo whose pan angle and wheel speeds are stored with each frame.
+            kwargs: Extra Recorder arguments (quality, slots, slot_size, chunk).
+
+        Returns:
+            Recorder: The recorder, also available as self.recorder.
+
+        Raises:
+            ValueError: If raw frames of the current frame size are over recorder.RAW_LIMIT.
+        """
+        meta = {'pixformat': 'grayscale' if self.grayscale else 'rgb565',
+                'channel': self.channel,
+                'thresholds': self.thresholds,
+                'h_fov': self.h_fov,
+                'v_fov': self.v_fov,
+                'camera_elevation_angle': self.camera_elevation_angle,
+                'camera_height': self.camera_height}
+        if fmt == 'raw':
+            kwargs.setdefault('frame_size', sensor.width() * sensor.height() * (1 if self.grayscale else 2))
+        self.recorder = Recorder(path, fmt, servo=servo, meta=meta, **kwargs)
+
+        return self.recorder
+
+
+    def stop_recording(self) -> None:
+        """
+        Write the remaining frames and close the recording session.
+        """
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+
+    def snapshot(self):
+        """
+        Capture an image, recording the capture time in self.t_capture (us).
+        In channel mode the image is reduced to the selected channel in place.
+
+        Returns:
+            img (image): Captured image.
+        """
+        img = sensor.snapshot()
+        self.t_capture = time.ticks_us()
+
+        # Record the frame as captured, before any in place processing
+        if self.recorder is not None:
+            self.recorder.add(img, self.t_capture)
+
+        if self.channel is not None:
+            img.to_grayscale(rgb_channel=self.channel)
+
+        return img
 
 
     def get_blobs(self) -> tuple:
@@ -43,13 +234,104 @@ class Cam(object):
             blobs (list): List of detected blobs.
             img (image): Captured image used to find blobs.
         """
-        img = sensor.snapshot()
+        img = self.snapshot()
 
+        # Reuse the previous result while the scene is unchanged
+        if self.gate and not self.scene_changed(img):
+            return self.last_blobs, img
+
+        t_start = time.ticks_us()
         blobs = img.find_blobs(self.thresholds,pixels_threshold=60,area_threshold=60)
+        self.detect_us += time.ticks_diff(time.ticks_us(), t_start)
+        self.detections += 1
+        self.last_blobs = blobs
 
         return blobs, img
 
 
+    def reset_gate(self) -> None:
+        """
+        Forget the reference signature and clear the gating statistics.
+        The next frame always runs detection.
+        """
+        self.invalidate_blobs()
+        self.gate_skipped = 0
+        self.gate_forced = 0
+        self.gate_us = 0
+        self.detections = 0
+        self.detect_us = 0
+        self.frames_since_detect = 0
+
+
+    def scene_changed(self, img) -> bool:
+        """
+        Compare a heavily decimated signature of the frame with the signature of
+        the last frame detection ran on, so slow drift adds up until it counts as
+        a change instead of staying under the threshold frame to frame. The new
+        signature is differenced in place, so a skipped frame costs one small
+        mean_pooled image and no full resolution work. The largest block
+        difference is used rather than the mean, so a small target moving in a
+        still scene still counts as a change.
+
+        Args:
+            img (image): Captured image.
+
+        Returns:
+            bool: True if detection should run: a block difference reached
+                gate_threshold, there is no previous signature, or detection
+                was skipped for gate_force_every frames.
+        """
+        t_start = time.ticks_us()
+
+        signature = img.mean_pooled(self.gate_div, self.gate_div)
+        reference = self.signature
+
+        changed = True
+        if reference is not None and self.frames_since_detect < self.gate_force_every:
+            changed = signature.difference(reference).get_statistics().max() >= self.gate_threshold
+            if changed:
+                # The signature was overwritten by the difference, take it again as the new reference
+                signature = img.mean_pooled(self.gate_div, self.gate_div)
+        elif reference is not None:
+            self.gate_forced += 1
+
+        if changed:
+            self.signature = signature
+            self.frames_since_detect = 0
+        else:
+            self.frames_since_detect += 1
+            self.gate_skipped += 1
+
+        self.gate_us += time.ticks_diff(time.ticks_us(), t_start)
+
+        return changed
+
+
+    def invalidate_blobs(self) -> None:
+        """
+        Drop the blobs reused by gating and the reference signature, so the
+        next frame runs detection, e.g. after the thresholds change.
+        """
+        self.signature = None
+        self.last_blobs = []
+
+
+    def gate_stats(self) -> dict:
+        """
+        Returns:
+            dict: Detections run and skipped, forced detections, the mean detection
+                time, the gating overhead and the estimated detection time saved (ms).
+        """
+        detect_avg_us = self.detect_us / self.detections if self.detections else 0
+
+        return {'detections': self.detections,
+                'skipped': self.gate_skipped,
+                'forced': self.gate_forced,
+                'detect_avg_us': detect_avg_us,
+                'gate_ms': self.gate_us / 1000,
+                'saved_ms': (self.gate_skipped * detect_avg_us - self.gate_us) / 1000}
+
+
     def get_blobs_bottom(self) -> tuple:
         """
         Capture an image and detect colour blobs based on predefined thresholds.
@@ -59,7 +341,7 @@ class Cam(object):
             blobs (list): List of detected blobs.
             img (image): Captured image used to find blobs.
         """
-        img = sensor.snapshot()
+        img = self.snapshot()
 
         blobs = img.find_blobs(self.thresholds,pixels_threshold=150,area_threshold=150,
                                roi=(1,int(sensor.height()/3),
@@ -68,6 +350,321 @@ class Cam(object):
         return blobs, img
 
 
+    def get_line_strips(self, n_strips: int = 3, strip_h: int = 20) -> list:
+        """
+        Build evenly spaced horizontal strip ROIs across the bottom 2/3 of the image.
+
+        Args:
+            n_strips (int): Number of strips.
+            strip_h (int): Height of each strip in pixels.
+
+        Returns:
+            strips (list): ROIs (x, y, w, h) ordered from the bottom of the image up.
+        """
+        top = int(sensor.height()/3)
+        spacing = (sensor.height() - top - strip_h) // max(n_strips - 1, 1)
+
+        return [(0, sensor.height() - strip_h - i*spacing, sensor.width(), strip_h)
+                for i in range(n_strips)]
+
+
+    def get_strip_centroids(self, threshold_idx: int, strips: list) -> tuple:
+        """
+        Capture an image and find the line centroid in each strip, only
+        thresholding pixels inside the strips.
+
+        Args:
+            threshold_idx (int): Index along self.thresholds of the line colour.
+            strips (list): ROIs from get_line_strips.
+
+        Returns:
+            centroids (list): x centroid of the line in each strip, None where not found.
+            img (image): Captured image used to find the line.
+        """
+        img = self.snapshot()
+
+        threshold = [self.thresholds[threshold_idx]]
+        centroids = []
+
+        for roi in strips:
+            blobs = img.find_blobs(threshold, roi=roi, pixels_threshold=20,
+                                   area_threshold=20, merge=True)
+            big_blob = self.get_biggest_blob(blobs)
+            centroids.append(big_blob.cx() if big_blob is not None else None)
+
+        return centroids, img
+
+
+    def get_blobs_roi(self, roi: tuple, stride: int = 4) -> tuple:
+        """
+        Capture an image and detect colour blobs only inside a region of interest,
+        with a coarse stride. A low cost search used while looking for a lost target.
+
+        Args:
+            roi (tuple): Region of interest (x, y, w, h).
+            stride (int): x and y stride between the pixels tested.
+
+        Returns:
+            blobs (list): List of detected blobs.
+            img (image): Captured image used to find blobs.
+        """
+        return self.get_blobs_rois([roi], stride)
+
+
+    def column_at(self, bearing: float) -> int:
+        """
+        Find the first column with a bearing at or below a given bearing.
+
+        Args:
+            bearing (float): Bearing (deg) wrt. the camera axis, positive to the left.
+
+        Returns:
+            int: Column index, sensor.width() if every column is to the left of the bearing.
+        """
+        lo = 0
+        hi = len(self.col_bearing)
+
+        # Binary search, the bearings decrease from left to right
+        while lo < hi:
+            mid = (lo + hi)//2
+            if self.col_bearing[mid] > bearing:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+
+    def exposed_spans(self, pan: float, covered: list) -> list:
+        """
+        Ranges of bearings in the view at a given pan angle that have not been searched yet.
+
+        Args:
+            pan (float): Pan angle (deg) the image is taken at.
+            covered (list): Searched (lo, hi) bearing ranges (deg) wrt. the heading, sorted and disjoint.
+
+        Returns:
+            list: (lo, hi) bearing ranges (deg) wrt. the heading, from right to left.
+        """
+        half_fov = self.h_fov/2
+        lo = pan - half_fov
+        hi = pan + half_fov
+        spans = []
+
+        for c_lo, c_hi in covered:
+            if c_hi <= lo:
+                continue
+            if c_lo >= hi:
+                break
+            if c_lo > lo:
+                spans.append((lo, c_lo))
+            lo = max(lo, c_hi)
+
+        if lo < hi:
+            spans.append((lo, hi))
+
+        return spans
+
+
+    def get_exposed_rois(self, pan: float, covered: list) -> list:
+        """
+        Regions of the image, at a given pan angle, outside the bearings that
+        have already been searched. There is one region per unsearched gap, so
+        a view reaching past both ends of the searched range gets both strips.
+
+        Args:
+            pan (float): Pan angle (deg) the image is taken at.
+            covered (list): Searched (lo, hi) bearing ranges (deg) wrt. the heading, sorted and disjoint.
+
+        Returns:
+            list: Regions of interest (x, y, w, h), empty if the whole view has been searched.
+        """
+        width = sensor.width()
+        height = sensor.height()
+        half_fov = self.h_fov/2
+        rois = []
+
+        for lo, hi in self.exposed_spans(pan, covered):
+            # Bearings decrease from left to right, spans reaching the view edges include the edge columns
+            x_start = 0 if hi >= pan + half_fov else min(self.column_at(hi - pan), width - 1)
+            x_end = width if lo <= pan - half_fov else max(min(self.column_at(lo - pan), width), x_start + 1)
+            rois.append((x_start, 0, x_end - x_start, height))
+
+        return rois
+
+
+    def add_covered(self, covered: list, lo: float, hi: float) -> list:
+        """
+        Add a searched range of bearings, merging it with the ranges it overlaps.
+
+        Args:
+            covered (list): Searched (lo, hi) bearing ranges (deg), sorted and disjoint.
+            lo (float): Lowest (rightmost) bearing (deg) searched.
+            hi (float): Highest (leftmost) bearing (deg) searched.
+
+        Returns:
+            list: The searched ranges including the new one, sorted and disjoint.
+        """
+        merged = []
+        placed = False
+
+        for c_lo, c_hi in covered:
+            if c_hi < lo:
+                merged.append((c_lo, c_hi))
+            elif c_lo > hi:
+                if not placed:
+                    merged.append((lo, hi))
+                    placed = True
+                merged.append((c_lo, c_hi))
+            else:
+                lo = min(lo, c_lo)
+                hi = max(hi, c_hi)
+
+        if not placed:
+            merged.append((lo, hi))
+
+        return merged
+
+
+    def get_blobs_rois(self, rois: list, stride: int = 4) -> tuple:
+        """
+        Capture an image and detect colour blobs only inside some regions of
+        interest, with a coarse stride. A low cost search used while looking for a lost target.
+
+        Args:
+            rois (list): Regions of interest (x, y, w, h).
+            stride (int): x and y stride between the pixels tested.
+
+        Returns:
+            blobs (list): List of detected blobs, from every region.
+            img (image): Captured image used to find blobs.
+        """
+        img = self.snapshot()
+
+        blobs = []
+        for roi in rois:
+            blobs.extend(img.find_blobs(self.thresholds,pixels_threshold=60,area_threshold=60,
+                                        roi=roi,x_stride=stride,y_stride=stride))
+
+        return blobs, img
+
+
+    def set_baseline(self, thresholds) -> None:
+        """
+        Set the baseline thresholds the adaptive mode drifts from, and reset to them.
+
+        Args:
+            thresholds (list): Colour thresholds used to find blobs.
+        """
+        self.baseline = [tuple(t) for t in thresholds]
+        self.thresholds = list(self.baseline)
+
+        self._set_gates()
+        self.adapt_offsets = [[0.0] * (len(t) // 2) for t in self.baseline]
+        self.adapt_misses = [0] * len(self.baseline)
+
+        self.adapt_updates = 0
+        self.adapt_lost = 0
+        self.adapt_resets = 0
+
+        # Blobs found with the previous thresholds must not be reused
+        self.invalidate_blobs()
+
+
+    def reset_thresholds(self) -> None:
+        """
+        Return every threshold to its baseline.
+        """
+        for idx in range(len(self.baseline)):
+            self._reset_threshold(idx)
+
+
+    def update_thresholds(self, img, blob, threshold_idx: int) -> None:
+        """
+        Adaptive mode: move a threshold towards the colour of the blob tracked
+        with it. The statistics only cover the blob bounding box, so the cost is
+        small next to find_blobs. The shift from the baseline is smoothed and
+        bounded, and after adapt_reset_after consecutive misses the threshold
+        falls back to its baseline. Does nothing unless self.adaptive is set.
+
+        Args:
+            img (image): Image the blob was found in.
+            blob (blob): Tracked blob, None or another colour if the target was not found.
+            threshold_idx (int): Index along self.thresholds of the tracked colour.
+        """
+        if not self.adaptive:
+            return
+
+        if not self.blob_matches(blob, threshold_idx):
+            self.adapt_lost += 1
+            self.adapt_misses[threshold_idx] += 1
+            if self.adapt_misses[threshold_idx] == self.adapt_reset_after:
+                self._reset_threshold(threshold_idx)
+                self.adapt_resets += 1
+            return
+
+        self.adapt_misses[threshold_idx] = 0
+        if blob.pixels() < self.adapt_min_pixels:
+            return
+
+        # The gates follow changes to adapt_max_drift
+        if self.adapt_gates_drift != self.adapt_max_drift:
+            self._set_gates()
+
+        stats = img.get_statistics(thresholds=self.adapt_gates[threshold_idx], roi=blob.rect())
+        offsets = self.adapt_offsets[threshold_idx]
+        base = self.baseline[threshold_idx]
+        d = self.adapt_max_drift
+
+        if len(offsets) == 1:
+            means = (stats.mean(),)
+        else:
+            means = (stats.l_mean(), stats.a_mean(), stats.b_mean())
+
+        # Smoothed shift of each channel towards the blob mean, bounded to the drift limit
+        for ch in range(len(offsets)):
+            target = means[ch] - (base[2 * ch] + base[2 * ch + 1]) / 2
+            target = max(min(target, d), -d)
+            offsets[ch] += self.adapt_alpha * (target - offsets[ch])
+
+        threshold = tuple(base[i] + int(round(offsets[i // 2])) for i in range(len(base)))
+        if threshold != self.thresholds[threshold_idx]:
+            self.thresholds[threshold_idx] = threshold
+            self.invalidate_blobs()
+        self.adapt_updates += 1
+
+
+    def adapt_stats(self) -> dict:
+        """
+        Returns:
+            dict: Adaptive updates, frames the tracked colour was lost, resets to
+                the baseline, and the current shift of each threshold.
+        """
+        return {'updates': self.adapt_updates,
+                'lost': self.adapt_lost,
+                'resets': self.adapt_resets,
+                'offsets': [[round(o, 1) for o in offsets] for offsets in self.adapt_offsets]}
+
+
+    def _set_gates(self) -> None:
+        """
+        Set the pixels counted by the statistics: each baseline widened by the largest drift.
+        """
+        d = self.adapt_max_drift
+        self.adapt_gates = [[tuple(v - d if i % 2 == 0 else v + d for i, v in enumerate(t))]
+                            for t in self.baseline]
+        self.adapt_gates_drift = d
+
+
+    def _reset_threshold(self, idx: int) -> None:
+        if self.thresholds[idx] != self.baseline[idx]:
+            self.thresholds[idx] = self.baseline[idx]
+            self.invalidate_blobs()
+        for ch in range(len(self.adapt_offsets[idx])):
+            self.adapt_offsets[idx][ch] = 0.0
+        self.adapt_misses[idx] = 0
+
+
     def get_biggest_blob(self, blobs):
         """
         Identify and return the largest blob from a list of detected blobs.
@@ -108,6 +705,21 @@ class Cam(object):
         return colours
 
 
+    def blob_matches(self, blob, threshold_idx: int) -> bool:
+        """
+        Check a single blob was detected using a specified threshold, without
+        wrapping it in a list for find_blob.
+
+        Args:
+            blob (blob): Blob to check, may be None.
+            threshold_idx (int): Index along self.thresholds.
+
+        Returns:
+            bool: True if the blob was detected using self.thresholds(threshold_idx) only.
+        """
+        return blob is not None and blob[8] == 1 << threshold_idx
+
+
     def find_blob(self, blobs, threshold_idx: int):
         """
         Finds the first blob in blobs that was detected using a specified threshold
@@ -119,10 +731,11 @@ class Cam(object):
         Returns:
             found_idx (int): Index along blobs for the first blob that was detected using self.thresholds(threshold_idx)
         """
-        colours = self.get_blob_colours(blobs)
+        code = 1 << threshold_idx
 
-        for found_idx, colour in enumerate(colours):
-            if colour == pow(2, threshold_idx):
+        # Compare codes in place rather than building a colour list, so no allocation per call
+        for found_idx in range(len(blobs)):
+            if blobs[found_idx][8] == code:
                 return found_idx
 
         return None
@@ -22,5 +22,6 @@ camera = Cam(thresholds)
 # camera.get_blobs_bottom()
 # camera.find_blobs()
 # servos.set_differential_drive()
+# Tracker().update(blobs) - from tracker import Tracker, keeps a stable ID for each target across frames
 
 servo.soft_reset()
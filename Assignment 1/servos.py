@@ -1,20 +1,40 @@
-from machine import SoftI2C, Pin
+from machine import SoftI2C, Pin, Timer
 from math import asin
-import pca9685, time
+from array import array
+import pca9685, time, ustruct, micropython
+import fastboot
+
+# Integer command units: pan angles in tenths of a degree, speeds in +-SPEED_SCALE
+ANGLE_SCALE = 10
+SPEED_SCALE = 500
 
 class Servo:
     """
     A class responsible for controlling servos via the OpenMV board.
     """
 
-    def __init__(self):
+    def __init__(self, fast_boot: bool = False):
         """
         Initialise the servo object and sets the tuning coefficients.
+
+        Args:
+            fast_boot (bool): Use the trims saved in the fast boot profile, see save_trims().
         """
         # Servo tuning coefficients; EDIT these values as required.
         self.pan_angle_corr = 0
         self.left_zero = 0.05
         self.right_zero = -0.1
+
+        # Trims loaded here are included when build_tables() runs below
+        self.fast_boot = fast_boot
+        self.trims_loaded = False
+        if fast_boot:
+            trims = fastboot.load().get('servo')
+            if trims:
+                self.trims_loaded = True
+                self.pan_angle_corr = trims['pan_angle_corr']
+                self.left_zero = trims['left_zero']
+                self.right_zero = trims['right_zero']
         
         # Define servo pin IDs for the servo shield.
         self.pan_id = 7
@@ -29,6 +49,7 @@ class Servo:
         self.curr_l_speed = 0
         self.curr_r_speed = 0
         self.pan_pos = 0
+        self.pan_pos_i = 0
 
         self.freq = 50
         self.period = 1000000 / self.freq
@@ -39,10 +60,35 @@ class Servo:
         self.mid_duty = (self.min_duty + self.max_duty) / 2
         self.span = (self.max_duty - self.min_duty)
 
+        # Integer duty look up tables for the integer command API, trims included
+        self.build_tables()
+
         # Initialise the PCA9685 controller for I2C communication.
         self.pca9685 = pca9685.PCA9685(SoftI2C(sda=Pin('P5'), scl=Pin('P4')), 0x40)
         self.pca9685.freq(self.freq)
 
+        # Preallocated buffer for PWM register writes, reused on every command
+        self._pwm_buf = bytearray(4)
+
+        # Output stage: shadow of the PWM (on, off) registers of the 16 channels,
+        # channels with a command waiting for the next flush() and the batch buffer
+        self.coalesce = False
+        self.timer = None
+        self.shadow = array('H', [0, 4096] * 16)
+        self.pending_mask = 0
+        self._batch_buf = bytearray(64)
+        self._batch_views = [memoryview(self._batch_buf)[:4 * n] for n in range(17)]
+        self._flush_ref = self._scheduled_flush
+
+        self.commands = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.i2c_writes = 0
+        self.schedule_misses = 0
+
+        # Time (ms since boot) of the first command after soft_reset
+        self.t_first_actuation = None
+
 
     def set_differential_drive(self, speed: float, bias: float) -> None:
         """
@@ -92,7 +138,7 @@ class Servo:
         duty = self.mid_duty + ( self.span * (angle / self.degrees) )
 
         # Set duty and send PVM signal
-        self.pca9685.duty(self.pan_id, int(duty) )
+        self._write_duty(self.pan_id, int(duty))
 
         return angle - self.pan_angle_corr
 
@@ -121,11 +167,250 @@ class Servo:
         r_duty = max(min(r_duty, self.max_duty), self.min_duty)
 
         # Set duty and send PWM signal
-        self.pca9685.duty(self.left_id, int(l_duty))
-        self.pca9685.duty(self.right_id, int(r_duty))
+        self._write_duty(self.left_id, int(l_duty))
+        self._write_duty(self.right_id, int(r_duty))
 
         return
 
+    def build_tables(self) -> None:
+        """
+        Precompute the PWM duty of every integer command, with the trims applied.
+        Called at init and by set_trims(), so the integer API is a look up and a write.
+
+        pan_table[pos_i + max_angle_i] is the duty for the trimmed pan position pos_i (0.1 deg),
+        left_table/right_table[speed_i + SPEED_SCALE] the duty for speed_i with the wheel trims.
+        """
+        self.max_angle_i = int(self.max_deg * ANGLE_SCALE)
+        self.pan_corr_i = int(round(self.pan_angle_corr * ANGLE_SCALE))
+
+        self.pan_table = array('H', [0] * (2 * self.max_angle_i + 1))
+        for i in range(len(self.pan_table)):
+            angle = i - self.max_angle_i
+            self.pan_table[i] = int(self.mid_duty + self.span * angle / (ANGLE_SCALE * self.degrees))
+
+        self.left_table = array('H', [0] * (2 * SPEED_SCALE + 1))
+        self.right_table = array('H', [0] * (2 * SPEED_SCALE + 1))
+        for i in range(2 * SPEED_SCALE + 1):
+            speed = (i - SPEED_SCALE) / SPEED_SCALE
+            l_duty = self.mid_duty + (self.span / 2 * (speed + self.left_zero))
+            r_duty = self.mid_duty - (self.span / 2 * (speed + self.right_zero))
+            self.left_table[i] = int(max(min(l_duty, self.max_duty), self.min_duty))
+            self.right_table[i] = int(max(min(r_duty, self.max_duty), self.min_duty))
+
+
+    def set_trims(self, pan_angle_corr: float = None, left_zero: float = None,
+                  right_zero: float = None) -> None:
+        """
+        Change the servo trims and rebuild the duty tables. Use this rather than
+        setting the attributes directly, or the integer API keeps the old trims.
+
+        Args:
+            pan_angle_corr (float): Pan centre correction (deg), unchanged if None.
+            left_zero (float): Left wheel zero speed offset, unchanged if None.
+            right_zero (float): Right wheel zero speed offset, unchanged if None.
+        """
+        if pan_angle_corr is not None:
+            self.pan_angle_corr = pan_angle_corr
+        if left_zero is not None:
+            self.left_zero = left_zero
+        if right_zero is not None:
+            self.right_zero = right_zero
+
+        self.build_tables()
+
+
+    def set_angle_i(self, angle_i: int) -> int:
+        """
+        Integer version of set_angle().
+
+        Args:
+            angle_i (int): Desired angle (0.1 deg) for the camera pan servo.
+
+        Returns:
+            int: Corrected angle (0.1 deg) of the camera pan servo.
+        """
+        # Correct for off centre angle and constrain to limits
+        max_i = self.max_angle_i
+        pos_i = max(min(self.pan_corr_i + angle_i, max_i), -max_i)
+        self.pan_pos_i = pos_i
+        self.pan_pos = pos_i / ANGLE_SCALE
+
+        self._write_duty(self.pan_id, self.pan_table[pos_i + max_i])
+
+        return pos_i - self.pan_corr_i
+
+
+    def set_speed_i(self, l_speed_i: int, r_speed_i: int) -> None:
+        """
+        Integer version of set_speed().
+
+        Args:
+            l_speed_i (int): Left wheel speed (-SPEED_SCALE~SPEED_SCALE).
+            r_speed_i (int): Right wheel speed (-SPEED_SCALE~SPEED_SCALE).
+        """
+        l_speed_i = max(min(l_speed_i, SPEED_SCALE), -SPEED_SCALE)
+        r_speed_i = max(min(r_speed_i, SPEED_SCALE), -SPEED_SCALE)
+        self.curr_l_speed = l_speed_i / SPEED_SCALE
+        self.curr_r_speed = r_speed_i / SPEED_SCALE
+
+        self._write_duty(self.left_id, self.left_table[l_speed_i + SPEED_SCALE])
+        self._write_duty(self.right_id, self.right_table[r_speed_i + SPEED_SCALE])
+
+
+    def set_differential_drive_i(self, speed_i: int, bias_i: int) -> None:
+        """
+        Integer version of set_differential_drive().
+
+        Args:
+            speed_i (int): Overall speed of the robot (0~SPEED_SCALE).
+            bias_i (int): Steering bias of the robot (-SPEED_SCALE~SPEED_SCALE).
+        """
+        speed_i = max(min(speed_i, SPEED_SCALE), 0)
+        bias_i = max(min(bias_i, SPEED_SCALE), -SPEED_SCALE)
+
+        left_i = speed_i * (SPEED_SCALE - bias_i) // SPEED_SCALE
+        right_i = speed_i * (SPEED_SCALE + bias_i) // SPEED_SCALE
+
+        # Normalise speeds if they exceed full scale
+        max_i = max(left_i, right_i)
+        if max_i > SPEED_SCALE:
+            left_i = left_i * SPEED_SCALE // max_i
+            right_i = right_i * SPEED_SCALE // max_i
+
+        self.set_speed_i(left_i, right_i)
+
+
+    def _write_duty(self, idx: int, value: int) -> None:
+        """
+        Write a duty cycle to a servo shield pin without allocating, by packing
+        the PWM on/off registers into a preallocated buffer. Equivalent to
+        self.pca9685.duty(idx, value).
+
+        While coalescing (see start_output()) the duty is only stored, and
+        written by the next flush().
+
+        Args:
+            idx (int): Servo shield pin ID.
+            value (int): PWM duty cycle value (0~4095).
+        """
+        if value <= 0:
+            on, off = 0, 4096
+        elif value >= 4095:
+            on, off = 4096, 0
+        else:
+            on, off = 0, value
+
+        self.shadow[2 * idx] = on
+        self.shadow[2 * idx + 1] = off
+        self.commands += 1
+
+        if self.coalesce:
+            bit = 1 << idx
+            if self.pending_mask & bit:
+                self.coalesced += 1
+            self.pending_mask |= bit
+            return
+
+        ustruct.pack_into("<HH", self._pwm_buf, 0, on, off)
+        self.pca9685.i2c.writeto_mem(self.pca9685.address, 0x06 + 4 * idx, self._pwm_buf)
+        self.i2c_writes += 1
+
+        if self.t_first_actuation is None:
+            self.t_first_actuation = time.ticks_ms()
+
+
+    def start_output(self, timer: bool = True, timer_id: int = -1) -> None:
+        """
+        Start coalescing servo commands. Commands only update the latest duty of
+        their channel, and flush() writes every changed channel once per PWM
+        period, so commands superseded within a period never reach the I2C bus.
+
+        Args:
+            timer (bool): Flush from a machine.Timer at the PWM frequency. If False,
+                call flush() every PWM period yourself, e.g. from a Scheduler task.
+            timer_id (int): Timer ID, -1 for a virtual timer.
+        """
+        self.coalesce = True
+
+        if timer and self.timer is None:
+            self.timer = Timer(timer_id, mode=Timer.PERIODIC, freq=self.freq, callback=self._on_timer)
+
+
+    def stop_output(self) -> None:
+        """
+        Stop coalescing, writing any waiting commands. Later commands are written immediately.
+        """
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+
+        self.flush()
+        self.coalesce = False
+
+
+    def flush(self) -> int:
+        """
+        Write the waiting commands in a single auto-increment I2C write covering
+        the changed channels. Unchanged channels between them are rewritten with
+        their shadow values, which leaves their output as it was.
+
+        Returns:
+            int: Number of channels written, 0 if nothing was waiting.
+        """
+        mask = self.pending_mask
+        if not mask:
+            return 0
+        self.pending_mask = 0
+
+        lo = 0
+        while not mask & (1 << lo):
+            lo += 1
+        hi = 15
+        while not mask & (1 << hi):
+            hi -= 1
+
+        n = hi - lo + 1
+        for i in range(n):
+            ustruct.pack_into("<HH", self._batch_buf, 4 * i,
+                              self.shadow[2 * (lo + i)], self.shadow[2 * (lo + i) + 1])
+
+        self.pca9685.i2c.writeto_mem(self.pca9685.address, 0x06 + 4 * lo, self._batch_views[n])
+        self.i2c_writes += 1
+        self.flushes += 1
+
+        if self.t_first_actuation is None:
+            self.t_first_actuation = time.ticks_ms()
+
+        return n
+
+
+    def output_stats(self) -> dict:
+        """
+        Returns:
+            dict: Commands issued, commands coalesced (superseded before being written),
+                flushes, I2C writes and timer ticks missed because the schedule queue was full.
+        """
+        return {'commands': self.commands,
+                'coalesced': self.coalesced,
+                'flushes': self.flushes,
+                'i2c_writes': self.i2c_writes,
+                'schedule_misses': self.schedule_misses}
+
+
+    def _on_timer(self, timer) -> None:
+        """
+        Timer callback, I2C is not allowed in interrupt context so the flush is scheduled.
+        """
+        try:
+            micropython.schedule(self._flush_ref, 0)
+        except RuntimeError:
+            self.schedule_misses += 1
+
+
+    def _scheduled_flush(self, arg) -> None:
+        self.flush()
+
+
     def _duty2us(self, value: float) -> int:
         """
         Convert a given PWM duty cycle value to microseconds.
@@ -159,27 +444,44 @@ class Servo:
         Args:
             idx (int): Servo shield pin ID to reset.
         """
+        self.pending_mask &= ~(1 << idx)
+        self.shadow[2 * idx] = 0
+        self.shadow[2 * idx + 1] = 4096
         self.pca9685.duty(idx, 0)
 
 
+    def save_trims(self) -> None:
+        """
+        Save the current trims (pan_angle_corr, left_zero, right_zero) to the fast boot profile.
+        """
+        fastboot.save('servo', {'pan_angle_corr': self.pan_angle_corr,
+                                'left_zero': self.left_zero,
+                                'right_zero': self.right_zero})
+
+
     def soft_reset(self) -> None:
         """
         Method to reset the servos to default and print a delay prompt.
+        The delay is skipped in fast boot mode once saved trims have been loaded.
         """
-        # Reset all servo shield pins
+        # Reset all servo shield pins, dropping any command waiting for flush()
         for i in range(0, 7, 1):
-            self.pca9685.duty(i, 0)
+            self.release(i)
 
         # Reset pan to centre
         self.set_angle(0)
 
         # Print delay prompt
-        for i in range(3, 0, -1):
-            print(f"{i} seconds remaining.")
-            time.sleep_ms(1000)
+        if not self.trims_loaded:
+            for i in range(3, 0, -1):
+                print(f"{i} seconds remaining.")
+                time.sleep_ms(1000)
 
         print("___Running Code___")
 
+        # Time to first actuation is measured to the next command
+        self.t_first_actuation = None
+
 
 if __name__ == "__main__":
     servo = Servo()
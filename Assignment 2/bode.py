@@ -0,0 +1,327 @@
+"""
+Host side frequency-response analysis of the CSV runs written by PanTuning.
+
+Example:
+python bode.py ./CSV --out bode.csv --plot bode.png
+
+Each Curve{freq}Hz_{n}.csv is loaded (in parallel), resampled onto a uniform
+time grid and fitted with a sinusoid at the excitation frequency. The input is
+the target bearing (pan angle + tracking error) and the output the pan angle,
+so gain and phase are those of the closed pan tracking loop. Repeats of the
+same frequency are aggregated with 95% confidence intervals.
+"""
+
+import argparse
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Two sided 95% Student t values for 1 to 30 degrees of freedom
+T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+       2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+       2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+FILE_RE = re.compile(r"Curve([0-9.]+)Hz_([0-9]+)\.csv$")
+
+
+def load_run(path: str) -> dict:
+    """
+    Load a single tuning run, including the '# key=value' header if present.
+    Runs written before fixed-rate sampling (time in ms, no valid column) are
+    also supported.
+
+    Args:
+        path (str): Path to the CSV file.
+
+    Returns:
+        dict: Header items plus 't' (s), 'error' and 'angle' arrays and a 'valid' mask.
+
+    Raises:
+        ValueError: If the file has no column header, no data rows or misses a column.
+    """
+    header = {}
+    columns = None
+    rows = []
+
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('#'):
+                key, _, value = line[1:].strip().partition('=')
+                header[key] = _to_number(value)
+            elif columns is None:
+                columns = line.split(',')
+            else:
+                rows.append(line.split(','))
+
+    # A short last row is a write interrupted by a reset
+    if columns is not None and rows and len(rows[-1]) < len(columns):
+        rows.pop()
+    if columns is None or not rows:
+        raise ValueError('%s: no data rows' % path)
+
+    col = {name: i for i, name in enumerate(columns)}
+    missing = {'error', 'angle'} - set(col)
+    if 'time_us' not in col and 'time' not in col:
+        missing.add('time_us')
+    if missing:
+        raise ValueError('%s: missing column(s) %s' % (path, ', '.join(sorted(missing))))
+    if any(len(row) != len(columns) for row in rows):
+        raise ValueError('%s: rows do not match the %d columns of the header' % (path, len(columns)))
+
+    data = np.array([[_to_float(v) for v in row] for row in rows], dtype=float)
+
+    if 'time_us' in col:
+        t = data[:, col['time_us']] * 1e-6
+    else:
+        t = data[:, col['time']] * 1e-3
+
+    error = data[:, col['error']]
+    angle = data[:, col['angle']]
+    if 'valid' in col:
+        valid = data[:, col['valid']] > 0
+    else:
+        valid = np.ones(len(t), dtype=bool)
+    valid &= np.isfinite(error) & np.isfinite(angle)
+
+    match = FILE_RE.search(os.path.basename(path))
+    if 'freq_hz' not in header and match:
+        header['freq_hz'] = float(match.group(1))
+
+    header.update({'path': path, 't': t, 'error': error, 'angle': angle, 'valid': valid})
+
+    return header
+
+
+def analyse_run(path: str, grid_hz: float = None) -> dict:
+    """
+    Fit gain and phase at the excitation frequency of a single run.
+
+    Args:
+        path (str): Path to the CSV file.
+        grid_hz (float): Rate (Hz) of the uniform grid, defaults to the run sample rate.
+
+    Returns:
+        dict: Frequency (Hz), gain, phase (deg), fraction of valid samples and fit residual.
+    """
+    run = load_run(path)
+    freq = float(run['freq_hz'])
+
+    t, error, angle, valid = run['t'], run['error'], run['angle'], run['valid']
+
+    # The pan position during a capture is the angle commanded after the previous sample
+    pan = np.roll(angle, 1)
+    both = valid & np.roll(valid, 1)
+    both[0] = False
+
+    t, pan, target = t[both], pan[both], pan[both] + error[both]
+    if len(t) < 8:
+        return {'path': path, 'freq_hz': freq, 'gain': np.nan, 'phase_deg': np.nan,
+                'valid_frac': len(t) / max(len(valid), 1), 'residual': np.nan}
+
+    # Resample onto a uniform grid, bridging missing samples linearly
+    if grid_hz is None:
+        grid_hz = run.get('rate_hz') or 1 / np.median(np.diff(t))
+    grid = np.arange(t[0], t[-1], 1 / grid_hz)
+    x = np.interp(grid, t, target)
+    y = np.interp(grid, t, pan)
+
+    # Least squares fit of a sinusoid at the excitation frequency plus offset and drift
+    w = 2 * np.pi * freq * grid
+    basis = np.column_stack([np.cos(w), np.sin(w), np.ones_like(grid), grid - grid[0]])
+    coef, residual, _, _ = np.linalg.lstsq(basis, np.column_stack([x, y]), rcond=None)
+
+    # Complex amplitudes, a*cos(wt) + b*sin(wt) = Re{(a - jb) e^{jwt}}
+    X = coef[0, 0] - 1j * coef[1, 0]
+    Y = coef[0, 1] - 1j * coef[1, 1]
+    H = Y / X
+
+    fit = basis @ coef
+    rms = np.sqrt(np.mean((np.column_stack([x, y]) - fit) ** 2))
+
+    return {'path': path, 'freq_hz': freq, 'gain': np.abs(H), 'phase_deg': np.degrees(np.angle(H)),
+            'valid_frac': len(t) / max(len(valid), 1), 'residual': rms}
+
+
+def analyse_dir(directory: str, jobs: int = None, grid_hz: float = None) -> list:
+    """
+    Analyse every run in a directory in parallel. Runs that cannot be loaded,
+    e.g. empty files from an interrupted measurement, are reported and skipped.
+
+    Args:
+        directory (str): Directory containing Curve{freq}Hz_{n}.csv files.
+        jobs (int): Number of worker processes, defaults to the number of cores.
+        grid_hz (float): Rate (Hz) of the uniform grid, defaults to each run's sample rate.
+
+    Returns:
+        list: Result of analyse_run for each file, sorted by frequency.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, 'Curve*Hz_*.csv')))
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(_analyse_or_skip, paths, [grid_hz] * len(paths),
+                                chunksize=max(1, len(paths) // (8 * (jobs or os.cpu_count() or 1)))))
+
+    for result in results:
+        if isinstance(result, str):
+            print('Skipped', result)
+    results = [r for r in results if not isinstance(r, str)]
+
+    return sorted(results, key=lambda r: (r['freq_hz'], r['path']))
+
+
+def _analyse_or_skip(path: str, grid_hz: float = None):
+    """
+    analyse_run() for the worker pool, returning the error message instead of
+    raising for unusable files so one bad run does not fail the whole pool.
+    """
+    try:
+        return analyse_run(path, grid_hz)
+    except ValueError as e:
+        return str(e)
+
+
+def aggregate(results: list, min_valid: float = 0.5) -> list:
+    """
+    Combine the repeats of each frequency into a mean gain and phase with
+    95% confidence intervals. Runs with too few valid samples are dropped.
+
+    Args:
+        results (list): Output of analyse_dir.
+        min_valid (float): Minimum fraction of valid samples for a run to be used.
+
+    Returns:
+        list: One dict per frequency with n, gain, gain_db, phase_deg and their CI half widths.
+    """
+    table = []
+
+    for freq in sorted(set(r['freq_hz'] for r in results)):
+        runs = [r for r in results if r['freq_hz'] == freq
+                and r['valid_frac'] >= min_valid and np.isfinite(r['gain'])]
+        if not runs:
+            continue
+
+        gain = np.array([r['gain'] for r in runs])
+        phase = np.radians([r['phase_deg'] for r in runs])
+
+        # Average phase on the unit circle so repeats either side of +-180 deg agree
+        mean_phase = np.angle(np.mean(np.exp(1j * phase)))
+        dev = np.angle(np.exp(1j * (phase - mean_phase)))
+
+        n = len(runs)
+        t95 = T95[min(n - 1, len(T95)) - 1] if n > 1 else np.nan
+        gain_ci = t95 * gain.std(ddof=1) / np.sqrt(n) if n > 1 else np.nan
+        phase_ci = t95 * np.degrees(dev.std(ddof=1)) / np.sqrt(n) if n > 1 else np.nan
+
+        table.append({'freq_hz': freq, 'n': n,
+                      'gain': gain.mean(), 'gain_ci': gain_ci,
+                      'gain_db': 20 * np.log10(gain.mean()),
+                      'phase_deg': np.degrees(mean_phase), 'phase_ci': phase_ci})
+
+    return table
+
+
+def write_table(table: list, path: str) -> None:
+    """
+    Write the aggregated Bode table to a CSV file.
+
+    Args:
+        table (list): Output of aggregate.
+        path (str): Output CSV path.
+    """
+    keys = ['freq_hz', 'n', 'gain', 'gain_ci', 'gain_db', 'phase_deg', 'phase_ci']
+
+    with open(path, 'w') as file:
+        file.write(','.join(keys) + '\n')
+        for row in table:
+            file.write(','.join(str(row[k]) for k in keys) + '\n')
+
+
+def plot_bode(table: list, path: str) -> None:
+    """
+    Plot gain (dB) and phase (deg) against frequency with error bars.
+
+    Args:
+        table (list): Output of aggregate.
+        path (str): Output image path.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    freq = np.array([r['freq_hz'] for r in table])
+    gain = np.array([r['gain'] for r in table])
+    gain_ci = np.nan_to_num(np.array([r['gain_ci'] for r in table]))
+    phase = np.array([r['phase_deg'] for r in table])
+    phase_ci = np.nan_to_num(np.array([r['phase_ci'] for r in table]))
+
+    # Convert the linear gain CI into asymmetric dB error bars
+    lower = 20 * np.log10(gain) - 20 * np.log10(np.maximum(gain - gain_ci, 1e-6))
+    upper = 20 * np.log10(gain + gain_ci) - 20 * np.log10(gain)
+
+    fig, (ax_gain, ax_phase) = plt.subplots(2, 1, sharex=True, figsize=(7, 6))
+    ax_gain.errorbar(freq, 20 * np.log10(gain), yerr=[lower, upper], marker='o', capsize=3)
+    ax_gain.set_xscale('log')
+    ax_gain.set_ylabel('Gain (dB)')
+    ax_gain.grid(True, which='both')
+
+    ax_phase.errorbar(freq, phase, yerr=phase_ci, marker='o', capsize=3)
+    ax_phase.set_xlabel('Frequency (Hz)')
+    ax_phase.set_ylabel('Phase (deg)')
+    ax_phase.grid(True, which='both')
+
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def _to_number(value: str):
+    """
+    Convert a header value to int or float when possible.
+    """
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _to_float(value: str) -> float:
+    """
+    Convert a CSV cell to float, empty cells (missing samples) become NaN.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Frequency response of PanTuning runs')
+    parser.add_argument('directory', nargs='?', default='./CSV', help='Directory of CSV runs')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes')
+    parser.add_argument('--grid-hz', type=float, default=None, help='Uniform resampling rate (Hz)')
+    parser.add_argument('--min-valid', type=float, default=0.5, help='Minimum valid sample fraction')
+    parser.add_argument('--out', default=None, help='Write the Bode table to this CSV')
+    parser.add_argument('--plot', default=None, help='Save a Bode plot to this image')
+    args = parser.parse_args()
+
+    results = analyse_dir(args.directory, args.jobs, args.grid_hz)
+    table = aggregate(results, args.min_valid)
+
+    print('Analysed', len(results), 'runs')
+    print('freq (Hz)  n   gain (dB)        phase (deg)')
+    for row in table:
+        print('%9.3f %3d %7.2f +-%5.3f %8.1f +-%5.1f' % (
+            row['freq_hz'], row['n'], row['gain_db'], np.nan_to_num(row['gain_ci']),
+            row['phase_deg'], np.nan_to_num(row['phase_ci'])))
+
+    if args.out:
+        write_table(table, args.out)
+    if args.plot:
+        plot_bode(table, args.plot)
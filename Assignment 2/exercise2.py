@@ -12,3 +12,6 @@ thresholds = [
 tuning = PanTuning(thresholds, gain = 5, p=0.2, i=0, d=0.005)
 
 tuning.measure(0.1)
+
+# Higher frequencies, reusing the calibration made by measure()
+tuning.sweep([0.2, 0.5, 1, 2])
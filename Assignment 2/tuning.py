@@ -1,6 +1,8 @@
 from servos import *
 from camera import *
 from pid import PID
+from logger import log
+from array import array
 import os, time
 
 class PanTuning(object):
@@ -8,7 +10,7 @@ class PanTuning(object):
     A class for managing PID tuning, servo calibration, and camera adjustments.
     """
 
-    def __init__(self, thresholds, gain = 25, p=0.22, i=0.0, d=0.0, imax=0.0):
+    def __init__(self, thresholds, gain = 25, p=0.22, i=0.0, d=0.0, imax=0.0, fast_boot=False, coalesce=False):
         """
         Initialise the Tuning object with given PID parameters.
 
@@ -17,51 +19,149 @@ class PanTuning(object):
             i (float): Integral gain.
             d (float): Derivative gain.
             imax (float): Maximum Integral error.
+            fast_boot (bool): Reuse the saved sensor settings and servo trims and skip start-up delays.
+            coalesce (bool): Write servo commands once per PWM period, see Servo.start_output().
         """
-        self.servo = Servo()
+        self.servo = Servo(fast_boot)
         self.servo.soft_reset()
-        self.cam = Cam(thresholds, gain)
+        if coalesce:
+            self.servo.start_output()
+        self.cam = Cam(thresholds, gain, fast_boot=fast_boot)
         self.PID = PID(p, i, d, imax)
 
         self.min_angle = 0
         self.max_angle = 0
         self.targetmax_angle = 25
         self.targetmin_angle = -self.targetmax_angle
+        self.t_calibrated = None
 
 
-    def measure(self, freq):
+    def measure(self, freq, rate_hz: float = 20):
         """
         Measures the tracking error and pan angle of the
         red square target for a specified frequency of oscillation.
+        Samples are taken at a fixed rate and timestamped at capture.
 
         Args:
             freq (int): Frequency of oscillation in (Hz).
+            rate_hz (float): Sample rate (Hz), must be below the camera frame rate.
         """
-        # Track 10 periods of oscillations
-        t_run = 1000*5/freq
-        file_n = 0
+        self.calibrate_until_valid()
+        self.record(freq, rate_hz)
 
-        # Set up lists for data
-        times = []
-        errors = []
-        angles = []
-        times.append('time')
-        errors.append('error')
-        angles.append('angle')
 
-        # Set up flag for searching for target
-        flag = True
+    def sweep(self, freqs, rate_hz: float = 20, max_age_s: int = 600) -> dict:
+        """
+        Measures a list of frequencies back to back, calibrating only once.
+        The calibration is kept and re-validated before each frequency, and is
+        only repeated if it has become invalid or older than max_age_s.
+
+        Args:
+            freqs (list): Frequencies of oscillation in (Hz).
+            rate_hz (float): Sample rate (Hz), must be below the camera frame rate.
+            max_age_s (int): Time (s) after which the calibration is redone.
+
+        Returns:
+            dict: Session time (ms), time spent calibrating (ms) and the estimated
+            time (ms) of calling measure() for every frequency.
+        """
+        t_session = time.ticks_ms()
+        t_calibrating = 0
+        n_calibrations = 0
+
+        for idx, freq in enumerate(freqs):
+            # Calibrate only if there is no valid calibration cached
+            if not self.calibration_valid(max_age_s):
+                t_cal = time.ticks_ms()
+                self.calibrate_until_valid()
+                t_calibrating += time.ticks_diff(time.ticks_ms(), t_cal)
+                n_calibrations += 1
+
+            print('Sweep', idx + 1, 'of', len(freqs), ':', freq, 'Hz')
+            self.record(freq, rate_hz, {'sweep_idx': idx, 'sweep_len': len(freqs)})
+
+        t_total = time.ticks_diff(time.ticks_ms(), t_session)
+
+        # measure() calibrates for every frequency, so would pay the calibration each time
+        t_cal_mean = t_calibrating / max(n_calibrations, 1)
+        t_per_freq = t_total + t_cal_mean * (len(freqs) - n_calibrations)
+
+        print('Sweep finished in', t_total / 1000, 's with', n_calibrations, 'calibration(s)')
+        print('Calling measure() per frequency would take ~', t_per_freq / 1000, 's')
+
+        return {'session_ms': t_total,
+                'calibration_ms': t_calibrating,
+                'calibrations': n_calibrations,
+                'per_freq_estimate_ms': int(t_per_freq)}
+
+
+    def calibration_valid(self, max_age_s: int = None) -> bool:
+        """
+        Check the cached calibration covers the target angles and is recent enough.
+
+        Args:
+            max_age_s (int): Maximum age (s) of the calibration, None for no limit.
+
+        Returns:
+            bool: True if the calibration can be reused.
+        """
+        if self.t_calibrated is None:
+            return False
+
+        if ((self.min_angle > self.targetmin_angle) or
+            (self.max_angle < self.targetmax_angle)):
+            return False
+
+        if max_age_s is not None:
+            age = time.ticks_diff(time.ticks_ms(), self.t_calibrated)
+            if age > max_age_s * 1000:
+                return False
 
-        # Check if calibration has been done
+        return True
+
+
+    def calibrate_until_valid(self) -> None:
+        """
+        Repeat the calibration until the pan angle limits cover the target angles.
+        """
         self.calibrate()
-        while ((self.min_angle > self.targetmin_angle) or
-               (self.max_angle < self.targetmax_angle)):
+        while not self.calibration_valid():
             print('Calibration failed')
             print('Make sure you have calibrated thresholds')
             print('If you have, please put the robot closer to the screen!')
             self.calibrate()
 
         print('Calibration complete')
+
+
+    def record(self, freq, rate_hz: float = 20, info: dict = None) -> dict:
+        """
+        Acquire the red target and record a single frequency run to CSV.
+        Assumes calibration has already been done.
+
+        Args:
+            freq (int): Frequency of oscillation in (Hz).
+            rate_hz (float): Sample rate (Hz), must be below the camera frame rate.
+            info (dict): Extra items for the CSV header.
+
+        Returns:
+            dict: Header written to the CSV file.
+        """
+        # Track 5 periods of oscillations
+        t_run = 1000000*5/freq
+
+        # Preallocate sample buffers for the whole run so the loop does not grow lists
+        n_max = int(t_run * rate_hz / 1000000) + 1
+        ticks = array('i', [0] * n_max)
+        times = array('i', [0] * n_max)
+        errors = array('f', [0] * n_max)
+        angles = array('f', [0] * n_max)
+        valid = bytearray(n_max)
+        n = 0
+
+        # Set up flag for searching for target
+        flag = True
+
         # reset pan to max angle
         self.servo.set_angle(self.max_angle)
 
@@ -74,25 +174,50 @@ class PanTuning(object):
             if big_blob and self.cam.find_blob([big_blob], 0) is not None:
                 flag = False
 
-        # Setup times for freq test
-        t_start = time.ticks_ms()
-        t_end =  time.ticks_add(t_start, int(t_run))
+        sampler = FixedRateSampler(rate_hz)
+        sampler.start()
+
+        while sampler.elapsed_us() < t_run and n < n_max:
+            # Wait for the next tick of the sample grid
+            tick = sampler.wait()
 
-        while time.ticks_diff(t_end, time.ticks_ms()) > 0:
-            # Get new image and blocks
             # Get list of blobs and biggest blob
             blobs, img = self.cam.get_blobs()
+            ticks[n] = tick
+            times[n] = sampler.capture(tick, self.cam.t_capture)
             big_blob = self.cam.get_biggest_blob(blobs)
+            self.cam.update_thresholds(img, big_blob, 0)
 
-            if big_blob and self.cam.find_blob([big_blob], 0) is not None:
-                error, target_angle = self.update_pan(big_blob)
-            times.append(time.ticks_diff(time.ticks_ms(), t_start))
-            errors.append(error)
-            angles.append(target_angle)
+            if self.cam.blob_matches(big_blob, 0):
+                errors[n], angles[n] = self.update_pan(big_blob)
+                valid[n] = 1
+            else:
+                valid[n] = 0
+                sampler.missing += 1
+
+            n += 1
+
+            # Write recorded frames after the pan update
+            if self.cam.recorder is not None:
+                self.cam.recorder.flush()
 
-        data = [times,errors,angles]
+        # Missing samples are left empty rather than repeating stale values
+        data = [['tick'] + list(ticks[:n]),
+                ['time_us'] + list(times[:n]),
+                ['error'] + [errors[k] if valid[k] else '' for k in range(n)],
+                ['angle'] + [angles[k] if valid[k] else '' for k in range(n)],
+                ['valid'] + list(valid[:n])]
 
-        write_csv(data, freq)
+        header = sampler.summary()
+        header['freq_hz'] = freq
+        header['min_angle'] = self.min_angle
+        header['max_angle'] = self.max_angle
+        if info is not None:
+            header.update(info)
+
+        write_csv(data, freq, header)
+
+        return header
 
 
     def calibrate(self):
@@ -123,14 +248,21 @@ class PanTuning(object):
                 if error < 20:
                     if pan_angle < self.min_angle:
                         self.min_angle = pan_angle
-                        print('New min angle: ', self.min_angle)
+                        log.info('New min angle:', self.min_angle)
                     if pan_angle > self.max_angle:
                         self.max_angle = pan_angle
-                        print('New max angle: ', self.max_angle)
+                        log.info('New max angle:', self.max_angle)
 
                 # As block was found reset lost timer
                 t_lost = time.ticks_add(time.ticks_ms(), 1500)
 
+            # Print at most one log line per frame, after the pan update
+            log.drain(print, 1)
+
+        log.drain(print)
+
+        self.t_calibrated = time.ticks_ms()
+
 
     def update_pan(self, blob) -> tuple:
         """
@@ -144,11 +276,8 @@ class PanTuning(object):
             pan_angle (float): Angle of the pan wrt. heading
 
         """
-        # Error between camera angle and target in pixels
-        pixel_error = blob.cx() - self.cam.w_centre
-
-        # Convert error to angle
-        angle_error = -(pixel_error/sensor.width()*self.cam.h_fov)
+        # Error between camera angle and target, looked up from the target column
+        angle_error = self.cam.bearing(blob.cx())
 
         pid_error = self.PID.get_pid(angle_error,1)
 
@@ -161,13 +290,119 @@ class PanTuning(object):
         return angle_error, pan_angle
 
 
-def write_csv(data: tuple, freq: int) -> None:
+class FixedRateSampler(object):
+    """
+    Keeps samples on a fixed time grid and records how far each capture
+    timestamp is from its nominal grid time (jitter).
+    """
+
+    def __init__(self, rate_hz: float):
+        """
+        Initialise the sampler for a declared sample rate.
+
+        Args:
+            rate_hz (float): Sample rate (Hz).
+        """
+        self.rate_hz = rate_hz
+        self.period_us = int(1000000 / rate_hz)
+        self.start()
+
+
+    def start(self) -> None:
+        """
+        Start the sample grid now and clear the statistics.
+        """
+        self.t_start = time.ticks_us()
+        self.tick = 0
+        self.samples = 0
+        self.missing = 0
+        self.skipped = 0
+        self.jitter_sum = 0
+        self.jitter_sq_sum = 0
+        self.jitter_max = 0
+
+
+    def elapsed_us(self) -> int:
+        """
+        Returns:
+            int: Time (us) since the sampler was started.
+        """
+        return time.ticks_diff(time.ticks_us(), self.t_start)
+
+
+    def wait(self) -> int:
+        """
+        Sleep until the next tick of the grid. Ticks that have already passed
+        are skipped (and counted) rather than sampled late.
+
+        Returns:
+            int: Index of the tick to sample.
+        """
+        wait = self.tick * self.period_us - self.elapsed_us()
+
+        if wait < 0:
+            late_ticks = -wait // self.period_us
+            self.skipped += late_ticks
+            self.tick += late_ticks
+            wait += late_ticks * self.period_us
+        if wait > 0:
+            time.sleep_us(wait)
+
+        tick = self.tick
+        self.tick += 1
+
+        return tick
+
+
+    def capture(self, tick: int, t_capture: int) -> int:
+        """
+        Record the capture time of a sample.
+
+        Args:
+            tick (int): Index of the tick the sample belongs to.
+            t_capture (int): Capture time from time.ticks_us().
+
+        Returns:
+            int: Capture time (us) relative to the start of the grid.
+        """
+        t_sample = time.ticks_diff(t_capture, self.t_start)
+
+        jitter = t_sample - tick * self.period_us
+        self.samples += 1
+        self.jitter_sum += jitter
+        self.jitter_sq_sum += jitter * jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+
+        return t_sample
+
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: Declared rate, sample counts and capture jitter statistics (us).
+        """
+        n = max(self.samples, 1)
+        mean = self.jitter_sum / n
+        var = max(self.jitter_sq_sum / n - mean * mean, 0)
+
+        return {'rate_hz': self.rate_hz,
+                'period_us': self.period_us,
+                'samples': self.samples,
+                'missing': self.missing,
+                'skipped': self.skipped,
+                'jitter_mean_us': int(mean),
+                'jitter_std_us': int(var ** 0.5),
+                'jitter_max_us': self.jitter_max}
+
+
+def write_csv(data: tuple, freq: int, header: dict = None) -> None:
     """
     Write tracking data to a CSV file.
 
     Args:
         data (tuple): Tuple containing lists of data to write to CSV file.\n
-        freq (int): Frequency (Hz) for naming the file.
+        freq (int): Frequency (Hz) for naming the file.\n
+        header (dict): Run information written as '# key=value' lines before the data.
     """
     # Set file ext counter to 0
     file_n = 0
@@ -202,6 +437,10 @@ def write_csv(data: tuple, freq: int) -> None:
     with open(filename, 'w') as file:
         file.flush() # Flush buffer
 
+        if header is not None:
+            for key, value in header.items():
+                file.write('# ' + key + '=' + str(value) + '\n')
+
         # Transpose data for row-wise writing debug trailing comma
         for row in zip(*data):
             file.write(','.join(map(str, row)))
@@ -1,6 +1,11 @@
 from robot import *
 
+# Line colour threshold (L Min, L Max, A Min, A Max, B Min, B Max)
+thresholds = [
+              (45, 55, 40, 55, 15, 35), # Red
+]
+
 # Create robot object
-robot = Robot()
+robot = Robot(thresholds)
 
-robot.follow_line()
\ No newline at end of file
+robot.follow_line(speed=0.3, threshold_idx=0)
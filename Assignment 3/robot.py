@@ -1,14 +1,17 @@
 from servos import *
 from camera import *
 from pid import PID
-import sensor
+from scheduler import Scheduler
+from gc_control import GCControl
+from logger import log
+import sensor, time
 
 class Robot(object):
     """
     A class to manage the functions of a robot for driving and tracking purposes using a camera and servos.
     """
 
-    def __init__(self, thresholds, gain = 25, p=0.22, i=0.0, d=0.0, imax=0.0):
+    def __init__(self, thresholds, gain = 25, p=0.22, i=0.0, d=0.0, imax=0.0, fast_boot=False, coalesce=False):
         """
         Initializes the Robot object with given PID parameters.
 
@@ -17,34 +20,308 @@ class Robot(object):
             i (float): Integral gain for the PID.
             d (float): Derivative gain for the PID.
             imax (float): Maximum Integral error for the PID.
+            fast_boot (bool): Reuse the saved sensor settings and servo trims and skip start-up delays.
+            coalesce (bool): Write servo commands once per PWM period, see Servo.start_output().
         """
 
-        self.servo = Servo()
+        self.servo = Servo(fast_boot)
         self.servo.soft_reset()
-        self.cam = Cam(thresholds, gain)
+        if coalesce:
+            self.servo.start_output()
+        self.cam = Cam(thresholds, gain, fast_boot=fast_boot)
         self.PID = PID(p, i, d, imax)
 
+        # Latest target measurement shared between the capture and control tasks
+        self.target_bearing = 0
+        self.target_rate = 0
+        self.t_seen = None
+        self.lost_frames = 0
 
-    def follow_blob(self, speed: float, threshold_idx: int) -> None:
+        # Reacquisition statistics
+        self.search_count = 0
+        self.search_found = 0
+        self.search_time_sum = 0
+        self.search_time_max = 0
+        self.search_full_sweeps = 0
+
+        # Steady state mode controls GC
+        self.steady = False
+        self.gc_control = GCControl()
+
+
+    def follow_blob(self, speed: float, threshold_idx: int, steady: bool = False,
+                    gc_every: int = 1, slow_distance: float = None,
+                    search_after: int = 3) -> None:
         """
         Follows a blob using the camera and drives towards it.
+
+        Args:
+            speed (float): Forward speed coefficient (0 to 1).
+            threshold_idx (int): Index along the camera thresholds of the blob to follow.
+            steady (bool): Steady state mode, garbage is collected after the servos
+                are updated, see self.gc_control for counters.
+            gc_every (int): In steady state mode, collect every n-th loop.
+            slow_distance (float): Ground distance (cm) to the blob below which the
+                speed is reduced in proportion, None to keep a constant speed.
+            search_after (int): Consecutive lost frames before a pan search is started,
+                None to wait in place.
         """
+        lost = 0
+
+        self.steady = steady
+        if steady:
+            self.gc_control.every = gc_every
+            self.gc_control.start()
+
         while True:
             # Track red line
             big_blob = self.track_blob(threshold_idx)
 
+            if big_blob is None:
+                lost += 1
+                if search_after is not None and lost >= search_after:
+                    self.drive(0, 0)
+                    big_blob = self.reacquire(threshold_idx)
             if big_blob is not None:
+                lost = 0
+
                 # Get heading angle
                 heading_angle = self.servo.pan_pos
 
                 # Convert to angle correction weight (between -1 and 1)
                 angle_correction = heading_angle/self.servo.max_deg
 
+                # Slow down when close, using the range to the bottom edge of the blob
+                drive_speed = speed
+                if slow_distance is not None:
+                    distance = self.cam.ground_distance(big_blob.y() + big_blob.h())
+                    if 0 <= distance < slow_distance:
+                        drive_speed = speed*distance/slow_distance
+
                 # Drive towards line
-                self.drive(speed, angle_correction)
+                self.drive(drive_speed, angle_correction)
+            else:
+                self.drive(0, 0)
+
+            # Print at most one log line and write recorded frames, after actuation. In
+            # steady state mode only print while the target is held, not while searching
+            if not self.steady or lost == 0:
+                log.drain(print, 1)
+            if self.cam.recorder is not None:
+                self.cam.recorder.flush()
+
+            # Collect between actuation and the next snapshot
+            if self.steady:
+                self.gc_control.tick()
+
+
+    def follow_blob_async(self, speed: float, threshold_idx: int, control_hz: int = 50,
+                          telemetry_ms: int = 1000, network=None, network_ms: int = 50,
+                          duration_ms: int = None, scheduler: Scheduler = None) -> Scheduler:
+        """
+        Follows a blob like follow_blob, but with frame capture, control, telemetry and
+        networking run as separate tasks so the control rate is independent of the frame rate.
+
+        Args:
+            speed (float): Forward speed coefficient (0 to 1).
+            threshold_idx (int): Index along the camera thresholds of the blob to follow.
+            control_hz (int): Rate (Hz) of the control task.
+            telemetry_ms (int): Period (ms) of the telemetry report, None to disable.
+            network (function): Optional function called every network_ms for WiFi work.
+            network_ms (int): Period (ms) of the network task.
+            duration_ms (int): Time to run for (ms), None to run forever.
+            scheduler (Scheduler): Scheduler to add the tasks to, e.g. with extra tasks already
+                registered, a new one if None. Its statistics remain readable if a task raises.
+
+        Returns:
+            Scheduler: The scheduler used, with the per task jitter statistics.
+        """
+        if scheduler is None:
+            scheduler = Scheduler()
+        scheduler.every('capture', 0, lambda: self.capture_target(threshold_idx))
+        scheduler.every('control', 1000 / control_hz, lambda: self.control_step(speed))
+        scheduler.every('log', 100, lambda: log.drain(print, 4))
+        if self.cam.recorder is not None:
+            scheduler.every('recorder', 20, self.cam.recorder.flush)
+        if self.servo.coalesce and self.servo.timer is None:
+            scheduler.every('servo', 1000 / self.servo.freq, self.servo.flush)
+        if telemetry_ms is not None:
+            scheduler.every('telemetry', telemetry_ms, scheduler.report)
+        if network is not None:
+            scheduler.every('network', network_ms, network)
+
+        try:
+            scheduler.run(duration_ms)
+        finally:
+            self.drive(0, 0)
+            self.servo.flush()
+
+        return scheduler
+
+
+    def capture_target(self, threshold_idx: int) -> None:
+        """
+        Capture a frame and update the target bearing and its rate of change.
+        The bearing is wrt. the robot heading, timestamped with the frame capture time.
+
+        Args:
+            threshold_idx (int): Index along the camera thresholds of the blob to track.
+        """
+        blobs, img = self.cam.get_blobs()
+        pan_pos = self.servo.pan_pos
+
+        big_blob = self.cam.get_biggest_blob(blobs)
+        self.cam.update_thresholds(img, big_blob, threshold_idx)
+
+        if not self.cam.blob_matches(big_blob, threshold_idx):
+            self.lost_frames += 1
+            return
+
+        # Bearing of the target wrt. the heading
+        self.update_target(pan_pos + self.cam.bearing(big_blob.cx()), self.cam.t_capture)
+
+
+    def update_target(self, bearing: float, t_capture: int) -> None:
+        """
+        Update the last known target bearing and its smoothed rate of change.
+
+        Args:
+            bearing (float): Bearing (deg) of the target wrt. the heading.
+            t_capture (int): Capture time (us) of the frame the target was seen in, see Cam.t_capture.
+        """
+        # Smoothed rate of change of bearing (deg/ms) used for prediction
+        if self.t_seen is not None:
+            dt = time.ticks_diff(t_capture, self.t_seen) / 1000
+            if 0 < dt < 500:
+                rate = (bearing - self.target_bearing) / dt
+                self.target_rate += 0.5 * (rate - self.target_rate)
             else:
+                self.target_rate = 0
+
+        self.target_bearing = bearing
+        self.t_seen = t_capture
+
+
+    def predict_bearing(self, max_predict_ms: int = 200) -> float:
+        """
+        Extrapolate the last known target bearing to the current time.
+
+        Args:
+            max_predict_ms (int): Longest time (ms) the bearing is extrapolated for.
+
+        Returns:
+            float: Predicted bearing (deg) wrt. the heading, None if never seen.
+        """
+        if self.t_seen is None:
+            return None
+
+        age = time.ticks_diff(time.ticks_us(), self.t_seen) // 1000
+
+        return self.target_bearing + self.target_rate * min(age, max_predict_ms)
+
+
+    def control_step(self, speed: float, max_predict_ms: int = 200, lost_ms: int = 500) -> None:
+        """
+        Run a single control tick: predict the target bearing from the latest
+        measurement, move the pan servo towards it and steer towards the pan angle.
+
+        Args:
+            speed (float): Forward speed coefficient (0 to 1).
+            max_predict_ms (int): Longest time (ms) the bearing is extrapolated for.
+            lost_ms (int): Time (ms) since the last measurement after which the robot stops.
+        """
+        if self.t_seen is None:
+            self.drive(0, 0)
+            return
+
+        age = time.ticks_diff(time.ticks_us(), self.t_seen) // 1000
+        if age > lost_ms:
+            self.drive(0, 0)
+            return
+
+        # Predict where the target is now
+        bearing = self.predict_bearing(max_predict_ms)
+
+        pid_error = self.PID.get_pid(bearing - self.servo.pan_pos, 1)
+        self.servo.set_angle(self.servo.pan_pos + pid_error)
+
+        # Convert to angle correction weight (between -1 and 1)
+        self.drive(speed, self.servo.pan_pos/self.servo.max_deg)
+
+
+    def follow_line(self, speed: float = 0.3, threshold_idx: int = 0, n_strips: int = 3,
+                    strip_h: int = 20, k_heading: float = 1.0, k_curve: float = 0.5,
+                    slow_down: float = 0.5) -> None:
+        """
+        Follows a line on the ground by thresholding only a few horizontal strips
+        of the image, with the camera pan fixed facing forward.
+
+        Args:
+            speed (float): Forward speed coefficient on a straight line (0 to 1).
+            threshold_idx (int): Index along the camera thresholds of the line colour.
+            n_strips (int): Number of strips scanned per frame.
+            strip_h (int): Height of each strip in pixels.
+            k_heading (float): Steering gain on the heading error.
+            k_curve (float): Steering gain on the line curvature.
+            slow_down (float): Fraction of speed removed on the tightest curves.
+        """
+        self.servo.set_angle(0)
+        strips = self.cam.get_line_strips(n_strips, strip_h)
+
+        while True:
+            centroids, img = self.cam.get_strip_centroids(threshold_idx, strips)
+            heading, curve = self.line_error(centroids, strips)
+
+            if heading is None:
+                self.lost_frames += 1
                 self.drive(0, 0)
-                print('Correct blob not found')
+                continue
+
+            # Positive errors mean the line is to the right, which needs a negative bias
+            bias = -(k_heading*heading + k_curve*curve)
+
+            # Slow down on curves
+            self.drive(speed*(1 - slow_down*min(abs(curve), 1)), bias)
+
+
+    def line_error(self, centroids: list, strips: list) -> tuple:
+        """
+        Derive the heading error and curvature of the line from the strip centroids.
+
+        Args:
+            centroids (list): x centroid of the line in each strip, None where not found.
+            strips (list): ROIs the centroids were found in, from the bottom of the image up.
+
+        Returns:
+            heading (float): Weighted offset of the line from the image centre (-1 to 1), None if not found.
+            curve (float): Change in line offset from the nearest to the furthest strip (-2 to 2).
+        """
+        total = 0
+        weight_sum = 0
+        found = []
+
+        for i, cx in enumerate(centroids):
+            if cx is None:
+                continue
+
+            # Normalised offset, nearer strips are weighted more
+            offset = (cx - self.cam.w_centre)/self.cam.w_centre
+            weight = len(centroids) - i
+            total += weight*offset
+            weight_sum += weight
+            found.append((offset, strips[i][1]))
+
+        if not found:
+            return None, 0
+
+        heading = total/weight_sum
+
+        # Curvature from the nearest and furthest strips the line was found in
+        curve = 0
+        if len(found) > 1:
+            curve = found[-1][0] - found[0][0]
+
+        return heading, curve
 
 
     def track_blob(self, threshold_idx: int):
@@ -60,15 +337,16 @@ class Robot(object):
         # Get list of blobs and biggest blob
         blobs, img = self.cam.get_blobs()
         big_blob = self.cam.get_biggest_blob(blobs)
+        self.cam.update_thresholds(img, big_blob, threshold_idx)
 
         # Check biggest blob is not None and is the defined ID
-        if big_blob is not None and self.cam.find_blob(big_blob, threshold_idx):
+        if self.cam.blob_matches(big_blob, threshold_idx):
 
-            # Error between camera angle and target in pixels
-            pixel_error = big_blob.cx() - self.cam.w_centre
+            # Error between camera angle and target, looked up from the target column
+            angle_error = self.cam.bearing(big_blob.cx())
 
-            # Convert error to angle
-            angle_error = -(pixel_error/sensor.width()*self.cam.h_fov)
+            # Remember where the target was for reacquisition
+            self.update_target(self.servo.pan_pos + angle_error, self.cam.t_capture)
 
             pid_error = self.PID.get_pid(angle_error,1)
 
@@ -80,10 +358,104 @@ class Robot(object):
 
             return big_blob
         else:
-            print('Correct blob not found')
+            # Steady state mode only counts misses, see lost_frames
+            self.lost_frames += 1
+            if not self.steady:
+                log.warn('Correct blob not found')
             return None
 
 
+    def reacquire(self, threshold_idx: int, timeout_ms: int = 3000, stride: int = 4,
+                  overlap: float = 0.2, settle_ms_per_deg: float = 2):
+        """
+        Search for a lost target by panning in an expanding pattern around its
+        predicted bearing, starting on the side it was moving towards. In each
+        frame only the part of the field of view not yet searched is scanned,
+        using a strided (low cost) blob search.
+
+        Args:
+            threshold_idx (int): Index along the camera thresholds of the blob to find.
+            timeout_ms (int): Time (ms) to search for before giving up.
+            stride (int): x and y stride of the blob search.
+            overlap (float): Fraction of the field of view overlapped between pan steps.
+            settle_ms_per_deg (float): Time (ms) per degree of pan to wait for the servo.
+
+        Returns:
+            blob: The blob found, with the pan servo moved to face it, otherwise None.
+        """
+        t_start = time.ticks_ms()
+        self.search_count += 1
+
+        half_fov = self.cam.h_fov/2
+        step = self.cam.h_fov*(1 - overlap)
+        centre = self.predict_bearing()
+        if centre is None:
+            centre = self.servo.pan_pos
+        direction = 1 if self.target_rate >= 0 else -1
+
+        # Bearing ranges already searched, starting with the frame the target was lost in
+        covered = [(self.servo.pan_pos - half_fov, self.servo.pan_pos + half_fov)]
+        k = 0
+
+        while time.ticks_diff(time.ticks_ms(), t_start) < timeout_ms:
+            # Expanding pattern around the prediction: 0, +1, -1, +2, -2 ... steps
+            offset = ((k + 1)//2)*step*(direction if k % 2 else -direction)
+            pan = max(min(centre + offset, self.servo.max_deg), self.servo.min_deg)
+            k += 1
+
+            if not self.cam.exposed_spans(pan, covered):
+                # Both pan limits reached, the whole range has been searched so start again
+                if k > 2*(self.servo.degrees/step + 1):
+                    self.search_full_sweeps += 1
+                    covered = []
+                    k = 0
+                continue
+
+            delta = abs(pan - self.servo.pan_pos)
+            self.servo.set_angle(pan)
+            time.sleep_ms(int(delta*settle_ms_per_deg))
+
+            # Only scan the columns that have not been searched yet, on either side
+            rois = self.cam.get_exposed_rois(self.servo.pan_pos, covered)
+            covered = self.cam.add_covered(covered, self.servo.pan_pos - half_fov,
+                                           self.servo.pan_pos + half_fov)
+
+            blobs, img = self.cam.get_blobs_rois(rois, stride)
+            blob = self.cam.get_biggest_blob(blobs)
+
+            if self.cam.blob_matches(blob, threshold_idx):
+                # Face the target and restart the controller from there
+                bearing = self.servo.pan_pos + self.cam.bearing(blob.cx())
+                self.servo.set_angle(bearing)
+                self.PID.reset_I()
+                self.target_rate = 0
+                self.update_target(bearing, self.cam.t_capture)
+
+                t_found = time.ticks_diff(time.ticks_ms(), t_start)
+                self.search_found += 1
+                self.search_time_sum += t_found
+                self.search_time_max = max(self.search_time_max, t_found)
+                log.info('Target reacquired (ms):', t_found)
+
+                return blob
+
+        log.warn('Target not reacquired')
+
+        return None
+
+
+    def search_stats(self) -> dict:
+        """
+        Returns:
+            dict: Searches started, targets reacquired, mean/max time to reacquire (ms) and full sweeps.
+        """
+        return {'searches': self.search_count,
+                'found': self.search_found,
+                'time_mean': self.search_time_sum // max(self.search_found, 1),
+                'time_max': self.search_time_max,
+                'full_sweeps': self.search_full_sweeps}
+
+
     def drive(self, speed: float, bias: float) -> None:
         """
         Resets the servo positions to their default states.
@@ -0,0 +1,64 @@
+"""
+Host side script to precompile the robot modules to .mpy for fast boot.
+
+Example:
+python build_mpy.py            # writes ./mpy/*.mpy, copy the mpy directory to the SD card
+
+Requires mpy-cross (pip install mpy-cross) matching the MicroPython version of
+the OpenMV firmware, otherwise the board refuses to import the .mpy files.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Modules imported by the exercises, the exercise scripts themselves stay as .py
+MODULES = [
+    'pca9685.py',
+    'scheduler.py',
+    'gc_control.py',
+    'logger.py',
+    'fastboot.py',
+    'recorder.py',
+    'tracker.py',
+    os.path.join('Assignment 1', 'camera.py'),
+    os.path.join('Assignment 1', 'servos.py'),
+    os.path.join('Assignment 2', 'pid.py'),
+    os.path.join('Assignment 2', 'tuning.py'),
+    os.path.join('Assignment 3', 'robot.py'),
+]
+
+
+def build(out_dir: str, mpy_cross: str = 'mpy-cross', opt: int = 2) -> None:
+    """
+    Compile each module to out_dir/<name>.mpy.
+
+    Args:
+        out_dir (str): Output directory.
+        mpy_cross (str): mpy-cross executable.
+        opt (int): Optimisation level (-O), 2 or more removes asserts and line numbers.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    for module in MODULES:
+        src = os.path.join(ROOT, module)
+        dst = os.path.join(out_dir, os.path.splitext(os.path.basename(module))[0] + '.mpy')
+
+        print('Compiling', module, '->', dst)
+        subprocess.run([mpy_cross, '-O' + str(opt), '-o', dst, src], check=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Precompile robot modules to .mpy')
+    parser.add_argument('--out', default=os.path.join(ROOT, 'mpy'), help='Output directory')
+    parser.add_argument('--mpy-cross', default='mpy-cross', help='mpy-cross executable')
+    parser.add_argument('-O', dest='opt', type=int, default=2, help='Optimisation level')
+    args = parser.parse_args()
+
+    try:
+        build(args.out, args.mpy_cross, args.opt)
+    except FileNotFoundError:
+        sys.exit('mpy-cross not found, install it with: pip install mpy-cross')
@@ -0,0 +1,115 @@
+"""
+Example:
+import fastboot
+fastboot.enable_mpy()               # before importing the other modules
+from robot import *
+robot = Robot(thresholds, fast_boot=True)
+fastboot.report(robot.servo)
+"""
+
+import os, sys
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+CONFIG_PATH = 'fastboot.json'
+MPY_DIR = 'mpy'
+VERSION = 1
+
+
+def load(path: str = CONFIG_PATH) -> dict:
+    """
+    Load the saved fast boot profile.
+
+    Args:
+        path (str): Path of the profile file.
+
+    Returns:
+        dict: Saved profile, or an empty dict if there is none or it is unreadable.
+    """
+    try:
+        with open(path, 'r') as file:
+            profile = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if profile.get('version') != VERSION:
+        return {}
+
+    return profile
+
+
+def save(section: str, values: dict, path: str = CONFIG_PATH) -> None:
+    """
+    Save one section ('cam' or 'servo') of the fast boot profile, keeping the others.
+
+    Args:
+        section (str): Name of the section.
+        values (dict): Values to save.
+        path (str): Path of the profile file.
+    """
+    profile = load(path)
+    profile['version'] = VERSION
+    profile[section] = values
+
+    with open(path, 'w') as file:
+        json.dump(profile, file)
+        file.flush()
+
+
+def clear(path: str = CONFIG_PATH) -> None:
+    """
+    Delete the saved profile, forcing a full warm-up on the next boot.
+
+    Args:
+        path (str): Path of the profile file.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def enable_mpy(directory: str = MPY_DIR) -> bool:
+    """
+    Put the precompiled modules directory (built with build_mpy.py) at the front
+    of sys.path. MicroPython prefers a .py over a .mpy in the same directory,
+    so the .mpy files are kept in their own directory. Call before importing.
+
+    Args:
+        directory (str): Directory of .mpy files, relative to the working directory.
+
+    Returns:
+        bool: True if the directory exists and was added.
+    """
+    path = os.getcwd().rstrip('/') + '/' + directory
+
+    try:
+        os.stat(path)
+    except OSError:
+        return False
+
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+    return True
+
+
+def report(servo) -> int:
+    """
+    Print the time from boot to the first servo command after soft_reset.
+
+    Args:
+        servo (Servo): Servo object that has been commanded.
+
+    Returns:
+        int: Time (ms) from boot to first actuation, None if not actuated yet.
+    """
+    if servo.t_first_actuation is None:
+        print('No servo command sent yet')
+    else:
+        print('Time to first actuation (ms):', servo.t_first_actuation)
+
+    return servo.t_first_actuation
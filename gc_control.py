@@ -0,0 +1,100 @@
+import gc, time
+
+class GCControl(object):
+    """
+    Controls when garbage collection happens in a control loop. Automatic
+    collection is disabled and gc.collect() is called at a fixed point of
+    each loop, so each collection only has a single tick of garbage to
+    free and never lands in the middle of steering.
+    """
+
+    def __init__(self, every: int = 1):
+        """
+        Initialise the GC controller.
+
+        Args:
+            every (int): Collect on every n-th call to tick().
+        """
+        self.every = every
+        self.active = False
+        self.reset()
+
+
+    def reset(self) -> None:
+        """
+        Clear the tick, collection and pause counters.
+        """
+        self.ticks = 0
+        self.collections = 0
+        self.pause_last = 0
+        self.pause_max = 0
+        self.pause_sum = 0
+        self.heap_used = 0
+        self.heap_max = 0
+
+
+    def start(self) -> None:
+        """
+        Collect once, then disable automatic collection. MicroPython still
+        collects by itself if an allocation would otherwise fail.
+        """
+        gc.collect()
+        gc.disable()
+        self.active = True
+        self.reset()
+
+
+    def stop(self) -> None:
+        """
+        Re-enable automatic collection.
+        """
+        gc.enable()
+        self.active = False
+
+
+    def tick(self) -> None:
+        """
+        Call once per loop at the point where a pause does the least harm,
+        e.g. after the servos have been updated and before the next snapshot.
+        """
+        self.ticks += 1
+        if self.ticks % self.every == 0:
+            self.collect()
+
+
+    def collect(self) -> int:
+        """
+        Run a collection now and update the counters.
+
+        Returns:
+            int: Time (us) spent collecting.
+        """
+        # Heap use just before collecting is the peak for this tick
+        self.heap_used = gc.mem_alloc()
+        if self.heap_used > self.heap_max:
+            self.heap_max = self.heap_used
+
+        t_start = time.ticks_us()
+        gc.collect()
+        pause = time.ticks_diff(time.ticks_us(), t_start)
+
+        self.collections += 1
+        self.pause_last = pause
+        self.pause_sum += pause
+        if pause > self.pause_max:
+            self.pause_max = pause
+
+        return pause
+
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: Collections, mean/max pause (us), heap used before the last collection and its peak (bytes).
+        """
+        return {'collections': self.collections,
+                'pause_mean': self.pause_sum // max(self.collections, 1),
+                'pause_max': self.pause_max,
+                'heap_used': self.heap_used,
+                'heap_max': self.heap_max,
+                'heap_free': gc.mem_free()}
@@ -0,0 +1,171 @@
+"""
+Example:
+from logger import log
+log.warn('Correct blob not found')        # cheap, no I/O in the control loop
+log.info('New max angle', max_angle)
+log.drain(print)                          # later, outside the control path
+"""
+
+import time
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARN: 'WARN', ERROR: 'ERROR'}
+
+
+class Logger(object):
+    """
+    A logger for hot loops. Messages are stored in a fixed-size in-RAM ring
+    buffer instead of being printed, repeats of the same message are
+    coalesced per time window, and the buffer is drained to serial, SD or
+    network separately from the control path.
+    """
+
+    def __init__(self, size: int = 64, level: int = INFO, window_ms: int = 1000):
+        """
+        Initialise the ring buffer and rate limiting.
+
+        Args:
+            size (int): Number of entries kept, the oldest are overwritten when full.
+            level (int): Minimum level stored (DEBUG, INFO, WARN or ERROR).
+            window_ms (int): Repeats of a message within this time (ms) are counted, not stored.
+        """
+        self.size = size
+        self.level = level
+        self.window_ms = window_ms
+
+        # Ring buffer of entries, preallocated
+        self._times = [0] * size
+        self._levels = bytearray(size)
+        self._msgs = [None] * size
+        self._values = [None] * size
+        self._head = 0
+        self._count = 0
+        self.dropped = 0
+
+        # Rate limiting state per message: [window start, repeats, last value, level]
+        self._windows = {}
+
+
+    def debug(self, msg: str, value=None) -> None:
+        self.log(DEBUG, msg, value)
+
+    def info(self, msg: str, value=None) -> None:
+        self.log(INFO, msg, value)
+
+    def warn(self, msg: str, value=None) -> None:
+        self.log(WARN, msg, value)
+
+    def error(self, msg: str, value=None) -> None:
+        self.log(ERROR, msg, value)
+
+
+    def log(self, level: int, msg: str, value=None) -> None:
+        """
+        Store a message, or count it if it was already stored within the window.
+        Use constant message strings and pass changing data as value, so the
+        message can be used to coalesce repeats without formatting.
+
+        Args:
+            level (int): Level of the message.
+            msg (str): Message text, also the key for coalescing.
+            value: Optional value printed after the message.
+        """
+        if level < self.level:
+            return
+
+        now = time.ticks_ms()
+        window = self._windows.get(msg)
+
+        if window is not None and time.ticks_diff(now, window[0]) < self.window_ms:
+            window[1] += 1
+            window[2] = value
+            return
+
+        if window is None:
+            self._windows[msg] = [now, 0, None, level]
+        else:
+            self._close(msg, window)
+            window[0] = now
+
+        self._push(now, level, msg, value)
+
+
+    def drain(self, write, max_entries: int = None) -> int:
+        """
+        Write out stored entries, oldest first. Call outside the control path.
+
+        Args:
+            write (function): Called with each formatted line, e.g. print or a file/socket writer.
+            max_entries (int): Maximum number of entries to write, None for all.
+
+        Returns:
+            int: Number of entries written.
+        """
+        # Report repeats of messages whose window has finished
+        now = time.ticks_ms()
+        for msg, window in self._windows.items():
+            if window[1] and time.ticks_diff(now, window[0]) >= self.window_ms:
+                self._close(msg, window)
+
+        if self.dropped:
+            write('[log] ' + str(self.dropped) + ' entries dropped')
+            self.dropped = 0
+
+        written = 0
+        while self._count and (max_entries is None or written < max_entries):
+            idx = (self._head - self._count) % self.size
+            write(self._format(idx))
+            self._msgs[idx] = None
+            self._values[idx] = None
+            self._count -= 1
+            written += 1
+
+        return written
+
+
+    def _push(self, t: int, level: int, msg: str, value) -> None:
+        """
+        Add an entry to the ring buffer, overwriting the oldest if full.
+        """
+        idx = self._head
+        self._times[idx] = t
+        self._levels[idx] = level
+        self._msgs[idx] = msg
+        self._values[idx] = value
+
+        self._head = (idx + 1) % self.size
+        if self._count < self.size:
+            self._count += 1
+        else:
+            self.dropped += 1
+
+
+    def _close(self, msg: str, window: list) -> None:
+        """
+        Store a summary entry for the repeats counted in a window.
+        """
+        if window[1]:
+            summary = msg + ' (x' + str(window[1]) + ' in last ' + str(self.window_ms / 1000) + 's)'
+            self._push(window[0], window[3], summary, window[2])
+        window[1] = 0
+        window[2] = None
+
+
+    def _format(self, idx: int) -> str:
+        """
+        Format a single entry as '[time ms] LEVEL message value'.
+        """
+        line = ('[' + str(self._times[idx]) + '] ' + LEVEL_NAMES.get(self._levels[idx], '?') +
+                ' ' + self._msgs[idx])
+        if self._values[idx] is not None:
+            line += ' ' + str(self._values[idx])
+
+        return line
+
+
+# Shared logger for all modules
+log = Logger()
@@ -0,0 +1,268 @@
+"""
+Example:
+camera.start_recording('/rec0', fmt='jpeg', servo=servo)
+while True:
+    blobs, img = camera.get_blobs()        # frames are queued as they are captured
+    ...
+    camera.recorder.flush()                # write a chunk after the servos are updated
+camera.stop_recording()
+
+Session layout (read on the host with replay.session.Session):
+    meta.json    sensor/camera settings, frame format and counts
+    frames.bin   frame payloads back to back (raw or JPEG)
+    index.bin    one INDEX_FORMAT record per written frame
+"""
+
+import os, time, ustruct
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+# seq, capture time (us since first frame, 64-bit so it does not wrap after 71 min),
+# offset and length in frames.bin, pan (deg), left and right speed
+INDEX_FORMAT = '<IQIIfff'
+INDEX_SIZE = ustruct.calcsize(INDEX_FORMAT)
+VERSION = 2
+
+# Largest raw frame (bytes), QVGA RGB565. Raw VGA slots (614 KB each) do not fit in RAM.
+RAW_LIMIT = 153600
+
+
+class Recorder(object):
+    """
+    Records camera frames to the SD card. Frames are copied into a fixed
+    number of preallocated slots when captured, and written out in bounded
+    chunks by flush(), which is called outside the control path. Frames
+    arriving while every slot is full are dropped and counted.
+
+    JPEG frames are compressed when captured, as the frame buffer is reused
+    by the next snapshot and keeping raw copies until flush() would need a
+    raw slot per frame. The compression time is measured, see summary().
+    """
+
+    def __init__(self, path: str, fmt: str = 'jpeg', quality: int = 50, slots: int = 2,
+                 slot_size: int = 65536, chunk: int = 16384, servo=None, meta: dict = None,
+                 frame_size: int = None):
+        """
+        Create the session directory and open its files.
+
+        Args:
+            path (str): Session directory, created if missing.
+            fmt (str): 'jpeg' to compress frames or 'raw' for the frame buffer as is.
+            quality (int): JPEG quality (0-100).
+            slots (int): Number of frames that can wait to be written.
+            slot_size (int): Largest JPEG frame (bytes), raw slots are sized to the frame.
+            chunk (int): Largest number of bytes written by a single flush().
+            servo (Servo): Servo whose pan angle and wheel speeds are stored with each frame.
+            meta (dict): Extra items for meta.json, e.g. thresholds and sensor settings.
+            frame_size (int): Raw frame size (bytes) if known, the raw slots are then
+                allocated here instead of at the first frame.
+
+        Raises:
+            ValueError: If raw frames are larger than RAW_LIMIT.
+        """
+        if fmt == 'raw' and frame_size is not None:
+            _check_raw(frame_size)
+
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass
+
+        self.path = path
+        self.fmt = fmt
+        self.quality = quality
+        self.chunk = chunk
+        self.servo = servo
+        self.meta = meta if meta is not None else {}
+
+        self.frames_file = open(path + '/frames.bin', 'wb')
+        self.index_file = open(path + '/index.bin', 'wb')
+
+        # Raw slots are allocated when the frame size is known
+        self.n_slots = slots
+        self.slot_size = slot_size
+        if fmt == 'raw':
+            self.slot_size = frame_size
+        self.slots = [bytearray(self.slot_size) for i in range(slots)] if self.slot_size else None
+        self.lengths = [0] * slots
+        self.records = [bytearray(INDEX_SIZE) for i in range(slots)]
+        self.head = 0
+        self.tail = 0
+        self.pending = 0
+        self.write_pos = 0
+
+        self.seq = 0
+        self.offset = 0
+        self.t_last = None
+        self.t_rel = 0
+        self.written = 0
+        self.dropped = 0
+        self.oversize = 0
+        self.width = 0
+        self.height = 0
+
+        # JPEG compression count and time (us)
+        self.compressed = 0
+        self.compress_us_last = 0
+        self.compress_us_max = 0
+        self.compress_us_sum = 0
+
+
+    def add(self, img, t_capture: int) -> bool:
+        """
+        Queue a captured frame. Call straight after the snapshot, before the image is modified.
+
+        Args:
+            img (image): Captured image.
+            t_capture (int): Capture time from time.ticks_us().
+
+        Returns:
+            bool: True if the frame was queued, False if it was dropped.
+
+        Raises:
+            ValueError: If raw frames are larger than RAW_LIMIT.
+        """
+        seq = self.seq
+        self.seq += 1
+
+        # Capture time since the first frame, accumulated so ticks_us wrapping does not matter
+        if self.t_last is not None:
+            self.t_rel += time.ticks_diff(t_capture, self.t_last)
+        self.t_last = t_capture
+
+        if self.pending == self.n_slots:
+            self.dropped += 1
+            return False
+
+        if self.slots is None:
+            _check_raw(img.size())
+            self.width = img.width()
+            self.height = img.height()
+            self.slot_size = img.size()
+            self.slots = [bytearray(self.slot_size) for i in range(self.n_slots)]
+
+        if self.fmt == 'jpeg':
+            t_start = time.ticks_us()
+            data = img.compressed(quality=self.quality).bytearray()
+            elapsed = time.ticks_diff(time.ticks_us(), t_start)
+            self.compressed += 1
+            self.compress_us_last = elapsed
+            self.compress_us_sum += elapsed
+            if elapsed > self.compress_us_max:
+                self.compress_us_max = elapsed
+        else:
+            data = img.bytearray()
+
+        length = len(data)
+        if length > self.slot_size:
+            self.oversize += 1
+            self.dropped += 1
+            return False
+
+        self.width = img.width()
+        self.height = img.height()
+
+        slot = self.head
+        memoryview(self.slots[slot])[:length] = data
+        self.lengths[slot] = length
+
+        pan = l_speed = r_speed = 0
+        if self.servo is not None:
+            pan = self.servo.pan_pos
+            l_speed = self.servo.curr_l_speed
+            r_speed = self.servo.curr_r_speed
+
+        ustruct.pack_into(INDEX_FORMAT, self.records[slot], 0, seq, self.t_rel,
+                          self.offset, length, pan, l_speed, r_speed)
+
+        self.offset += length
+        self.head = (slot + 1) % self.n_slots
+        self.pending += 1
+
+        return True
+
+
+    def flush(self, max_bytes: int = None) -> int:
+        """
+        Write up to max_bytes of queued frames. Call outside the control path,
+        e.g. after the servos have been updated or from a scheduler task.
+
+        Args:
+            max_bytes (int): Largest number of bytes to write, defaults to self.chunk.
+
+        Returns:
+            int: Number of frame bytes written.
+        """
+        budget = self.chunk if max_bytes is None else max_bytes
+        written = 0
+
+        while self.pending and written < budget:
+            slot = self.tail
+            end = min(self.lengths[slot], self.write_pos + budget - written)
+
+            self.frames_file.write(memoryview(self.slots[slot])[self.write_pos:end])
+            written += end - self.write_pos
+            self.write_pos = end
+
+            # Frame complete, its index record can be written
+            if self.write_pos == self.lengths[slot]:
+                self.index_file.write(self.records[slot])
+                self.write_pos = 0
+                self.tail = (slot + 1) % self.n_slots
+                self.pending -= 1
+                self.written += 1
+
+        return written
+
+
+    def close(self) -> None:
+        """
+        Write all queued frames, the session metadata and close the files.
+        """
+        while self.pending:
+            self.flush()
+
+        self.frames_file.close()
+        self.index_file.close()
+
+        meta = {'version': VERSION,
+                'format': self.fmt,
+                'width': self.width,
+                'height': self.height,
+                'frames': self.written,
+                'captured': self.seq,
+                'dropped': self.dropped,
+                'oversize': self.oversize}
+        meta.update(self.meta)
+
+        with open(self.path + '/meta.json', 'w') as file:
+            json.dump(meta, file)
+
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: Frames captured, written, dropped and waiting to be written,
+                mean and max JPEG compression time (us).
+        """
+        return {'captured': self.seq,
+                'written': self.written,
+                'dropped': self.dropped,
+                'pending': self.pending,
+                'compress_us_mean': self.compress_us_sum // max(self.compressed, 1),
+                'compress_us_max': self.compress_us_max}
+
+
+def _check_raw(frame_size: int) -> None:
+    """
+    Reject raw frames too large for the preallocated slots.
+
+    Args:
+        frame_size (int): Raw frame size (bytes).
+    """
+    if frame_size > RAW_LIMIT:
+        raise ValueError('Raw frames of ' + str(frame_size) + ' bytes are over RAW_LIMIT (' +
+                         str(RAW_LIMIT) + "), use fmt='jpeg' or a smaller frame size")
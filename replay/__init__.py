@@ -0,0 +1,113 @@
+"""
+Host side replay of sessions recorded with Cam.start_recording().
+
+The robot modules import the OpenMV sensor, machine and MicroPython time
+functions, install() puts stand-ins for them in place so the unmodified
+Cam/Servo/Robot code runs on a host, fed frame by frame from a session on a
+virtual clock. Detection uses a numpy find_blobs (replay.image) which follows
+the OpenMV blob layout but is not bit exact with the firmware.
+
+Example:
+import replay
+replay.install('/path/to/rec0')
+from robot import Robot
+robot = Robot(replay.meta()['thresholds'])
+while True:
+    robot.track_blob(0)       # raises replay.ReplayFinished after the last frame
+"""
+
+import json
+import os
+import struct
+import sys
+import time
+import types
+
+from .clock import clock
+from .sensor import ReplayFinished
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = [ROOT] + [os.path.join(ROOT, 'Assignment %d' % i) for i in (1, 2, 3)]
+
+MODULES = ('sensor', 'machine', 'ustruct', 'ujson', 'utime', 'micropython')
+TIME_FUNCTIONS = ('ticks_ms', 'ticks_us', 'ticks_cpu', 'ticks_diff', 'ticks_add',
+                  'sleep_ms', 'sleep_us', 'sleep', 'clock')
+
+
+def install(session_path: str = None, add_paths: bool = True):
+    """
+    Install the fake OpenMV modules and the virtual clock.
+
+    Args:
+        session_path (str): Session directory to replay, can also be given later
+            with replay.sensor.load() or the OPENMV_REPLAY environment variable.
+        add_paths (bool): Add the repository and Assignment directories to sys.path.
+
+    Returns:
+        function: Undo, puts the time module, gc, sys.modules and sys.path back
+            as they were before the call.
+    """
+    from . import machine, sensor
+    import gc
+
+    missing = object()
+    saved_modules = {name: sys.modules.get(name, missing) for name in MODULES}
+    saved_time = {name: getattr(time, name, missing) for name in TIME_FUNCTIONS}
+    saved_gc = {name: getattr(gc, name, missing) for name in ('mem_alloc', 'mem_free')}
+    saved_path = list(sys.path)
+
+    def undo():
+        for name, module in saved_modules.items():
+            if module is missing:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        for target, saved in ((time, saved_time), (gc, saved_gc)):
+            for name, value in saved.items():
+                if value is missing:
+                    if hasattr(target, name):
+                        delattr(target, name)
+                else:
+                    setattr(target, name, value)
+        sys.path[:] = saved_path
+
+    sys.modules['sensor'] = sensor
+    sys.modules['machine'] = machine
+    sys.modules.setdefault('ustruct', struct)
+    sys.modules.setdefault('ujson', json)
+
+    # MicroPython time functions on the virtual clock, also used as utime
+    for name in TIME_FUNCTIONS:
+        setattr(time, name, getattr(clock, name))
+    sys.modules['utime'] = time
+
+    if 'micropython' not in sys.modules:
+        micropython = types.ModuleType('micropython')
+        micropython.const = lambda x: x
+        micropython.schedule = lambda fn, arg: fn(arg)
+        micropython.mem_info = lambda *args: None
+        sys.modules['micropython'] = micropython
+
+    if not hasattr(gc, 'mem_alloc'):
+        gc.mem_alloc = lambda: 0
+        gc.mem_free = lambda: 0
+
+    if add_paths:
+        for path in reversed(PATHS):
+            if path not in sys.path:
+                sys.path.insert(0, path)
+
+    if session_path is not None:
+        sensor.load(session_path)
+
+    return undo
+
+
+def meta() -> dict:
+    """
+    Returns:
+        dict: meta.json of the session being replayed.
+    """
+    from . import sensor
+
+    return sensor.session().meta
@@ -0,0 +1,82 @@
+"""
+Virtual clock for replaying sessions on a host. Time only moves when a frame
+is captured (to the frame's recorded capture time) or the code sleeps, so a
+replay gives the same result every run regardless of host speed.
+"""
+
+
+class Clock(object):
+    """
+    Stand-in for the MicroPython ticks_* and sleep_* functions.
+    """
+
+    def __init__(self, start_us: int = 0):
+        """
+        Args:
+            start_us (int): Initial time (us).
+        """
+        self.now_us = start_us
+
+
+    def advance_to(self, t_us: int) -> None:
+        """
+        Move the clock forward to a time, it never moves backwards.
+
+        Args:
+            t_us (int): Time (us).
+        """
+        if t_us > self.now_us:
+            self.now_us = t_us
+
+
+    def ticks_us(self) -> int:
+        return self.now_us
+
+    def ticks_ms(self) -> int:
+        return self.now_us // 1000
+
+    def ticks_cpu(self) -> int:
+        return self.now_us
+
+    def ticks_diff(self, a: int, b: int) -> int:
+        return a - b
+
+    def ticks_add(self, a: int, b: int) -> int:
+        return a + b
+
+    def sleep_us(self, us: int) -> None:
+        self.now_us += max(int(us), 0)
+
+    def sleep_ms(self, ms: int) -> None:
+        self.now_us += max(int(ms * 1000), 0)
+
+    def sleep(self, s: float) -> None:
+        self.now_us += max(int(s * 1000000), 0)
+
+    def clock(self):
+        return FPSClock(self)
+
+
+class FPSClock(object):
+    """
+    Stand-in for the OpenMV time.clock() object.
+    """
+
+    def __init__(self, clock: Clock):
+        self._clock = clock
+        self.t_tick = clock.now_us
+
+
+    def tick(self) -> None:
+        self.t_tick = self._clock.now_us
+
+    def avg(self) -> float:
+        return (self._clock.now_us - self.t_tick) / 1000
+
+    def fps(self) -> float:
+        elapsed = self._clock.now_us - self.t_tick
+        return 1000000 / elapsed if elapsed > 0 else 0.0
+
+
+# Shared by the fake sensor and the patched time module
+clock = Clock()
@@ -0,0 +1,449 @@
+"""
+Host side stand-in for the parts of the OpenMV image class used by Cam,
+backed by numpy arrays, including a find_blobs that follows the OpenMV
+blob layout so recorded frames can be re-detected on a host.
+"""
+
+import io
+import math
+
+import numpy as np
+
+
+class Blob(tuple):
+    """
+    Host version of the OpenMV blob, indexable like the original:
+    (x, y, w, h, pixels, cx, cy, rotation, code, count).
+    """
+
+    def x(self): return self[0]
+    def y(self): return self[1]
+    def w(self): return self[2]
+    def h(self): return self[3]
+    def pixels(self): return self[4]
+    def cx(self): return self[5]
+    def cy(self): return self[6]
+    def rotation(self): return self[7]
+    def code(self): return self[8]
+    def count(self): return self[9]
+    def rect(self): return tuple(self[0:4])
+    def area(self): return self[2] * self[3]
+    def density(self): return self[4] / max(self.area(), 1)
+
+
+class Image(object):
+    """
+    Host version of the OpenMV image for RGB565 and GRAYSCALE frames.
+    """
+
+    def __init__(self, pixels: np.ndarray):
+        """
+        Args:
+            pixels (np.ndarray): HxWx3 uint8 RGB or HxW uint8 grayscale pixels.
+        """
+        self.pixels = pixels
+        self._lab = None
+
+
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    def is_grayscale(self) -> bool:
+        return self.pixels.ndim == 2
+
+
+    def size(self) -> int:
+        """
+        Returns:
+            int: Size (bytes) of the frame buffer the image would use on the board.
+        """
+        return self.width() * self.height() * (1 if self.is_grayscale() else 2)
+
+
+    def bytearray(self) -> bytearray:
+        """
+        Returns:
+            bytearray: Frame buffer bytes, RGB565 little endian or 8-bit grayscale.
+        """
+        if self.is_grayscale():
+            return bytearray(self.pixels.tobytes())
+
+        p = self.pixels.astype(np.uint16)
+        rgb565 = ((p[..., 0] >> 3) << 11) | ((p[..., 1] >> 2) << 5) | (p[..., 2] >> 3)
+
+        return bytearray(rgb565.astype('<u2').tobytes())
+
+
+    def to_grayscale(self, copy: bool = False, rgb_channel: int = -1):
+        """
+        Convert to grayscale, using luminance or a single RGB channel.
+
+        Args:
+            copy (bool): Return a new image instead of converting in place.
+            rgb_channel (int): -1 for luminance, otherwise 0 R, 1 G or 2 B.
+
+        Returns:
+            Image: The grayscale image.
+        """
+        if self.is_grayscale():
+            gray = self.pixels
+        elif rgb_channel in (0, 1, 2):
+            gray = self.pixels[..., rgb_channel]
+        else:
+            gray = (self.pixels.astype(np.float32) @ np.array([0.299, 0.587, 0.114])).astype(np.uint8)
+
+        if copy:
+            return Image(np.ascontiguousarray(gray))
+
+        self.pixels = np.ascontiguousarray(gray)
+        self._lab = None
+
+        return self
+
+
+    def compressed(self, quality: int = 90):
+        """
+        JPEG compress the image, requires Pillow.
+
+        Args:
+            quality (int): JPEG quality (0-100).
+
+        Returns:
+            JPEG: Object with bytearray() and size() like a compressed OpenMV image.
+        """
+        from PIL import Image as PILImage
+
+        buffer = io.BytesIO()
+        PILImage.fromarray(self.pixels).save(buffer, format='JPEG', quality=quality)
+
+        return JPEG(buffer.getvalue())
+
+
+    def lab(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: HxWx3 int16 LAB pixels (L 0~100, A and B -128~127), cached.
+        """
+        if self._lab is None:
+            self._lab = rgb_to_lab(self.pixels)
+
+        return self._lab
+
+
+    def find_blobs(self, thresholds, invert: bool = False, roi: tuple = None,
+                   x_stride: int = 2, y_stride: int = 1, area_threshold: int = 10,
+                   pixels_threshold: int = 10, merge: bool = False, margin: int = 0) -> list:
+        """
+        Find connected regions of pixels inside each threshold, like the OpenMV
+        find_blobs. Strides only change where the board starts its flood fills,
+        so they are accepted but every pixel is labelled here.
+
+        Args:
+            thresholds (list): LAB (6 values) or grayscale (2 values) thresholds.
+            invert (bool): Find pixels outside the thresholds instead.
+            roi (tuple): Region of interest (x, y, w, h), the whole image by default.
+            x_stride (int): Unused, see above.
+            y_stride (int): Unused, see above.
+            area_threshold (int): Minimum bounding box area of a blob.
+            pixels_threshold (int): Minimum number of pixels in a blob.
+            merge (bool): Merge blobs whose bounding boxes overlap.
+            margin (int): Extra distance (pixels) at which blobs are merged.
+
+        Returns:
+            list: Blobs found, in threshold order.
+        """
+        rx, ry, rw, rh = roi if roi is not None else (0, 0, self.width(), self.height())
+        rx, ry = max(rx, 0), max(ry, 0)
+        rw, rh = min(rw, self.width() - rx), min(rh, self.height() - ry)
+
+        source = self.pixels if self.is_grayscale() else self.lab()
+        source = source[ry:ry + rh, rx:rx + rw]
+
+        blobs = []
+        for idx, threshold in enumerate(thresholds):
+            mask = threshold_mask(source, threshold)
+            if invert:
+                mask = ~mask
+
+            for stats in label_runs(mask):
+                pixels, x0, y0, x1, y1, sx, sy, sxx, syy, sxy = stats
+                w, h = x1 - x0 + 1, y1 - y0 + 1
+                if pixels < pixels_threshold or w * h < area_threshold:
+                    continue
+
+                cx, cy = sx / pixels, sy / pixels
+                mu20 = sxx / pixels - cx * cx
+                mu02 = syy / pixels - cy * cy
+                mu11 = sxy / pixels - cx * cy
+                rotation = (0.5 * math.atan2(2 * mu11, mu20 - mu02)) % math.pi
+
+                blobs.append(Blob((x0 + rx, y0 + ry, w, h, pixels,
+                                   int(round(cx)) + rx, int(round(cy)) + ry,
+                                   rotation, 1 << idx, 1)))
+
+        if merge:
+            blobs = merge_blobs(blobs, margin)
+
+        return blobs
+
+
+    def mean_pooled(self, x_div: int, y_div: int):
+        """
+        Returns:
+            Image: New image of the mean of each x_div by y_div block.
+        """
+        h, w = self.height() // y_div, self.width() // x_div
+        blocks = self.pixels[:h * y_div, :w * x_div].astype(np.float32)
+        if self.is_grayscale():
+            pooled = blocks.reshape(h, y_div, w, x_div).mean(axis=(1, 3))
+        else:
+            pooled = blocks.reshape(h, y_div, w, x_div, 3).mean(axis=(1, 3))
+
+        return Image(pooled.astype(np.uint8))
+
+
+    def difference(self, image):
+        """
+        Replace the image in place with its absolute difference from another of the same size.
+
+        Returns:
+            Image: This image.
+        """
+        self.pixels = np.abs(self.pixels.astype(np.int16) - image.pixels.astype(np.int16)).astype(np.uint8)
+        self._lab = None
+
+        return self
+
+
+    def get_statistics(self, thresholds=None, invert: bool = False, roi: tuple = None):
+        """
+        Channel means of the pixels in a region, optionally only those inside thresholds.
+
+        Args:
+            thresholds (list): Only count pixels inside any of these thresholds.
+            invert (bool): Count pixels outside the thresholds instead.
+            roi (tuple): Region of interest (x, y, w, h), the whole image by default.
+
+        Returns:
+            Statistics: Means like the OpenMV statistics object.
+        """
+        rx, ry, rw, rh = roi if roi is not None else (0, 0, self.width(), self.height())
+        source = self.pixels if self.is_grayscale() else self.lab()
+        source = source[max(ry, 0):ry + rh, max(rx, 0):rx + rw]
+
+        if thresholds:
+            mask = np.zeros(source.shape[:2], dtype=bool)
+            for threshold in thresholds:
+                mask |= threshold_mask(source, threshold)
+            if invert:
+                mask = ~mask
+            source = source[mask]
+
+        return Statistics(source.reshape(-1, 1 if self.is_grayscale() else 3))
+
+
+    # Drawing is only for the IDE frame buffer view, so is ignored on the host
+    def draw_rectangle(self, *args, **kwargs): return self
+    def draw_cross(self, *args, **kwargs): return self
+    def draw_line(self, *args, **kwargs): return self
+    def draw_edges(self, *args, **kwargs): return self
+    def draw_keypoints(self, *args, **kwargs): return self
+    def draw_string(self, *args, **kwargs): return self
+
+
+class Statistics(object):
+    """
+    Host version of the OpenMV statistics object, means and maxima only.
+    """
+
+    def __init__(self, pixels: np.ndarray):
+        """
+        Args:
+            pixels (np.ndarray): Nx1 grayscale or Nx3 LAB pixels counted.
+        """
+        empty = [0] * pixels.shape[1]
+        self.means = [int(round(m)) for m in pixels.mean(axis=0)] if len(pixels) else empty
+        self.maxs = [int(m) for m in pixels.max(axis=0)] if len(pixels) else empty
+
+    def mean(self) -> int: return self.means[0]
+    def l_mean(self) -> int: return self.means[0]
+    def a_mean(self) -> int: return self.means[1] if len(self.means) > 1 else 0
+    def b_mean(self) -> int: return self.means[2] if len(self.means) > 1 else 0
+    def max(self) -> int: return self.maxs[0]
+    def l_max(self) -> int: return self.maxs[0]
+
+
+class JPEG(object):
+    """
+    Compressed image returned by Image.compressed.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def bytearray(self) -> bytearray:
+        return bytearray(self.data)
+
+    def size(self) -> int:
+        return len(self.data)
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """
+    Convert sRGB pixels to LAB (D65 white), rounded like the OpenMV tables.
+
+    Args:
+        rgb (np.ndarray): HxWx3 uint8 RGB pixels.
+
+    Returns:
+        np.ndarray: HxWx3 int16 LAB pixels.
+    """
+    c = rgb.astype(np.float32) / 255
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+
+    xyz = c @ np.array([[0.4124, 0.2126, 0.0193],
+                        [0.3576, 0.7152, 0.1192],
+                        [0.1805, 0.0722, 0.9505]], dtype=np.float32)
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    lab = np.stack([116 * f[..., 1] - 16,
+                    500 * (f[..., 0] - f[..., 1]),
+                    200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+    return np.clip(np.rint(lab), -128, 127).astype(np.int16)
+
+
+def threshold_mask(source: np.ndarray, threshold: tuple) -> np.ndarray:
+    """
+    Pixels inside a threshold, min and max are swapped if given the wrong way round.
+
+    Args:
+        source (np.ndarray): HxW grayscale or HxWx3 LAB pixels.
+        threshold (tuple): (Min, Max) or (L Min, L Max, A Min, A Max, B Min, B Max).
+
+    Returns:
+        np.ndarray: HxW bool mask.
+    """
+    if source.ndim == 2:
+        lo, hi = sorted(threshold[0:2])
+        return (source >= lo) & (source <= hi)
+
+    mask = np.ones(source.shape[:2], dtype=bool)
+    for ch in range(3):
+        lo, hi = sorted(threshold[2 * ch:2 * ch + 2])
+        mask &= (source[..., ch] >= lo) & (source[..., ch] <= hi)
+
+    return mask
+
+
+def label_runs(mask: np.ndarray) -> list:
+    """
+    8-connected component labelling of a mask using horizontal runs and union-find.
+
+    Args:
+        mask (np.ndarray): HxW bool mask.
+
+    Returns:
+        list: Per component (pixels, x0, y0, x1, y1, sum x, sum y, sum x^2, sum y^2, sum xy).
+    """
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+
+    parent = []
+    runs = []
+    prev = []
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for y in range(mask.shape[0]):
+        starts = np.flatnonzero(edges[y] == 1)
+        ends = np.flatnonzero(edges[y] == -1)
+        current = []
+        j = 0
+
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            label = len(parent)
+            parent.append(label)
+            runs.append((y, start, end))
+            current.append((start, end, label))
+
+            # Runs on the previous row touching this one, including diagonally
+            while j < len(prev) and prev[j][1] < start:
+                j += 1
+            k = j
+            while k < len(prev) and prev[k][0] <= end:
+                a, b = find(prev[k][2]), find(label)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+                k += 1
+
+        prev = current
+
+    stats = {}
+    for label, (y, start, end) in enumerate(runs):
+        root = find(label)
+        n = end - start
+        sx = (start + end - 1) * n / 2
+        sxx = ((end - 1) * end * (2 * end - 1) - (start - 1) * start * (2 * start - 1)) / 6
+        s = stats.get(root)
+        if s is None:
+            stats[root] = [n, start, y, end - 1, y, sx, y * n, sxx, y * y * n, y * sx]
+        else:
+            s[0] += n
+            s[1] = min(s[1], start)
+            s[3] = max(s[3], end - 1)
+            s[4] = y
+            s[5] += sx
+            s[6] += y * n
+            s[7] += sxx
+            s[8] += y * y * n
+            s[9] += y * sx
+
+    return list(stats.values())
+
+
+def merge_blobs(blobs: list, margin: int = 0) -> list:
+    """
+    Merge blobs whose bounding boxes (grown by margin) overlap, like find_blobs(merge=True).
+
+    Args:
+        blobs (list): Blobs to merge.
+        margin (int): Extra distance (pixels) at which blobs are merged.
+
+    Returns:
+        list: Merged blobs, codes are OR'ed and counts added.
+    """
+    blobs = list(blobs)
+    merged = True
+
+    while merged:
+        merged = False
+        for i in range(len(blobs)):
+            for j in range(i + 1, len(blobs)):
+                a, b = blobs[i], blobs[j]
+                if (a[0] - margin <= b[0] + b[2] and b[0] - margin <= a[0] + a[2] and
+                        a[1] - margin <= b[1] + b[3] and b[1] - margin <= a[1] + a[3]):
+                    x0, y0 = min(a[0], b[0]), min(a[1], b[1])
+                    x1 = max(a[0] + a[2], b[0] + b[2])
+                    y1 = max(a[1] + a[3], b[1] + b[3])
+                    pixels = a[4] + b[4]
+                    blobs[i] = Blob((x0, y0, x1 - x0, y1 - y0, pixels,
+                                     int(round((a[5] * a[4] + b[5] * b[4]) / pixels)),
+                                     int(round((a[6] * a[4] + b[6] * b[4]) / pixels)),
+                                     a[7] if a[4] >= b[4] else b[7], a[8] | b[8], a[9] + b[9]))
+                    del blobs[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    return blobs
@@ -0,0 +1,98 @@
+"""
+Fake MicroPython machine module for replays, the servo shield I2C writes
+are kept in a register map so the commanded duties can be inspected.
+"""
+
+
+class Pin(object):
+
+    def __init__(self, name, *args, **kwargs):
+        self.name = name
+        self._value = 0
+
+    def value(self, v: int = None):
+        if v is None:
+            return self._value
+        self._value = v
+
+
+class SoftI2C(object):
+    """
+    Records register writes per device address, reads return what was written.
+    Multi-byte writes fill consecutive registers, like the PCA9685 auto-increment.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.registers = {}
+        self.writes = 0
+        self.bytes_written = 0
+        self.log = []
+        self.log_size = 1000
+
+    def writeto_mem(self, addr: int, memaddr: int, buf) -> None:
+        regs = self.registers.setdefault(addr, bytearray(256))
+        regs[memaddr:memaddr + len(buf)] = bytes(buf)
+        self.writes += 1
+        self.bytes_written += len(buf)
+
+        # Latest (address, register, bytes) writes, to check batching
+        if len(self.log) == self.log_size:
+            del self.log[0]
+        self.log.append((addr, memaddr, bytes(buf)))
+
+    def readfrom_mem(self, addr: int, memaddr: int, nbytes: int) -> bytes:
+        regs = self.registers.setdefault(addr, bytearray(256))
+        return bytes(regs[memaddr:memaddr + nbytes])
+
+    def scan(self) -> list:
+        return list(self.registers)
+
+
+I2C = SoftI2C
+
+
+class LED(object):
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = False
+
+    def on(self) -> None:
+        self.state = True
+
+    def off(self) -> None:
+        self.state = False
+
+    def toggle(self) -> None:
+        self.state = not self.state
+
+
+class Timer(object):
+    """
+    Timer whose callback only runs when fire() is called, so replays stay deterministic.
+    """
+
+    PERIODIC = 1
+    ONE_SHOT = 0
+
+    def __init__(self, id: int = -1, **kwargs):
+        self.callback = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode: int = PERIODIC, freq: float = None, period: int = None, callback=None) -> None:
+        self.mode = mode
+        self.freq = freq
+        self.period = period
+        self.callback = callback
+
+    def fire(self) -> None:
+        if self.callback is not None:
+            self.callback(self)
+
+    def deinit(self) -> None:
+        self.callback = None
+
+
+def reset() -> None:
+    raise SystemExit('machine.reset() during replay')
@@ -0,0 +1,353 @@
+"""
+Parallel offline analysis of recorded sessions.
+
+Frames are decoded once, by the workers, straight into a
+multiprocessing.shared_memory block, so workers read them as numpy views
+and only small results (blob tuples, errors) are pickled between processes.
+Frame ranges are sharded across a process pool for blob detection, and
+controller parameter sets (or whole sessions) are sharded for controller
+replay. Results are merged in frame/parameter order.
+
+Example:
+from replay.parallel import SharedFrames, detect, target_bearings, sweep_pid
+frames = SharedFrames.decode('/path/to/rec0', workers=8)
+detections = detect(frames, [(30, 60, 30, 80, 10, 60)], workers=8)
+bearings = target_bearings(frames.session, detections, threshold_idx=0)
+results = sweep_pid(frames.session, bearings, [(0.22, 0, 0), (0.3, 0.01, 0)], workers=8)
+frames.unlink()
+
+python -m replay.parallel /path/to/rec0 --workers 8 --bench
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .image import Image
+from .session import Session
+
+# Per worker process state, set by the pool initialiser
+_worker = {}
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to an existing block without tracking it, the creating process owns it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: workers share the parent's resource tracker, which
+        # already holds the block, so attaching again does not change ownership
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedFrames(object):
+    """
+    Decoded frames of a session in a shared memory block, as an N x H x W (x 3) uint8 array.
+    """
+
+    def __init__(self, session: Session, shm: shared_memory.SharedMemory, shape: tuple, start: int = 0):
+        """
+        Args:
+            session (Session): Session the frames come from.
+            shm (SharedMemory): Block holding the frames.
+            shape (tuple): Shape of the frame array.
+            start (int): Session position of the first frame.
+        """
+        self.session = session
+        self.shm = shm
+        self.shape = shape
+        self.start = start
+        self.frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+
+    @classmethod
+    def decode(cls, path: str, start: int = 0, stop: int = None, workers: int = None,
+               chunk: int = 64) -> 'SharedFrames':
+        """
+        Decode a range of a session into a new shared memory block, in parallel.
+
+        Args:
+            path (str): Session directory.
+            start (int): First frame position.
+            stop (int): Frame position to stop at, the end of the session if None.
+            workers (int): Worker processes, the number of CPUs if None.
+            chunk (int): Frames decoded per task.
+
+        Returns:
+            SharedFrames: The decoded frames, call unlink() when done. Empty, shaped
+                from the session size, if the range holds no frames.
+
+        Raises:
+            ValueError: If start is negative.
+        """
+        if start < 0:
+            raise ValueError('start must not be negative: ' + str(start))
+
+        session = Session(path)
+        stop = len(session) if stop is None else min(stop, len(session))
+
+        if start >= stop:
+            shape = (0, session.height, session.width)
+            if session.pixformat != 'grayscale':
+                shape += (3,)
+            return cls(session, shared_memory.SharedMemory(create=True, size=1), shape, start)
+
+        first = session.image(start)
+        shape = (stop - start,) + first.shape
+        shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)), 1))
+        frames = cls(session, shm, shape, start)
+        frames.frames[0] = first
+
+        tasks = [(path, shm.name, shape, start, lo, min(lo + chunk, stop))
+                 for lo in range(start + 1, stop, chunk)]
+        with multiprocessing.Pool(workers) as pool:
+            for _ in pool.imap_unordered(_decode_range, tasks):
+                pass
+
+        return frames
+
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+
+    def close(self) -> None:
+        self.frames = None
+        self.shm.close()
+
+
+    def unlink(self) -> None:
+        """
+        Free the shared memory block.
+        """
+        self.close()
+        self.shm.unlink()
+
+
+def _decode_range(task) -> int:
+    path, name, shape, start, lo, hi = task
+    session = Session(path)
+    shm = _attach(name)
+    frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+    for i in range(lo, hi):
+        frames[i - start] = session.image(i)
+
+    del frames
+    shm.close()
+    session.close()
+
+    return hi - lo
+
+
+def _init_worker(name: str, shape: tuple) -> None:
+    shm = _attach(name)
+    _worker['shm'] = shm
+    _worker['frames'] = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+
+def _detect_range(task) -> list:
+    lo, hi, thresholds, kwargs = task
+    frames = _worker['frames']
+
+    results = []
+    for i in range(lo, hi):
+        blobs = Image(frames[i]).find_blobs(thresholds, **kwargs)
+        results.append([tuple(blob) for blob in blobs])
+
+    return results
+
+
+def detect(frames: SharedFrames, thresholds: list, workers: int = None, chunk: int = 32,
+           **kwargs) -> list:
+    """
+    Run the host blob detector over every frame, sharded by frame range.
+
+    Args:
+        frames (SharedFrames): Decoded frames.
+        thresholds (list): Thresholds passed to find_blobs.
+        workers (int): Worker processes, the number of CPUs if None.
+        chunk (int): Frames per task.
+        kwargs: Extra find_blobs arguments, pixels_threshold and area_threshold
+            default to the Cam.get_blobs values.
+
+    Returns:
+        list: Per frame, in order, the list of blobs as OpenMV layout tuples.
+    """
+    kwargs.setdefault('pixels_threshold', 60)
+    kwargs.setdefault('area_threshold', 60)
+    tasks = [(lo, min(lo + chunk, len(frames)), thresholds, kwargs) for lo in range(0, len(frames), chunk)]
+
+    with multiprocessing.Pool(workers, _init_worker, (frames.shm.name, frames.shape)) as pool:
+        shards = pool.map(_detect_range, tasks)
+
+    return [blobs for shard in shards for blobs in shard]
+
+
+def target_bearings(session: Session, detections: list, threshold_idx: int = 0, start: int = 0) -> list:
+    """
+    Bearing of the tracked target wrt. the robot heading in each frame, from the
+    recorded pan angle and the biggest blob of the tracked colour, as Cam.bearing
+    computes it. Independent of the controller, so it can drive controller replays.
+
+    Args:
+        session (Session): Session the detections come from.
+        detections (list): Per frame blobs from detect().
+        threshold_idx (int): Index of the tracked threshold.
+        start (int): Session position of the first detection.
+
+    Returns:
+        list: Per frame (t_us, bearing (deg) or None if the target was not found).
+    """
+    meta = session.meta
+    w_centre = session.width / 2
+    fx = w_centre / math.tan(math.radians(meta.get('h_fov', 70.8) / 2))
+    code = 1 << threshold_idx
+
+    bearings = []
+    for i, blobs in enumerate(detections):
+        frame = session[start + i]
+        big = max(blobs, key=lambda b: b[4]) if blobs else None
+        if big is not None and big[8] == code:
+            bearing = frame.pan - math.degrees(math.atan((big[5] - w_centre) / fx))
+        else:
+            bearing = None
+        bearings.append((frame.t_us, bearing))
+
+    return bearings
+
+
+def _init_replay() -> None:
+    import replay
+    replay.install()
+
+
+def replay_pid(task) -> dict:
+    """
+    Replay the pan PID of Robot.track_blob against a recorded target trajectory.
+    Runs in a pool started with _init_replay, or after replay.install().
+
+    Args:
+        task (tuple): (bearings from target_bearings(), (p, i, d, imax)).
+
+    Returns:
+        dict: Parameters, RMS and max tracking error (deg) and frames the target was lost.
+    """
+    bearings, params = task
+
+    from replay.clock import clock
+    from pid import PID
+
+    # The clock never moves backwards, restart it so a reused worker is not
+    # left with the end time of its previous task (dt = 0 for the whole run)
+    clock.now_us = 0
+    pid = PID(*params)
+    pan = 0.0
+    sq_sum = 0.0
+    max_error = 0.0
+    n = 0
+    lost = 0
+
+    for t_us, bearing in bearings:
+        # Offset so the first tick is not 0, which PID treats as never run
+        clock.advance_to(t_us + 1000000)
+        if bearing is None:
+            lost += 1
+            continue
+
+        error = bearing - pan
+        pan = max(min(pan + pid.get_pid(error, 1), 60), -60)
+
+        sq_sum += error * error
+        max_error = max(max_error, abs(error))
+        n += 1
+
+    return {'params': params,
+            'rms_error': math.sqrt(sq_sum / n) if n else None,
+            'max_error': max_error,
+            'lost': lost}
+
+
+def sweep_pid(session: Session, bearings: list, params: list, workers: int = None) -> list:
+    """
+    Replay the pan controller for several parameter sets in parallel.
+
+    Args:
+        session (Session): Session the bearings come from.
+        bearings (list): Output of target_bearings().
+        params (list): (p, i, d, imax) tuples, missing values default to 0.
+        workers (int): Worker processes, the number of CPUs if None.
+
+    Returns:
+        list: replay_pid() results, in the order of params.
+    """
+    tasks = [(bearings, tuple(p) + (0,) * (4 - len(p))) for p in params]
+
+    with multiprocessing.Pool(workers, _init_replay) as pool:
+        return pool.map(replay_pid, tasks)
+
+
+def map_sessions(fn, paths: list, workers: int = None) -> list:
+    """
+    Run a function on whole sessions in parallel, for runs of many short sessions.
+
+    Args:
+        fn (function): Module level function taking a session path.
+        paths (list): Session directories.
+        workers (int): Worker processes, the number of CPUs if None.
+
+    Returns:
+        list: fn results, in the order of paths.
+    """
+    with multiprocessing.Pool(workers) as pool:
+        return pool.map(fn, paths)
+
+
+def main(args) -> None:
+    for path in args.sessions:
+        session = Session(path)
+        thresholds = [tuple(t) for t in session.meta['thresholds']]
+
+        t_start = time.perf_counter()
+        frames = SharedFrames.decode(path, workers=args.workers)
+        t_decode = time.perf_counter() - t_start
+
+        if not len(frames):
+            print('%s: no frames, skipped' % path)
+            frames.unlink()
+            continue
+
+        try:
+            counts = [args.workers] if not args.bench else sorted({1, args.workers})
+            for workers in counts:
+                t_start = time.perf_counter()
+                detections = detect(frames, thresholds, workers=workers)
+                t_detect = time.perf_counter() - t_start
+                print('%s: %d frames, decode %.2fs, detect %.2fs with %d workers (%.1f frames/s)' %
+                      (path, len(frames), t_decode, t_detect, workers, len(frames) / t_detect))
+
+            bearings = target_bearings(frames.session, detections, args.threshold)
+            for result in sweep_pid(frames.session, bearings, args.pid, args.workers):
+                print(result)
+        finally:
+            frames.unlink()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Parallel offline analysis of recorded sessions')
+    parser.add_argument('sessions', nargs='+', help='Session directories')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--threshold', type=int, default=0, help='Threshold index of the target')
+    parser.add_argument('--pid', type=lambda s: tuple(float(v) for v in s.split(',')), nargs='+',
+                        default=[(0.22, 0, 0, 0)], help='PID parameter sets p,i,d,imax')
+    parser.add_argument('--bench', action='store_true', help='Also time detection with one worker')
+    args = parser.parse_args()
+
+    main(args)
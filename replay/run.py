@@ -0,0 +1,70 @@
+"""
+Replay a recorded session through the unmodified Robot pan tracking code
+and print one CSV row per frame, so runs can be diffed after a change.
+
+Example:
+python -m replay.run /path/to/rec0 --threshold 0 > before.csv
+python -m replay.run /path/to/rec0 --threshold 0 --p 0.3 > after.csv
+"""
+
+import argparse
+import sys
+
+import replay
+
+
+def run(path: str, threshold_idx: int = 0, p: float = 0.22, i: float = 0.0, d: float = 0.0,
+        imax: float = 0.0, out=sys.stdout) -> int:
+    """
+    Run Robot.track_blob on every frame of a session.
+
+    Args:
+        path (str): Session directory.
+        threshold_idx (int): Index of the threshold to track.
+        p, i, d, imax (float): PID parameters of the pan controller.
+        out (file): Where the CSV is written.
+
+    Returns:
+        int: Number of frames replayed.
+    """
+    replay.install(path)
+    from replay import sensor
+    from robot import Robot
+
+    meta = replay.meta()
+    robot = Robot(meta['thresholds'], p=p, i=i, d=d, imax=imax)
+    robot.cam.channel = meta.get('channel')
+
+    out.write('frame,t_us,rec_pan,found,cx,cy,pixels,pan\n')
+    frames = 0
+    while True:
+        pos = sensor.position()
+        try:
+            blob = robot.track_blob(threshold_idx)
+        except replay.ReplayFinished:
+            break
+
+        frame = sensor.session()[pos]
+        if blob is not None:
+            row = (pos, frame.t_us, '%.3f' % frame.pan, 1, blob.cx(), blob.cy(), blob.pixels(),
+                   '%.3f' % robot.servo.pan_pos)
+        else:
+            row = (pos, frame.t_us, '%.3f' % frame.pan, 0, '', '', '', '%.3f' % robot.servo.pan_pos)
+        out.write(','.join(str(v) for v in row) + '\n')
+        frames += 1
+
+    return frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay a recorded session through Robot.track_blob')
+    parser.add_argument('session', help='Session directory')
+    parser.add_argument('--threshold', type=int, default=0, help='Threshold index to track')
+    parser.add_argument('--p', type=float, default=0.22)
+    parser.add_argument('--i', type=float, default=0.0)
+    parser.add_argument('--d', type=float, default=0.0)
+    parser.add_argument('--imax', type=float, default=0.0)
+    args = parser.parse_args()
+
+    n = run(args.session, args.threshold, args.p, args.i, args.d, args.imax)
+    print('Replayed', n, 'frames', file=sys.stderr)
@@ -0,0 +1,137 @@
+"""
+Fake OpenMV sensor module that serves the frames of a recorded session.
+Installed as 'sensor' by replay.install(), the session is chosen with load()
+or the OPENMV_REPLAY environment variable.
+"""
+
+import os
+
+from .clock import clock
+from .image import Image
+from .session import Session
+
+RGB565 = 'rgb565'
+GRAYSCALE = 'grayscale'
+RGB = RGB565
+
+QQVGA = (160, 120)
+QVGA = (320, 240)
+VGA = (640, 480)
+
+_state = {'session': None, 'pos': 0, 'pixformat': RGB565, 'framesize': VGA,
+          't_base': None, 'gain_db': 25.0, 'rgb_gain_db': (0.0, 0.0, 0.0), 'exposure_us': 10000}
+
+
+class ReplayFinished(Exception):
+    """
+    Raised by snapshot() once every frame of the session has been served.
+    """
+
+
+def load(path: str, start: int = 0) -> Session:
+    """
+    Open a session to replay.
+
+    Args:
+        path (str): Session directory.
+        start (int): Position of the first frame to serve.
+
+    Returns:
+        Session: The opened session.
+    """
+    session = Session(path)
+    _state['session'] = session
+    _state['pos'] = start
+    _state['pixformat'] = session.pixformat
+    _state['t_base'] = None
+
+    return session
+
+
+def session() -> Session:
+    if _state['session'] is None and os.environ.get('OPENMV_REPLAY'):
+        load(os.environ['OPENMV_REPLAY'])
+
+    return _state['session']
+
+
+def snapshot() -> Image:
+    """
+    Serve the next recorded frame, moving the virtual clock to its capture time.
+
+    Returns:
+        Image: The frame.
+    """
+    s = session()
+    if s is None:
+        raise RuntimeError('No session loaded, call replay.sensor.load() or set OPENMV_REPLAY')
+    if _state['pos'] >= len(s):
+        raise ReplayFinished()
+
+    frame = s[_state['pos']]
+    if _state['t_base'] is None:
+        # Recorded times are relative, line the first served frame up with now
+        _state['t_base'] = clock.now_us - frame.t_us
+    clock.advance_to(_state['t_base'] + frame.t_us)
+    pixels = s.image(_state['pos'])
+    _state['pos'] += 1
+
+    img = Image(pixels)
+    if _state['pixformat'] == GRAYSCALE and not img.is_grayscale():
+        img.to_grayscale()
+
+    return img
+
+
+def position() -> int:
+    """
+    Returns:
+        int: Position of the next frame snapshot() will serve.
+    """
+    return _state['pos']
+
+
+def width() -> int:
+    s = session()
+    return s.width if s is not None and s.width else _state['framesize'][0]
+
+
+def height() -> int:
+    s = session()
+    return s.height if s is not None and s.height else _state['framesize'][1]
+
+
+def reset() -> None:
+    pass
+
+def set_pixformat(pixformat) -> None:
+    _state['pixformat'] = pixformat
+
+def set_framesize(framesize) -> None:
+    _state['framesize'] = framesize
+
+def skip_frames(n: int = None, time: int = None) -> None:
+    # Frames are not consumed, so a replay starts on the first recorded frame
+    if time is not None:
+        clock.sleep_ms(time)
+
+def set_auto_gain(enable: bool, gain_db: float = None) -> None:
+    if gain_db is not None:
+        _state['gain_db'] = gain_db
+
+def set_auto_whitebal(enable: bool, rgb_gain_db: tuple = None) -> None:
+    if rgb_gain_db is not None:
+        _state['rgb_gain_db'] = rgb_gain_db
+
+def set_auto_exposure(enable: bool, exposure_us: int = None) -> None:
+    if exposure_us is not None:
+        _state['exposure_us'] = exposure_us
+
+def get_gain_db() -> float:
+    return _state['gain_db']
+
+def get_rgb_gain_db() -> tuple:
+    return _state['rgb_gain_db']
+
+def get_exposure_us() -> int:
+    return _state['exposure_us']
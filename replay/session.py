@@ -0,0 +1,197 @@
+"""
+Host side reader for sessions written by recorder.Recorder.
+
+Example:
+from replay.session import Session
+session = Session('/media/sd/rec0')
+frame = session[120]                  # O(1), frame payload is a view into the mmap
+rgb = session.image(120)              # decoded HxWx3 uint8 (HxW for grayscale)
+i = session.index_at(5000000)         # first frame captured at or after 5 s
+"""
+
+import json
+import mmap
+import os
+
+import numpy as np
+
+# Must match recorder.INDEX_FORMAT ('<IQIIfff'), per session version
+INDEX_DTYPES = {1: np.dtype([('seq', '<u4'), ('t_us', '<u4'), ('offset', '<u4'), ('length', '<u4'),
+                             ('pan', '<f4'), ('l_speed', '<f4'), ('r_speed', '<f4')]),
+                2: np.dtype([('seq', '<u4'), ('t_us', '<u8'), ('offset', '<u4'), ('length', '<u4'),
+                             ('pan', '<f4'), ('l_speed', '<f4'), ('r_speed', '<f4')])}
+INDEX_DTYPE = INDEX_DTYPES[2]
+
+
+class Frame(object):
+    """
+    A single recorded frame and the robot state it was captured with.
+    """
+
+    def __init__(self, record, data: memoryview):
+        """
+        Args:
+            record (np.void): Index record of the frame.
+            data (memoryview): Frame payload (raw or JPEG bytes).
+        """
+        self.seq = int(record['seq'])
+        self.t_us = int(record['t_us'])
+        self.pan = float(record['pan'])
+        self.l_speed = float(record['l_speed'])
+        self.r_speed = float(record['r_speed'])
+        self.data = data
+
+
+class Session(object):
+    """
+    Random access to a recorded session by memory mapping its frame and index files.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a session directory.
+
+        Args:
+            path (str): Session directory containing meta.json, frames.bin and index.bin.
+        """
+        self.path = path
+
+        with open(os.path.join(path, 'meta.json')) as file:
+            self.meta = json.load(file)
+
+        self.version = self.meta.get('version', 1)
+        if self.version not in INDEX_DTYPES:
+            raise ValueError('Unsupported session version: ' + str(self.version))
+        dtype = INDEX_DTYPES[self.version]
+
+        self.format = self.meta.get('format', 'jpeg')
+        self.pixformat = self.meta.get('pixformat', 'rgb565')
+        self.width = self.meta.get('width', 0)
+        self.height = self.meta.get('height', 0)
+        self.byteorder = self.meta.get('byteorder', 'little')
+
+        self._frames_file = open(os.path.join(path, 'frames.bin'), 'rb')
+        self._index_file = open(os.path.join(path, 'index.bin'), 'rb')
+        self._frames = _map(self._frames_file)
+        index = _map(self._index_file)
+
+        # Ignore a partly written last record, e.g. after a power cut
+        n = len(index) // dtype.itemsize if index is not None else 0
+        self.index = np.frombuffer(index, dtype=dtype, count=n) if n else np.zeros(0, dtype)
+
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+    def __getitem__(self, i: int) -> Frame:
+        """
+        Args:
+            i (int): Position of the frame in the session (not its seq, frames may have been dropped).
+
+        Returns:
+            Frame: The frame, its payload is a view into the memory map.
+        """
+        record = self.index[i]
+        start = int(record['offset'])
+
+        return Frame(record, memoryview(self._frames)[start:start + int(record['length'])])
+
+
+    def index_at(self, t_us: int) -> int:
+        """
+        Find the first frame captured at or after a time.
+
+        Args:
+            t_us (int): Time (us) since the first frame.
+
+        Returns:
+            int: Frame position, len(self) if every frame is earlier.
+        """
+        return int(np.searchsorted(self.index['t_us'], t_us))
+
+
+    def image(self, i: int) -> np.ndarray:
+        """
+        Decode a frame.
+
+        Args:
+            i (int): Position of the frame in the session.
+
+        Returns:
+            np.ndarray: HxWx3 uint8 RGB image, or HxW uint8 for grayscale sessions.
+        """
+        return decode(self[i].data, self.format, self.pixformat, self.width, self.height,
+                      self.byteorder)
+
+
+    def close(self) -> None:
+        """
+        Release the files. The memory maps are freed once no frame views refer to them.
+        """
+        self.index = None
+        self._frames = None
+        self._frames_file.close()
+        self._index_file.close()
+
+
+def decode(data, fmt: str, pixformat: str, width: int, height: int,
+           byteorder: str = 'little') -> np.ndarray:
+    """
+    Decode a frame payload to a numpy image.
+
+    Args:
+        data (bytes): Frame payload.
+        fmt (str): 'raw' or 'jpeg'.
+        pixformat (str): 'rgb565' or 'grayscale', used for raw frames.
+        width (int): Frame width (pixels), used for raw frames.
+        height (int): Frame height (pixels), used for raw frames.
+        byteorder (str): Byte order of raw RGB565 pixels.
+
+    Returns:
+        np.ndarray: HxWx3 uint8 RGB image, or HxW uint8 for grayscale.
+    """
+    if fmt == 'jpeg':
+        import io
+        from PIL import Image as PILImage
+
+        img = PILImage.open(io.BytesIO(bytes(data)))
+        if img.mode == 'L':
+            return np.asarray(img)
+        return np.asarray(img.convert('RGB'))
+
+    if pixformat == 'grayscale':
+        return np.frombuffer(data, dtype=np.uint8, count=width * height).reshape(height, width)
+
+    dtype = '<u2' if byteorder == 'little' else '>u2'
+    pixels = np.frombuffer(data, dtype=dtype, count=width * height).reshape(height, width)
+
+    return rgb565_to_rgb(pixels)
+
+
+def rgb565_to_rgb(pixels: np.ndarray) -> np.ndarray:
+    """
+    Expand RGB565 pixels to 8 bits per channel.
+
+    Args:
+        pixels (np.ndarray): HxW uint16 RGB565 pixels.
+
+    Returns:
+        np.ndarray: HxWx3 uint8 RGB image.
+    """
+    r = (pixels >> 11) & 0x1F
+    g = (pixels >> 5) & 0x3F
+    b = pixels & 0x1F
+
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)],
+                    axis=-1).astype(np.uint8)
+
+
+def _map(file):
+    """
+    Memory map a file read-only, None if it is empty (mmap cannot map 0 bytes).
+    """
+    if os.fstat(file.fileno()).st_size == 0:
+        return None
+
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
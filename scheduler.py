@@ -0,0 +1,239 @@
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    from time import ticks_us, ticks_diff, ticks_add
+except ImportError:
+    # CPython has no ticks_* helpers, emulate them so the runtime can be run on a host
+    from time import perf_counter_ns
+
+    def ticks_us():
+        return perf_counter_ns() // 1000
+
+    def ticks_diff(a, b):
+        return a - b
+
+    def ticks_add(a, b):
+        return a + b
+
+
+async def sleep_us(us: int) -> None:
+    """
+    Sleep for a number of microseconds, yielding to the other tasks.
+
+    Args:
+        us (int): Time to sleep (us), values <= 0 just yield.
+    """
+    if us <= 0:
+        await asyncio.sleep(0)
+    elif hasattr(asyncio, 'sleep_ms'):
+        await asyncio.sleep_ms(us // 1000)
+    else:
+        await asyncio.sleep(us / 1000000)
+
+
+class Jitter(object):
+    """
+    Running statistics of how late a periodic task starts compared with its
+    deadline, and how long each run takes.
+    """
+
+    def __init__(self, period_us: int):
+        """
+        Initialise the statistics for a task with the given period.
+
+        Args:
+            period_us (int): Nominal period of the task (us), 0 if free running.
+        """
+        self.period_us = period_us
+        self.reset()
+
+
+    def reset(self) -> None:
+        """
+        Clear all the accumulated statistics.
+        """
+        self.count = 0
+        self.overruns = 0
+        self.late_sum = 0
+        self.late_max = 0
+        self.run_sum = 0
+        self.run_max = 0
+
+
+    def add(self, late_us: int, run_us: int) -> None:
+        """
+        Add a single run of the task to the statistics.
+
+        Args:
+            late_us (int): Time between the deadline and the actual start (us).
+            run_us (int): Time spent running the task (us).
+        """
+        self.count += 1
+        self.late_sum += late_us
+        self.run_sum += run_us
+        if late_us > self.late_max:
+            self.late_max = late_us
+        if run_us > self.run_max:
+            self.run_max = run_us
+
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: Run count, overruns, mean/max lateness (us) and mean/max run time (us).
+        """
+        n = max(self.count, 1)
+        return {'count': self.count,
+                'overruns': self.overruns,
+                'late_mean': self.late_sum // n,
+                'late_max': self.late_max,
+                'run_mean': self.run_sum // n,
+                'run_max': self.run_max}
+
+
+class PeriodicTask(object):
+    """
+    A callable run at a fixed rate by the Scheduler.
+    """
+
+    def __init__(self, name: str, period_ms: float, fn):
+        """
+        Args:
+            name (str): Name used when reporting statistics.
+            period_ms (float): Period of the task (ms), 0 to run every time the loop is free.
+            fn (function): Function called with no arguments on every tick.
+        """
+        self.name = name
+        self.period_us = int(period_ms * 1000)
+        self.fn = fn
+        self.jitter = Jitter(self.period_us)
+
+
+    async def run(self, scheduler) -> None:
+        """
+        Call the task function on every deadline until the scheduler is stopped.
+
+        Args:
+            scheduler (Scheduler): Scheduler owning the task.
+        """
+        deadline = ticks_us()
+
+        while scheduler.running:
+            t_start = ticks_us()
+            late = ticks_diff(t_start, deadline) if self.period_us else 0
+
+            try:
+                self.fn()
+            except Exception:
+                # Stop the other tasks too, rather than e.g. control carrying on without capture
+                scheduler.stop()
+                raise
+
+            self.jitter.add(late, ticks_diff(ticks_us(), t_start))
+
+            if self.period_us:
+                # Deadlines are kept on a fixed grid so lateness does not accumulate
+                deadline = ticks_add(deadline, self.period_us)
+                wait = ticks_diff(deadline, ticks_us())
+
+                # Skip ticks missed by a whole period rather than bursting to catch up
+                if wait < -self.period_us:
+                    self.jitter.overruns += 1
+                    deadline = ticks_us()
+
+                await sleep_us(wait)
+            else:
+                await sleep_us(0)
+
+
+class Scheduler(object):
+    """
+    A cooperative scheduler built on uasyncio that runs capture, control,
+    logging and network work as separate fixed-rate tasks, so a slow task only
+    delays the others by its own run time. Runs on CPython asyncio too.
+    """
+
+    def __init__(self):
+        """
+        Initialise an empty scheduler.
+        """
+        self.tasks = []
+        self.running = False
+
+
+    def every(self, name: str, period_ms: float, fn) -> PeriodicTask:
+        """
+        Register a function to be run at a fixed rate.
+
+        Args:
+            name (str): Name used when reporting statistics.
+            period_ms (float): Period of the task (ms), 0 to run whenever the loop is free.
+            fn (function): Function called with no arguments on every tick.
+
+        Returns:
+            PeriodicTask: The registered task.
+        """
+        task = PeriodicTask(name, period_ms, fn)
+        self.tasks.append(task)
+
+        return task
+
+
+    def run(self, duration_ms: int = None) -> None:
+        """
+        Run all the registered tasks until stop() is called or the duration expires.
+        An exception raised by a task stops every task and is raised from here.
+
+        Args:
+            duration_ms (int): Time to run for (ms), None to run until stopped.
+        """
+        asyncio.run(self._main(duration_ms))
+
+
+    def stop(self) -> None:
+        """
+        Stop all tasks after their current tick.
+        """
+        self.running = False
+
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: Jitter summary for each task, keyed by task name.
+        """
+        return {task.name: task.jitter.summary() for task in self.tasks}
+
+
+    def report(self) -> None:
+        """
+        Print the jitter summary of each task.
+        """
+        for name, s in self.stats().items():
+            print(name, 'n:', s['count'], 'late(us):', s['late_mean'], '/', s['late_max'],
+                  'run(us):', s['run_mean'], '/', s['run_max'], 'overruns:', s['overruns'])
+
+
+    async def _main(self, duration_ms: int) -> None:
+        """
+        Start a uasyncio task per registered task and wait for them to finish.
+        """
+        self.running = True
+        for task in self.tasks:
+            task.jitter.reset()
+
+        running = [asyncio.create_task(task.run(self)) for task in self.tasks]
+
+        if duration_ms is not None:
+            # In steps, so a task that stopped the scheduler is not waited on for the whole duration
+            remaining = duration_ms * 1000
+            while self.running and remaining > 0:
+                await sleep_us(min(remaining, 100000))
+                remaining -= 100000
+            self.stop()
+
+        for task in running:
+            await task
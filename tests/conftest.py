@@ -0,0 +1,111 @@
+"""
+Host tests, run from the repository root with: python -m pytest -q tests
+
+The robot modules import the OpenMV sensor, machine and MicroPython time
+functions, tests that run them use the replay fixture, which installs the
+replay stand-ins and serves a synthetic session.
+"""
+
+import json
+import os
+import struct
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in [ROOT, os.path.join(ROOT, 'wifi-tests')] + [os.path.join(ROOT, 'Assignment %d' % i) for i in (1, 2, 3)]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Red target on a grey background, and a threshold that only matches the target
+RED = 0xF800
+GREY = 0x8410
+THRESHOLDS = [[30, 100, 15, 127, 15, 127]]
+
+
+def write_session(path: str, n: int = 60, width: int = 160, height: int = 120, size: int = 20,
+                  speed: float = 1.0, period_us: int = 33333, colour=RED, background: int = GREY) -> str:
+    """
+    Write a raw RGB565 session (replay.session format) of a square target moving to the right.
+
+    Args:
+        path (str): Session directory to create.
+        n (int): Number of frames.
+        width, height (int): Frame size (pixels).
+        size (int): Side of the target (pixels).
+        speed (float): Target motion (pixels per frame).
+        period_us (int): Time between frames (us).
+        colour (int or function): RGB565 target colour, or a function of the frame
+            number returning it, None for a frame without the target.
+        background (int): RGB565 background colour.
+
+    Returns:
+        str: path.
+    """
+    import numpy as np
+
+    os.makedirs(path, exist_ok=True)
+    offset = 0
+
+    with open(os.path.join(path, 'frames.bin'), 'wb') as frames, \
+            open(os.path.join(path, 'index.bin'), 'wb') as index:
+        for i in range(n):
+            pixels = np.full((height, width), background, dtype='<u2')
+            x = int(width / 4 + i * speed) % (width - size)
+            y = (height - size) // 2
+            target = colour(i) if callable(colour) else colour
+            if target is not None:
+                pixels[y:y + size, x:x + size] = target
+            data = pixels.tobytes()
+
+            frames.write(data)
+            index.write(struct.pack('<IQIIfff', i, i * period_us, offset, len(data), 0, 0, 0))
+            offset += len(data)
+
+    meta = {'version': 2, 'format': 'raw', 'pixformat': 'rgb565', 'width': width, 'height': height,
+            'frames': n, 'captured': n, 'dropped': 0, 'oversize': 0, 'thresholds': THRESHOLDS}
+    with open(os.path.join(path, 'meta.json'), 'w') as file:
+        json.dump(meta, file)
+
+    return path
+
+
+@pytest.fixture
+def micropython():
+    """
+    Install the replay stand-ins for the OpenMV modules and MicroPython time functions,
+    and remove them again after the test.
+    """
+    pytest.importorskip('numpy')
+    import replay
+
+    modules = set(sys.modules)
+    undo = replay.install()
+    yield
+    undo()
+
+    # Robot modules imported under the stand-ins keep references to them (e.g.
+    # scheduler binds ticks_us at import), drop them so the next test imports
+    # them against its own environment
+    for name in set(sys.modules) - modules:
+        path = getattr(sys.modules[name], '__file__', None) or ''
+        if path.startswith(ROOT) and not name.startswith('replay'):
+            del sys.modules[name]
+
+
+@pytest.fixture
+def replay_session(tmp_path, micropython):
+    """
+    Install the replay stand-ins and load a synthetic session, see write_session().
+
+    Returns:
+        function: Called with write_session() arguments, returns the loaded Session.
+    """
+    from replay import sensor
+
+    def load(**kwargs):
+        return sensor.load(write_session(str(tmp_path / 'session'), **kwargs))
+
+    return load
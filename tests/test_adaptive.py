@@ -0,0 +1,45 @@
+"""
+Adaptive thresholds on a replayed session whose target slowly washes out.
+"""
+
+DRIFT_FRAMES = 80
+HOLD_FRAMES = 20
+LOST_FRAMES = 12
+
+
+def washing_out(i):
+    # Red brightening towards pink, from LAB (53, 80, 67) to (92, 11, 2), outside the
+    # baseline B min of 15 and the statistics gate of the default drift, held, then gone
+    if i >= DRIFT_FRAMES + HOLD_FRAMES:
+        return None
+    k = 28 * min(i, DRIFT_FRAMES - 1) // (DRIFT_FRAMES - 1)
+    return 31 << 11 | 2 * k << 5 | k
+
+
+def test_threshold_follows_drift_and_resets(replay_session):
+    session = replay_session(n=DRIFT_FRAMES + HOLD_FRAMES + LOST_FRAMES, speed=0,
+                             colour=washing_out, background=0)
+    from camera import Cam
+
+    cam = Cam(session.meta['thresholds'], 25, adaptive=True)
+    baseline = list(cam.thresholds)
+
+    # Set after construction, the gates must follow
+    cam.adapt_max_drift = 20
+
+    for i in range(DRIFT_FRAMES + HOLD_FRAMES):
+        blobs, img = cam.get_blobs()
+        blob = cam.get_biggest_blob(blobs)
+        assert cam.blob_matches(blob, 0), i
+        cam.update_thresholds(img, blob, 0)
+
+    assert cam.thresholds[0][4] < baseline[0][4] - 12
+    assert cam.adapt_stats()['resets'] == 0
+
+    for i in range(cam.adapt_reset_after):
+        blobs, img = cam.get_blobs()
+        assert cam.get_biggest_blob(blobs) is None
+        cam.update_thresholds(img, None, 0)
+
+    assert cam.thresholds == baseline
+    assert cam.adapt_stats()['resets'] == 1
@@ -0,0 +1,59 @@
+import math
+
+import pytest
+
+pytest.importorskip('numpy')
+import bode
+
+
+def write_run(path, freq=0.5, rows=200, gain=0.8, phase_deg=-30.0, dt=0.05):
+    """
+    Write a run where the pan follows a unit sine target with the given gain and phase.
+    Each row holds the error at its capture and the angle commanded after it, i.e.
+    the pan at the next capture.
+    """
+    w = 2 * math.pi * freq
+    phase = math.radians(phase_deg)
+
+    def pan(t):
+        return gain * math.sin(w * t + phase)
+
+    with open(path, 'w') as file:
+        file.write('# freq_hz=%s\ntime_us,error,angle,valid\n' % freq)
+        for i in range(rows):
+            t = i * dt
+            file.write('%d,%f,%f,1\n' % (round(t * 1e6), math.sin(w * t) - pan(t), pan(t + dt)))
+
+
+def test_load_run_without_data(tmp_path):
+    header_only = tmp_path / 'Curve1Hz_1.csv'
+    header_only.write_text('# freq_hz=1\ntime_us,error,angle,valid\n')
+    empty = tmp_path / 'Curve2Hz_1.csv'
+    empty.write_text('')
+
+    for path in (header_only, empty):
+        with pytest.raises(ValueError, match='no data rows'):
+            bode.load_run(str(path))
+
+
+def test_analyse_dir_skips_unusable_runs(tmp_path):
+    write_run(str(tmp_path / 'Curve0.5Hz_1.csv'))
+    (tmp_path / 'Curve1Hz_1.csv').write_text('# freq_hz=1\ntime_us,error,angle,valid\n')
+    (tmp_path / 'Curve2Hz_1.csv').write_text('')
+
+    results = bode.analyse_dir(str(tmp_path), jobs=1)
+
+    assert [r['freq_hz'] for r in results] == [0.5]
+    assert results[0]['gain'] == pytest.approx(0.8, abs=0.01)
+    assert results[0]['phase_deg'] == pytest.approx(-30, abs=1)
+
+
+@pytest.mark.parametrize('freq, gain, phase_deg', [(0.2, 1.0, -5), (1, 0.5, -60), (2, 0.3, -120)])
+def test_analyse_run_recovers_gain_and_phase(tmp_path, freq, gain, phase_deg):
+    path = str(tmp_path / ('Curve%sHz_1.csv' % freq))
+    write_run(path, freq=freq, rows=400, gain=gain, phase_deg=phase_deg)
+
+    result = bode.analyse_run(path)
+
+    assert result['gain'] == pytest.approx(gain, abs=0.01)
+    assert result['phase_deg'] == pytest.approx(phase_deg, abs=1)
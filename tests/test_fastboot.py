@@ -0,0 +1,41 @@
+"""
+Fast boot: the saved profile is only used to skip warm-up once it exists.
+"""
+
+
+def test_servo_countdown_until_trims_saved(micropython, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    from servos import Servo
+
+    # No saved trims, the countdown still runs in fast boot mode
+    servo = Servo(fast_boot=True)
+    servo.soft_reset()
+    assert not servo.trims_loaded
+    assert 'seconds remaining' in capsys.readouterr().out
+
+    servo.save_trims()
+    servo = Servo(fast_boot=True)
+    servo.soft_reset()
+    assert servo.trims_loaded
+    assert 'seconds remaining' not in capsys.readouterr().out
+
+
+def test_cam_profile_keeps_auto_exposure(replay_session, tmp_path, monkeypatch):
+    session = replay_session(n=5)
+    monkeypatch.chdir(tmp_path)
+    import fastboot
+    import sensor
+    from camera import Cam
+    from replay.clock import clock
+
+    exposure = []
+    monkeypatch.setattr(sensor, 'set_auto_exposure', lambda enable, exposure_us=None: exposure.append(enable))
+
+    Cam(session.meta['thresholds'], fast_boot=True)
+    assert set(fastboot.load()['cam']) == {'gain', 'grayscale', 'gain_db', 'rgb_gain_db'}
+
+    # The second boot reapplies the saved values without the 2s warm-up
+    t_start = clock.now_us
+    Cam(session.meta['thresholds'], fast_boot=True)
+    assert clock.now_us - t_start < 2000000
+    assert False not in exposure
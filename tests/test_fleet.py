@@ -0,0 +1,29 @@
+import asyncio
+
+import fake_board
+from fleet import Fleet
+
+
+def test_rtt_probes_do_not_touch_the_script_port():
+    async def run():
+        boards = await fake_board.start_boards(2, 9400, fps=30)
+        fleet = Fleet(rtt_every_s=0.05)
+        for board in boards:
+            fleet.add(board.name, '127.0.0.1', board.stream_port, board.exec_port)
+
+        fleet.start()
+        await asyncio.sleep(0.5)
+        health = fleet.health()
+        await fleet.stop()
+        for board in boards:
+            await board.stop()
+
+        return boards, health
+
+    boards, health = asyncio.run(run())
+
+    for board in boards:
+        assert board.exec_connections == 0
+        assert board.scripts == []
+        assert health[board.name]['rtt_ms'] is not None
+        assert health[board.name]['frames'] > 0
@@ -0,0 +1,49 @@
+"""
+Motion gating of Cam.get_blobs on replayed sessions.
+"""
+
+
+def make_cam(replay_session, **kwargs):
+    session = replay_session(**kwargs)
+    from camera import Cam
+
+    cam = Cam(session.meta['thresholds'], 25, gate=True)
+    cam.gate_force_every = 1000
+
+    return cam, session
+
+
+def test_slow_drift_is_detected(replay_session):
+    # 1 px per frame stays under the threshold frame to frame, but not from the last detection
+    cam, session = make_cam(replay_session, n=60, speed=1)
+
+    for i in range(len(session)):
+        blobs, img = cam.get_blobs()
+        x = 160 // 4 + i
+        assert len(blobs) == 1
+        assert abs(blobs[0].cx() - (x + 10)) <= 4
+
+    assert 0 < cam.gate_stats()['skipped'] < len(session)
+
+
+def test_still_scene_is_skipped(replay_session):
+    cam, session = make_cam(replay_session, n=20, speed=0)
+
+    for i in range(len(session)):
+        cam.get_blobs()
+
+    assert cam.gate_stats()['skipped'] == len(session) - 1
+
+
+def test_threshold_change_forces_detection(replay_session):
+    cam, session = make_cam(replay_session, n=10, speed=0)
+
+    cam.get_blobs()
+    cam.get_blobs()
+    assert cam.detections == 1
+
+    # No blob matches the new thresholds, so blobs from the old ones must not be reused
+    cam.set_baseline([(0, 10, -5, 5, -5, 5)])
+    blobs, img = cam.get_blobs()
+    assert cam.detections == 2
+    assert blobs == []
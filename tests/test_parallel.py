@@ -0,0 +1,42 @@
+import math
+
+import pytest
+
+pytest.importorskip('numpy')
+from replay.parallel import sweep_pid
+
+
+def bearings(n=200, period_us=33333):
+    return [(i * period_us, 20 * math.sin(i / 15) if i % 17 else None) for i in range(n)]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_sweep_pid_repeats_are_identical(workers):
+    params = [(0.3, 0.05, 0.01, 10)] * 3 + [(0.2, 0, 0, 0)]
+
+    results = sweep_pid(None, bearings(), params, workers=workers)
+
+    assert [r['params'] for r in results] == [tuple(p) for p in params]
+    assert results[0] == results[1] == results[2]
+    assert results[0] != results[3]
+    assert results[0]['lost'] == len([b for t, b in bearings() if b is None])
+
+
+def test_decode_empty_range(tmp_path, capsys):
+    from argparse import Namespace
+    from conftest import write_session
+    from replay.parallel import SharedFrames, main
+
+    path = write_session(str(tmp_path / 'session'), n=3, width=32, height=24, size=4)
+    empty = write_session(str(tmp_path / 'empty'), n=0, width=32, height=24, size=4)
+
+    for args in ((path, 3), (path, 5, 10), (path, 2, 1), (empty,)):
+        frames = SharedFrames.decode(*args, workers=1)
+        assert frames.frames.shape == (0, 24, 32, 3)
+        frames.unlink()
+
+    with pytest.raises(ValueError):
+        SharedFrames.decode(path, -1)
+
+    main(Namespace(sessions=[empty], workers=1, threshold=0, pid=[(0.22, 0, 0, 0)], bench=False))
+    assert 'no frames' in capsys.readouterr().out
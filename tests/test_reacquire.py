@@ -0,0 +1,53 @@
+"""
+Bookkeeping of the bearings searched by Robot.reacquire.
+"""
+
+
+def make_cam(replay_session):
+    replay_session(n=2)
+    from camera import Cam
+
+    return Cam([[30, 100, 15, 127, 15, 127]], 25)
+
+
+def test_add_covered_keeps_gaps(replay_session):
+    cam = make_cam(replay_session)
+
+    covered = cam.add_covered([], -10, 10)
+    covered = cam.add_covered(covered, 40, 60)
+    assert covered == [(-10, 10), (40, 60)]
+
+    covered = cam.add_covered(covered, -30, -20)
+    assert covered == [(-30, -20), (-10, 10), (40, 60)]
+
+    # Overlapping both neighbours merges all three
+    covered = cam.add_covered(covered, 5, 45)
+    assert covered == [(-30, -20), (-10, 60)]
+
+
+def test_exposed_on_both_sides(replay_session):
+    cam = make_cam(replay_session)
+    half_fov = cam.h_fov/2
+
+    # The view reaches past both ends of a narrow searched range
+    covered = [(-5, 5)]
+    assert cam.exposed_spans(0, covered) == [(-half_fov, -5), (5, half_fov)]
+
+    rois = sorted(cam.get_exposed_rois(0, covered))
+    assert len(rois) == 2
+    (x0, _, w0, _), (x1, _, w1, _) = rois
+    assert x0 == 0 and 0 < w0 < cam.w_centre
+    assert cam.w_centre < x1 < x1 + w1 <= 2*cam.w_centre
+
+
+def test_gap_between_searched_ranges_is_scanned(replay_session):
+    cam = make_cam(replay_session)
+    half_fov = cam.h_fov/2
+
+    # After a jump the bearings between the two views are still unsearched
+    covered = cam.add_covered([], -half_fov, half_fov)
+    covered = cam.add_covered(covered, 3*half_fov, 5*half_fov)
+    assert cam.exposed_spans(2*half_fov, covered) == [(half_fov, 3*half_fov)]
+
+    assert len(cam.get_exposed_rois(2*half_fov, covered)) == 1
+    assert cam.get_exposed_rois(0, covered) == []
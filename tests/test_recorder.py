@@ -0,0 +1,81 @@
+"""
+Recorder sessions read back with replay.session.Session.
+"""
+
+import json
+import os
+import struct
+
+import pytest
+
+
+def test_timestamps_past_32_bits(micropython, tmp_path):
+    import numpy as np
+    from recorder import Recorder
+    from replay.image import Image
+    from replay.session import Session
+
+    img = Image(np.zeros((120, 160), dtype=np.uint8))
+    recorder = Recorder(str(tmp_path / 'rec'), 'raw')
+
+    # A frame every 5 min up to 80 min, past the 32-bit limit (71.6 min)
+    for t in range(0, 80 * 60000001, 5 * 60000000):
+        recorder.add(img, t)
+        recorder.flush(img.size())
+    recorder.close()
+
+    session = Session(str(tmp_path / 'rec'))
+    t_us = [session[i].t_us for i in range(len(session))]
+    assert t_us == list(range(0, 80 * 60000001, 5 * 60000000))
+    assert t_us[-1] > 2 ** 32
+    assert session.index_at(72 * 60000000) == len(session) - 2
+
+
+def test_reads_version_1_sessions(tmp_path):
+    pytest.importorskip('numpy')
+    from replay.session import Session
+
+    path = tmp_path / 'rec'
+    path.mkdir()
+    (path / 'frames.bin').write_bytes(bytes(4))
+    (path / 'index.bin').write_bytes(struct.pack('<IIIIfff', 0, 1000, 0, 2, 1, 0, 0) +
+                                     struct.pack('<IIIIfff', 1, 2000, 2, 2, 2, 0, 0))
+    (path / 'meta.json').write_text(json.dumps({'version': 1, 'format': 'raw', 'pixformat': 'grayscale',
+                                                'width': 2, 'height': 1}))
+
+    session = Session(str(path))
+    assert [session[i].t_us for i in range(2)] == [1000, 2000]
+    assert session[1].pan == 2
+
+
+def test_raw_vga_rejected(micropython, tmp_path):
+    import numpy as np
+    from recorder import Recorder
+    from replay.image import Image
+
+    with pytest.raises(ValueError, match='RAW_LIMIT'):
+        Recorder(str(tmp_path / 'rec0'), 'raw', frame_size=640 * 480 * 2)
+
+    # Without a known frame size, the first frame is checked before the slots are allocated
+    recorder = Recorder(str(tmp_path / 'rec1'), 'raw')
+    with pytest.raises(ValueError, match='RAW_LIMIT'):
+        recorder.add(Image(np.zeros((480, 640, 3), dtype=np.uint8)), 0)
+    assert recorder.slots is None
+
+
+def test_compression_timed(micropython, tmp_path):
+    pytest.importorskip('PIL')
+    import numpy as np
+    from recorder import Recorder
+    from replay.image import Image
+
+    recorder = Recorder(str(tmp_path / 'rec'), 'jpeg')
+    for i in range(3):
+        recorder.add(Image(np.zeros((120, 160, 3), dtype=np.uint8)), i * 33333)
+        recorder.flush()
+    recorder.close()
+
+    summary = recorder.summary()
+    assert recorder.compressed == 3
+    assert 0 <= summary['compress_us_mean'] <= summary['compress_us_max']
+    assert os.path.getsize(str(tmp_path / 'rec' / 'index.bin')) == 3 * struct.calcsize('<IQIIfff')
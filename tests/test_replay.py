@@ -0,0 +1,18 @@
+import sys
+import time
+
+import pytest
+
+
+def test_install_undo():
+    pytest.importorskip('numpy')
+    import replay
+
+    sleep = time.sleep
+    undo = replay.install()
+    assert time.sleep is not sleep and sys.modules['utime'] is time
+    undo()
+
+    assert time.sleep is sleep
+    assert not hasattr(time, 'ticks_ms')
+    assert 'sensor' not in sys.modules and 'utime' not in sys.modules
@@ -0,0 +1,31 @@
+"""
+follow_blob on a replayed session.
+"""
+
+import pytest
+
+# Only matches blue, the synthetic target is red
+BLUE = [[0, 100, -128, 127, -128, -30]]
+
+
+@pytest.mark.parametrize('steady', [False, True])
+def test_follow_blob_misses(replay_session, capsys, steady):
+    session = replay_session(n=20)
+    from replay import ReplayFinished
+    from robot import Robot
+
+    robot = Robot(BLUE)
+    capsys.readouterr()
+    try:
+        with pytest.raises(ReplayFinished):
+            robot.follow_blob(0.2, 0, steady=steady, search_after=None)
+    finally:
+        robot.gc_control.stop()
+
+    assert robot.lost_frames == len(session)
+    printed = capsys.readouterr().out
+    if steady:
+        # No per-miss logging or printing while the target is lost
+        assert printed == ''
+    else:
+        assert 'Correct blob not found' in printed
@@ -0,0 +1,54 @@
+"""
+follow_blob_async on a replayed session: the capture, control and telemetry
+tasks run on CPython asyncio with the virtual clock.
+"""
+
+import pytest
+
+
+def test_follow_blob_async_stats(replay_session):
+    session = replay_session(n=40, period_us=33333)
+    from replay import ReplayFinished, sensor
+    from replay.clock import clock
+    from robot import Robot
+    from scheduler import Scheduler
+
+    robot = Robot(session.meta['thresholds'])
+    t_start = clock.now_us
+    scheduler = Scheduler()
+
+    # Capture raises once the session runs out, which stops every task
+    with pytest.raises(ReplayFinished):
+        robot.follow_blob_async(0.2, 0, control_hz=50, telemetry_ms=None, scheduler=scheduler)
+
+    stats = scheduler.stats()
+    assert set(stats) >= {'capture', 'control', 'log'}
+    assert sensor.position() == len(session)
+
+    # Every frame was captured and the target found in each of them
+    assert stats['capture']['count'] == len(session)
+    assert robot.lost_frames == 0
+
+    # The target was timestamped with the capture time of the last frame (us)
+    assert robot.t_seen == robot.cam.t_capture
+    assert robot.t_seen - t_start >= session[len(session) - 1].t_us
+
+    # Control ran on its deadline grid over the virtual time of the session
+    elapsed_us = clock.now_us - t_start
+    assert 0 < stats['control']['count'] <= elapsed_us // 20000 + 2
+    for s in stats.values():
+        assert 0 <= s['late_mean'] <= s['late_max']
+        assert 0 <= s['run_mean'] <= s['run_max']
+
+
+def test_target_rate_from_capture_times(replay_session):
+    replay_session(n=10, speed=2)
+    from robot import Robot
+
+    robot = Robot([[30, 100, 15, 127, 15, 127]])
+    for i in range(10):
+        robot.capture_target(0)
+
+    # Moving right, so the bearing decreases, at a rate set by the frame period not the detection time
+    assert robot.target_rate < 0
+    assert robot.predict_bearing(0) == robot.target_bearing
@@ -0,0 +1,20 @@
+"""
+Servo output stage on the replay machine module.
+"""
+
+
+def test_soft_reset_drops_waiting_commands(micropython):
+    from servos import Servo
+
+    servo = Servo()
+    servo.start_output(timer=False)
+    servo.set_speed(0.5, -0.5)
+    assert servo.pending_mask & (1 << servo.left_id | 1 << servo.right_id)
+
+    servo.soft_reset()
+    servo.flush()
+
+    # The wheel commands queued before the reset are not sent afterwards
+    for idx in (servo.left_id, servo.right_id):
+        assert servo.pca9685.pwm(idx) == (0, 4096)
+        assert tuple(servo.shadow[2 * idx:2 * idx + 2]) == (0, 4096)
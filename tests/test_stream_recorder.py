@@ -0,0 +1,184 @@
+import asyncio
+import json
+import os
+import struct
+import time
+
+import pytest
+
+import fake_board
+from stream_recorder import INDEX_FORMAT, INDEX_SIZE, StreamRecorder, StreamRecording
+
+
+def frames(n, size=1000):
+    return [fake_board.fake_jpeg(size + i) for i in range(n)]
+
+
+def test_reopen_after_partial_write(tmp_path):
+    path = str(tmp_path / 'rec')
+    first = frames(5)
+    recorder = StreamRecorder(path)
+    for jpeg in first:
+        recorder.add(jpeg)
+    recorder.close()
+
+    # A crash part way through a frame and its index record
+    with open(os.path.join(path, 'frames.mjpeg'), 'ab') as file:
+        file.write(b'\xff\xd8' + b'x' * 300)
+    with open(os.path.join(path, 'index.bin'), 'ab') as file:
+        file.write(b'\x00' * (INDEX_SIZE // 2))
+
+    second = frames(3, 2000)
+    recorder = StreamRecorder(path)
+    for jpeg in second:
+        recorder.add(jpeg)
+    recorder.close()
+
+    recording = StreamRecording(path)
+    assert len(recording) == len(first) + len(second)
+    assert [bytes(recording[i]) for i in range(len(recording))] == first + second
+    times = [recording.record(i)[2] for i in range(len(recording))]
+    assert times == sorted(times)
+    recording.close()
+
+
+def test_index_record_past_the_data_is_dropped(tmp_path):
+    path = str(tmp_path / 'rec')
+    recorder = StreamRecorder(path)
+    for jpeg in frames(4):
+        recorder.add(jpeg)
+    recorder.close()
+
+    # The last frame only partly reached the disk, its index record did
+    os.truncate(os.path.join(path, 'frames.mjpeg'), os.path.getsize(os.path.join(path, 'frames.mjpeg')) - 10)
+
+    recorder = StreamRecorder(path)
+    recorder.add(b'new frame')
+    recorder.close()
+
+    recording = StreamRecording(path)
+    assert len(recording) == 4
+    assert bytes(recording[3]) == b'new frame'
+    recording.close()
+
+
+def test_wall_clock_steps_do_not_break_the_index(tmp_path, monkeypatch):
+    path = str(tmp_path / 'rec')
+    wall = [2000000000 * 10**9]
+
+    def time_ns():
+        # The wall clock is stepped back by NTP between every call
+        wall[0] -= 10**9
+        return wall[0]
+
+    monkeypatch.setattr(time, 'time_ns', time_ns)
+    for run in range(2):
+        recorder = StreamRecorder(path)
+        for jpeg in frames(10):
+            recorder.add(jpeg)
+        recorder.close()
+
+    recording = StreamRecording(path)
+    times = [recording.record(i)[2] for i in range(len(recording))]
+    assert times == sorted(times)
+    assert list(recording.time_range(0, recording.duration_s() + 1)) == list(range(20))
+    assert recording.index_at(times[12]) == 12
+
+    # Wall times come from the start of each run
+    assert recording.wall_time_ns(0) < 2000000000 * 10**9
+    assert recording.wall_time_ns(10) < recording.wall_time_ns(0)
+    recording.close()
+
+
+def test_export_session_reads_back(tmp_path):
+    pytest.importorskip('numpy')
+    from replay.session import Session
+
+    path = str(tmp_path / 'rec')
+    sent = frames(6)
+    recorder = StreamRecorder(path)
+    for i, jpeg in enumerate(sent):
+        # 20 min apart, past the 32-bit microsecond limit by the end
+        recorder.add(jpeg, i * 20 * 60 * 10**9)
+    recorder.close()
+
+    recording = StreamRecording(path)
+    assert recording.export_session(str(tmp_path / 'session'), range(1, 6), {'thresholds': [[1, 2]]}) == 5
+    recording.close()
+
+    session = Session(str(tmp_path / 'session'))
+    assert len(session) == 5
+    assert [bytes(session[i].data) for i in range(5)] == sent[1:]
+    assert [session[i].t_us for i in range(5)] == [i * 20 * 60 * 10**6 for i in range(5)]
+    assert session.index_at(70 * 60 * 10**6) == 4
+    assert session.meta['thresholds'] == [[1, 2]]
+    session.close()
+
+
+def test_export_session_over_4gb_is_rejected(tmp_path):
+    path = tmp_path / 'rec'
+    path.mkdir()
+
+    # Two 2.5 GB frames in a sparse file
+    size = 2500 * 10**6
+    with open(str(path / 'frames.mjpeg'), 'wb') as file:
+        file.truncate(2 * size)
+    (path / 'index.bin').write_bytes(struct.pack(INDEX_FORMAT, 0, size, 0) +
+                                     struct.pack(INDEX_FORMAT, size, size, 1))
+
+    recording = StreamRecording(str(path))
+    with pytest.raises(ValueError, match='4 GB'):
+        recording.export_session(str(tmp_path / 'session'), range(2))
+    recording.close()
+
+    # Nothing was written
+    assert not (tmp_path / 'session').exists()
+
+
+def test_record_multipart_stream(tmp_path):
+    board = fake_board.FakeBoard('board0', stream_port=9700, exec_port=9701, fps=50,
+                                 frame_size=3000, telemetry_every=5)
+    recorder = StreamRecorder(str(tmp_path / 'rec'))
+
+    async def run():
+        await board.start()
+        try:
+            await recorder.record('127.0.0.1', 9700, duration_s=0.5, report_s=0)
+        finally:
+            await board.stop()
+
+    asyncio.run(run())
+    recorder.close()
+
+    # Every part is a whole frame sent by the board, bytes 2-10 hold its send time
+    recording = StreamRecording(str(tmp_path / 'rec'))
+    assert len(recording) >= 5
+    sent = {frame[:2] + frame[10:] for frame in board.frames}
+    for i in range(len(recording)):
+        data = bytes(recording[i])
+        assert data[:2] + data[10:] in sent
+    recording.close()
+
+    with open(str(tmp_path / 'rec' / 'telemetry.jsonl')) as file:
+        telemetry = [json.loads(line) for line in file]
+    assert telemetry and telemetry[0]['data']['board'] == 'board0'
+    assert [t['data']['frame'] for t in telemetry] == list(range(0, 5 * len(telemetry), 5))
+
+
+def test_part_without_length_is_rejected(tmp_path):
+    async def serve(reader, writer):
+        writer.write(b'HTTP/1.1 200 OK\r\n\r\n--openmv\r\nContent-Type: image/jpeg\r\n\r\n')
+        await writer.drain()
+
+    async def run():
+        server = await asyncio.start_server(serve, '127.0.0.1', 9710)
+        try:
+            with pytest.raises(ValueError, match='Content-Length'):
+                await recorder._read('127.0.0.1', 9710, 0)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    recorder = StreamRecorder(str(tmp_path / 'rec'))
+    asyncio.run(run())
+    recorder.close()
@@ -0,0 +1,147 @@
+"""
+MV_image_streamer.StreamServer on CPython sockets, its loop run in a thread.
+"""
+
+import socket
+import threading
+
+import fake_board
+import MV_image_streamer
+from MV_image_streamer import StreamServer
+
+BOUNDARY = b'--openmv'
+
+
+class Client(object):
+    """
+    Stream client counting the frame boundaries it receives, optionally never reading.
+    """
+
+    def __init__(self, port, read=True, rcvbuf=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.settimeout(5)
+        if rcvbuf:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self.sock.connect(('127.0.0.1', port))
+        self.sock.sendall(b"GET / HTTP/1.1\r\n\r\n")
+        self.frames = 0
+        self.closed = False
+        self.thread = None
+        if read:
+            self.thread = threading.Thread(target=self._read, daemon=True)
+            self.thread.start()
+
+    def _read(self):
+        tail = b''
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                data = tail + data
+                self.frames += data.count(BOUNDARY)
+                tail = data[-(len(BOUNDARY) - 1):]
+        except OSError:
+            pass
+        self.closed = True
+
+    def close(self):
+        self.sock.close()
+        if self.thread is not None:
+            self.thread.join(1)
+
+
+class TriplePoll(object):
+    """
+    poll object returning (obj, event, data) tuples, as MicroPython's may.
+    """
+
+    def __init__(self, poll):
+        self.poll_obj = poll
+
+    def __getattr__(self, name):
+        return getattr(self.poll_obj, name)
+
+    def poll(self, timeout=-1):
+        return [(obj, event, None) for obj, event in self.poll_obj.poll(timeout)]
+
+
+def serve(server, seconds):
+    thread = threading.Thread(target=lambda: server.run(int(seconds * 1000)), daemon=True)
+    thread.start()
+    return thread
+
+
+def close_all(server):
+    for sock in list(server.roles):
+        server.close(sock)
+
+
+def test_host_clock():
+    # Imported before any replay stand-ins, so the streamer runs on real time
+    assert MV_image_streamer.ticks_diff(MV_image_streamer.ticks_ms(), 0) > 0
+
+
+def test_viewers_receive_frames_and_slow_viewer_skips():
+    frame = fake_board.fake_jpeg(12000)
+    server = StreamServer(lambda: frame, ('127.0.0.1', 9600), ('127.0.0.1', 9601), fps=50, max_viewers=4,
+                          sndbuf=4096)
+    try:
+        thread = serve(server, 1.5)
+        fast = [Client(9600) for i in range(3)]
+        slow = Client(9600, read=False, rcvbuf=4096)
+        thread.join()
+        stats = server.stats()
+    finally:
+        close_all(server)
+        for client in fast + [slow]:
+            client.close()
+
+    # Every reading viewer keeps up with the frame rate
+    for client in fast:
+        assert client.frames > 0.5 * stats['frames']
+
+    # The viewer that never reads holds one frame and skips the rest, without stalling the others
+    assert stats['viewers'] == 4
+    assert stats['skipped'] > 0.5 * stats['frames']
+
+
+def test_viewers_over_the_limit_are_refused():
+    frame = fake_board.fake_jpeg(4000)
+    server = StreamServer(lambda: frame, ('127.0.0.1', 9610), ('127.0.0.1', 9611), fps=50, max_viewers=2)
+    try:
+        thread = serve(server, 0.8)
+        clients = [Client(9610) for i in range(3)]
+        thread.join()
+        stats = server.stats()
+        closed = [client.closed for client in clients]
+    finally:
+        close_all(server)
+        for client in clients:
+            client.close()
+
+    assert stats['accepted'] == 3
+    assert stats['refused'] == 1
+    assert stats['viewers'] == 2
+    assert sorted(client.frames > 0 for client in clients) == [False, True, True]
+    assert closed.count(True) == 1
+
+
+def test_script_is_executed_with_triple_poll_events():
+    frame = fake_board.fake_jpeg(4000)
+    scope = {}
+    server = StreamServer(lambda: frame, ('127.0.0.1', 9620), ('127.0.0.1', 9621), scope=scope)
+    server.poll = TriplePoll(server.poll)
+    try:
+        thread = serve(server, 0.5)
+        sock = socket.create_connection(('127.0.0.1', 9621), timeout=5)
+        sock.sendall(b"result = 6 * 7\n")
+        sock.shutdown(socket.SHUT_WR)
+        sock.recv(1)
+        sock.close()
+        thread.join()
+    finally:
+        close_all(server)
+
+    assert scope['result'] == 42
+    assert server.stats()['scripts'] == 1
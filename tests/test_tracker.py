@@ -0,0 +1,47 @@
+import pytest
+
+from tracker import Tracker
+
+
+class FakeBlob(object):
+    """
+    The blob methods the tracker uses.
+    """
+
+    def __init__(self, cx, cy, code=1, pixels=100):
+        self._cx = cx
+        self._cy = cy
+        self._code = code
+        self._pixels = pixels
+
+    def cx(self):
+        return self._cx
+
+    def cy(self):
+        return self._cy
+
+    def code(self):
+        return self._code
+
+    def pixels(self):
+        return self._pixels
+
+
+@pytest.mark.parametrize('cell', [16, 32, 64, 80, 160])
+def test_move_within_max_dist_keeps_id(micropython, cell):
+    tracker = Tracker(cell=cell, max_dist=80)
+
+    first = tracker.update([FakeBlob(100, 100)], t_ms=0)[0].id
+    tracks = tracker.update([FakeBlob(170, 100)], t_ms=33)
+
+    assert [t.id for t in tracks] == [first]
+
+
+def test_move_beyond_max_dist_starts_new_track(micropython):
+    tracker = Tracker(cell=32, max_dist=80)
+
+    tracker.update([FakeBlob(100, 100)], t_ms=0)
+    tracks = tracker.update([FakeBlob(190, 100)], t_ms=33)
+
+    assert len(tracks) == 2
+    assert tracks[0].misses == 1
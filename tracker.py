@@ -0,0 +1,230 @@
+"""
+Example:
+from tracker import Tracker
+tracker = Tracker()
+while True:
+    blobs, img = camera.get_blobs()
+    for track in tracker.update(blobs):
+        print(track.id, track.colour, track.x, track.y, track.vx, track.vy, track.misses)
+"""
+
+import time
+
+
+class Track(object):
+    """
+    A single target followed across frames, with a stable ID.
+    """
+
+    def __init__(self, track_id: int, blob, t_ms: int):
+        """
+        Start a track from a newly seen blob.
+
+        Args:
+            track_id (int): Unique ID of the track.
+            blob (blob): Blob the track starts from - see OpenMV docs for blob class.
+            t_ms (int): Capture time (ms) of the frame.
+        """
+        self.id = track_id
+        self.colour = blob.code()
+        self.x = blob.cx()
+        self.y = blob.cy()
+        self.vx = 0
+        self.vy = 0
+        self.pixels = blob.pixels()
+        self.blob = blob
+        self.age = 1
+        self.hits = 1
+        self.misses = 0
+        self.t_seen = t_ms
+
+
+    def predict(self, t_ms: int) -> tuple:
+        """
+        Predict the position of the track at a given time from its velocity.
+
+        Args:
+            t_ms (int): Time (ms) to predict at.
+
+        Returns:
+            x (float), y (float): Predicted centroid (pixels).
+        """
+        dt = time.ticks_diff(t_ms, self.t_seen)
+
+        return self.x + self.vx * dt, self.y + self.vy * dt
+
+
+    def update(self, blob, t_ms: int, smoothing: float = 0.5) -> None:
+        """
+        Update the track with the blob associated to it in a new frame.
+
+        Args:
+            blob (blob): Associated blob.
+            t_ms (int): Capture time (ms) of the frame.
+            smoothing (float): Weight of the new velocity measurement (0 to 1).
+        """
+        dt = time.ticks_diff(t_ms, self.t_seen)
+        if dt > 0:
+            self.vx += smoothing * ((blob.cx() - self.x) / dt - self.vx)
+            self.vy += smoothing * ((blob.cy() - self.y) / dt - self.vy)
+
+        self.x = blob.cx()
+        self.y = blob.cy()
+        self.pixels = blob.pixels()
+        self.blob = blob
+        self.hits += 1
+        self.misses = 0
+        self.t_seen = t_ms
+
+
+class Tracker(object):
+    """
+    Associates blobs between frames to give each target a persistent ID.
+    Tracks are indexed in a spatial grid so each blob is only compared with
+    tracks of the same colour in nearby cells, candidate pairs are matched
+    greedily by cost, and tracks survive a number of missed frames.
+    """
+
+    def __init__(self, cell: int = 80, max_dist: int = 80, max_misses: int = 10,
+                 budget_us: int = 3000):
+        """
+        Initialise the tracker.
+
+        Args:
+            cell (int): Size of the spatial grid cells (pixels). Cells within max_dist of a
+                blob's cell are searched, so cell >= max_dist searches only the 3x3 neighbourhood.
+            max_dist (int): Largest distance (pixels) between a prediction and a blob to match.
+            max_misses (int): Frames a track may go unmatched before it is dropped.
+            budget_us (int): Time budget (us) for association per frame.
+        """
+        self.cell = cell
+        self.max_dist = max_dist
+        self.rings = max(-(-max_dist // cell), 1)
+        self.max_misses = max_misses
+        self.budget_us = budget_us
+
+        self.tracks = []
+        self.next_id = 0
+        self.budget_overruns = 0
+
+
+    def update(self, blobs, t_ms: int = None) -> list:
+        """
+        Associate the blobs of a new frame with the current tracks.
+
+        Blobs are handled largest first. If the time budget runs out the
+        remaining (smallest) blobs are ignored for this frame, so they neither
+        update nor start tracks.
+
+        Args:
+            blobs (list): Blobs detected in the frame.
+            t_ms (int): Capture time (ms) of the frame, defaults to now.
+
+        Returns:
+            list: All current tracks, including those missed in this frame.
+        """
+        t_start = time.ticks_us()
+        if t_ms is None:
+            t_ms = time.ticks_ms()
+
+        # Index the predicted track positions by grid cell
+        grid = {}
+        predicted = []
+        for idx, track in enumerate(self.tracks):
+            x, y = track.predict(t_ms)
+            predicted.append((x, y))
+            key = self._key(int(x) // self.cell, int(y) // self.cell)
+            if key in grid:
+                grid[key].append(idx)
+            else:
+                grid[key] = [idx]
+
+        # Collect candidate pairs within range from the neighbouring cells
+        order = sorted(range(len(blobs)), key=lambda i: -blobs[i].pixels())
+        max_cost = self.max_dist * self.max_dist
+        pairs = []
+        handled = 0
+
+        for b in order:
+            if time.ticks_diff(time.ticks_us(), t_start) > self.budget_us:
+                self.budget_overruns += 1
+                break
+
+            blob = blobs[b]
+            gx = blob.cx() // self.cell
+            gy = blob.cy() // self.cell
+
+            for cx in range(gx - self.rings, gx + self.rings + 1):
+                for cy in range(gy - self.rings, gy + self.rings + 1):
+                    for idx in grid.get(self._key(cx, cy), ()):
+                        track = self.tracks[idx]
+                        if track.colour != blob.code():
+                            continue
+                        dx = blob.cx() - predicted[idx][0]
+                        dy = blob.cy() - predicted[idx][1]
+                        cost = dx * dx + dy * dy
+                        if cost < max_cost:
+                            pairs.append((cost, b, idx))
+            handled += 1
+
+        # Greedy one to one matching, cheapest pairs first
+        pairs.sort(key=lambda p: p[0])
+        blob_used = set()
+        track_used = set()
+        for cost, b, idx in pairs:
+            if b in blob_used or idx in track_used:
+                continue
+            self.tracks[idx].update(blobs[b], t_ms)
+            blob_used.add(b)
+            track_used.add(idx)
+
+        # Tracks without a blob coast on their prediction until they expire
+        kept = []
+        for idx, track in enumerate(self.tracks):
+            track.age += 1
+            if idx not in track_used:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            kept.append(track)
+
+        # Start new tracks from unmatched blobs that were considered
+        for b in order[:handled]:
+            if b not in blob_used:
+                kept.append(Track(self.next_id, blobs[b], t_ms))
+                self.next_id += 1
+
+        self.tracks = kept
+
+        return self.tracks
+
+
+    def get_track(self, track_id: int):
+        """
+        Find a track by ID.
+
+        Args:
+            track_id (int): ID of the track.
+
+        Returns:
+            Track: The track, or None if it no longer exists.
+        """
+        for track in self.tracks:
+            if track.id == track_id:
+                return track
+
+        return None
+
+
+    def reset(self) -> None:
+        """
+        Drop all tracks.
+        """
+        self.tracks = []
+
+
+    def _key(self, gx: int, gy: int) -> int:
+        """
+        Integer key of a grid cell, avoiding tuple allocation.
+        """
+        return gx * 4096 + gy
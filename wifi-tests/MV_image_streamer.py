@@ -1,12 +1,25 @@
-import sensor
-import time
-import network
 import socket
+import select
 import errno
-from machine import LED
+import time
+
+try:
+    from time import ticks_ms, ticks_us, ticks_diff, ticks_add
+except ImportError:
+    # CPython has no ticks_* helpers, emulate them so the server can be run on a host
+    from time import perf_counter_ns
+
+    def ticks_ms():
+        return perf_counter_ns() // 1000000
+
+    def ticks_us():
+        return perf_counter_ns() // 1000
+
+    def ticks_diff(a, b):
+        return a - b
 
-led = LED("LED_BLUE")
-led.on()
+    def ticks_add(a, b):
+        return a + b
 
 # Network settings
 SSID = 'charlie'  # Network SSID
@@ -15,91 +28,400 @@ KEY = 'password123'  # Network key
 # Video streaming settings
 HOST_STREAM = ''  # Use first available interface for streaming
 PORT_STREAM = 8080  # Port for video streaming
+STREAM_FPS = 30  # Target frame rate of the stream
+MAX_VIEWERS = 2  # Simultaneous stream clients
 
 # Script execution settings
 HOST_EXEC = ''  # Use first available interface for script execution
 PORT_EXEC = 8081  # Port for script execution
+MAX_SCRIPT = 16384  # Largest script (bytes) accepted
 
-# Initialize the camera sensor
-sensor.reset()
-sensor.set_pixformat(sensor.RGB565)
-sensor.set_framesize(sensor.QVGA)
-sensor.skip_frames(time=2000)
+STREAM_HEADER = (b"HTTP/1.1 200 OK\r\n"
+                 b"Server: OpenMV\r\n"
+                 b"Content-Type: multipart/x-mixed-replace;boundary=openmv\r\n"
+                 b"Cache-Control: no-cache\r\n"
+                 b"Pragma: no-cache\r\n\r\n")
 
-# Initialize and connect to WiFi
-wlan = network.WLAN(network.STA_IF)
-wlan.active(True)
-wlan.connect(SSID, KEY)
-while not wlan.isconnected():
-    time.sleep_ms(100)
+# Socket roles in the poll registry
+LISTEN_STREAM = 0
+LISTEN_EXEC = 1
+STREAM = 2
+EXEC = 3
 
-print("WiFi Connected. IP:", wlan.ifconfig()[0])
+WOULD_BLOCK = (errno.EAGAIN, getattr(errno, 'EWOULDBLOCK', errno.EAGAIN))
 
-# Create server sockets
-stream_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-exec_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-# Set sockets to non-blocking
-stream_socket.setblocking(False)
-exec_socket.setblocking(False)
-
-# Bind and listen on both sockets
-stream_socket.bind((HOST_STREAM, PORT_STREAM))
-exec_socket.bind((HOST_EXEC, PORT_EXEC))
-stream_socket.listen(1)
-exec_socket.listen(1)
-
-# Variables for clients
-stream_client = None
-
-def execute_script(script):
+def execute_script(script, scope):
     try:
-        exec(script, globals())
+        exec(script, scope)
         print("Script executed successfully.")
     except Exception as e:
         print("Error executing script:", e)
 
-while True:
-    # Accept new video streaming connection
-    if not stream_client:
+
+class StreamServer(object):
+    """
+    Streaming and script server driven by select.poll readiness.
+
+    Listening, stream and script sockets share one poll registry. The loop
+    only wakes when a socket is ready or the next frame is due, frames are
+    sent without blocking and a viewer still sending the previous frame
+    skips the new one instead of holding up the loop.
+    """
+
+    def __init__(self, grab, stream_addr=(HOST_STREAM, PORT_STREAM), exec_addr=(HOST_EXEC, PORT_EXEC),
+                 fps=STREAM_FPS, max_viewers=MAX_VIEWERS, max_script=MAX_SCRIPT, scope=None, sndbuf=None):
+        """
+        Create the listening sockets.
+
+        Args:
+            grab (function): Returns the next JPEG frame (bytes-like) or None if there is none.
+            stream_addr (tuple): (host, port) of the video stream.
+            exec_addr (tuple): (host, port) of the script server.
+            fps (float): Target frame rate of the stream.
+            max_viewers (int): Simultaneous stream clients, others are refused.
+            max_script (int): Largest script (bytes), larger scripts are dropped.
+            scope (dict): Globals the scripts are executed in.
+            sndbuf (int): Send buffer (bytes) of stream sockets, None for the default. A
+                board sized buffer makes slow viewers on a host skip frames as on the board.
+        """
+        self.grab = grab
+        self.period_ms = int(1000 / fps)
+        self.max_viewers = max_viewers
+        self.max_script = max_script
+        self.scope = scope if scope is not None else {}
+        self.sndbuf = sndbuf
+
+        self.poll = select.poll()
+        self.roles = {}
+        self.fds = {}
+        self.pending = {}
+        self.scripts = {}
+
+        self.stream_listen = self.listen(stream_addr, LISTEN_STREAM)
+        self.exec_listen = self.listen(exec_addr, LISTEN_EXEC)
+        self.viewers = 0
+        self.t_frame = ticks_ms()
+
+        self.reset_stats()
+
+
+    def reset_stats(self):
+        self.t_stats = ticks_us()
+        self.idle_us = 0
+        self.loops = 0
+        self.frames = 0
+        self.sent = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.accepted = 0
+        self.refused = 0
+        self.executed = 0
+
+
+    def listen(self, addr, role):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(socket.getaddrinfo(addr[0] or '0.0.0.0', addr[1])[0][-1])
+        sock.listen(2)
+        sock.setblocking(False)
+        self.register(sock, role, select.POLLIN)
+
+        return sock
+
+
+    def register(self, sock, role, mask):
+        self.roles[sock] = role
+        self.poll.register(sock, mask)
+
+        # CPython poll reports file descriptors, MicroPython the socket itself
+        if hasattr(sock, 'fileno'):
+            self.fds[sock.fileno()] = sock
+
+
+    def close(self, sock):
+        role = self.roles.pop(sock, None)
+        if role == STREAM:
+            self.viewers -= 1
+        self.pending.pop(sock, None)
+        self.scripts.pop(sock, None)
+
+        if hasattr(sock, 'fileno'):
+            self.fds.pop(sock.fileno(), None)
         try:
-            stream_client, _ = stream_socket.accept()
-            stream_client.sendall(
-                b"HTTP/1.1 200 OK\r\n"
-                b"Server: OpenMV\r\n"
-                b"Content-Type: multipart/x-mixed-replace;boundary=openmv\r\n"
-                b"Cache-Control: no-cache\r\n"
-                b"Pragma: no-cache\r\n\r\n"
-            )
-        except Exception as e:
-            if str(e) != '[Errno 11] EAGAIN' and str(e) != '[Errno 11] EWOULDBLOCK':
-                pass  # No new connection
-
-    # Accept new script execution connection
-    try:
-        exec_client, _ = exec_socket.accept()
-        script = exec_client.recv(2048)  # Adjust buffer size as needed
-        print("Received script:", script)  # Print the received script for debugging
-        execute_script(script)
-        exec_client.close()
-        exec_client = None
-    except Exception as e:
-        if str(e) != '[Errno 11] EAGAIN' and str(e) != '[Errno 11] EWOULDBLOCK':
-            pass  # No new connection
+            self.poll.unregister(sock)
+        except (OSError, KeyError, ValueError):
+            pass
+        sock.close()
+
+
+    def run(self, duration_ms=None):
+        """
+        Serve until stopped, or for a time.
+
+        Args:
+            duration_ms (int): Time (ms) to serve for, None for ever.
+        """
+        t_end = ticks_add(ticks_ms(), duration_ms) if duration_ms is not None else None
+
+        while t_end is None or ticks_diff(t_end, ticks_ms()) > 0:
+            self.step(t_end)
+
+
+    def step(self, t_end=None):
+        """
+        Wait until a socket is ready or the next frame is due, then handle it.
+
+        Args:
+            t_end (int): ticks_ms() time to return by at the latest.
+        """
+        now = ticks_ms()
+
+        # Only a frame deadline bounds the wait, with no viewers the loop sleeps until a connection
+        timeout = -1
+        if self.viewers:
+            timeout = max(ticks_diff(self.t_frame, now), 0)
+        if t_end is not None:
+            remaining = max(ticks_diff(t_end, now), 0)
+            timeout = remaining if timeout < 0 else min(timeout, remaining)
+
+        t_wait = ticks_us()
+        events = self.poll.poll(timeout)
+        self.idle_us += ticks_diff(ticks_us(), t_wait)
+        self.loops += 1
+
+        # MicroPython may return (obj, event, data) tuples
+        for ev in events:
+            obj = ev[0]
+            event = ev[1]
+            sock = self.fds.get(obj, obj)
+            role = self.roles.get(sock)
+            if role is None:
+                continue
+
+            if role == LISTEN_STREAM or role == LISTEN_EXEC:
+                self.accept(sock, role)
+            elif event & (select.POLLERR | select.POLLHUP):
+                self.close(sock)
+            elif role == STREAM:
+                if event & select.POLLOUT:
+                    self.send_pending(sock)
+                if event & select.POLLIN and sock in self.roles:
+                    self.discard(sock)
+            elif role == EXEC:
+                self.read_script(sock)
+
+        if self.viewers and ticks_diff(ticks_ms(), self.t_frame) >= 0:
+            self.t_frame = ticks_add(self.t_frame, self.period_ms)
+
+            # Do not try to catch up after a long script, restart the frame clock
+            if ticks_diff(ticks_ms(), self.t_frame) > 0:
+                self.t_frame = ticks_add(ticks_ms(), self.period_ms)
 
-    # Stream the framebuffer content
-    if stream_client:
+            self.send_frame()
+
+
+    def accept(self, listener, role):
         try:
-            fb = sensor.get_fb()  # Get the framebuffer
-            if fb is not None:
-                jpg = fb.compress(quality=35)  # Compress the framebuffer
-                header = b"--openmv\r\nContent-Type: image/jpeg\r\nContent-Length: " + str(jpg.size()).encode() + b"\r\n\r\n"
-                stream_client.sendall(header + jpg)
-        except Exception as e:
-            if 'EWOULDBLOCK' in str(e) or 'EAGAIN' in str(e):
+            client, addr = listener.accept()
+        except OSError as e:
+            if e.args[0] in WOULD_BLOCK:
+                return
+            raise
+
+        self.accepted += 1
+
+        if role == LISTEN_STREAM:
+            if self.viewers >= self.max_viewers:
+                self.refused += 1
+                client.close()
+                return
+            client.setblocking(False)
+            if self.sndbuf:
+                try:
+                    client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+                except (AttributeError, OSError):
+                    pass
+            self.register(client, STREAM, select.POLLIN)
+            self.viewers += 1
+            self.pending[client] = [memoryview(STREAM_HEADER), 0]
+            self.send_pending(client)
+            self.t_frame = ticks_ms()
+        else:
+            client.setblocking(False)
+            self.register(client, EXEC, select.POLLIN)
+            self.scripts[client] = [[], 0]
+
+
+    def send_frame(self):
+        jpg = self.grab()
+        if jpg is None:
+            return
+
+        self.frames += 1
+        frame = memoryview(b"--openmv\r\nContent-Type: image/jpeg\r\nContent-Length: " +
+                           str(len(jpg)).encode() + b"\r\n\r\n" + jpg)
+
+        for sock, role in list(self.roles.items()):
+            if role != STREAM:
                 continue
-            else:
-                stream_client.close()
-                stream_client = None
+            if sock in self.pending:
+                # Still sending the previous frame to a slow viewer
+                self.skipped += 1
+                continue
+            self.pending[sock] = [frame, 0]
+            self.send_pending(sock)
+
+
+    def send_pending(self, sock):
+        """
+        Send as much of the queued data as the socket accepts without blocking,
+        waiting for POLLOUT only while something is left.
+        """
+        entry = self.pending.get(sock)
+        if entry is None:
+            self.poll.modify(sock, select.POLLIN)
+            return
+
+        data, pos = entry
+        try:
+            while pos < len(data):
+                n = sock.send(data[pos:])
+                if not n:
+                    break
+                pos += n
+                self.bytes += n
+        except OSError as e:
+            if e.args[0] not in WOULD_BLOCK:
+                self.close(sock)
+                return
+
+        if pos < len(data):
+            entry[1] = pos
+            self.poll.modify(sock, select.POLLIN | select.POLLOUT)
+        else:
+            del self.pending[sock]
+            self.sent += 1
+            self.poll.modify(sock, select.POLLIN)
+
+
+    def discard(self, sock):
+        """
+        Drop the viewer's request bytes, an empty read means it disconnected.
+        """
+        try:
+            if not sock.recv(512):
+                self.close(sock)
+        except OSError as e:
+            if e.args[0] not in WOULD_BLOCK:
+                self.close(sock)
+
+
+    def read_script(self, sock):
+        """
+        Read a script until the sender closes its side, then execute it.
+        """
+        entry = self.scripts[sock]
+        chunks = entry[0]
+        try:
+            data = sock.recv(2048)
+        except OSError as e:
+            if e.args[0] in WOULD_BLOCK:
+                return
+            data = b''
+            del chunks[:]
+
+        if data:
+            chunks.append(data)
+            entry[1] += len(data)
+            if entry[1] > self.max_script:
+                print("Script too large, dropped.")
+                self.close(sock)
+            return
+
+        self.close(sock)
+
+        # Empty connections are connectivity/RTT probes
+        if chunks:
+            script = b''.join(chunks)
+            print("Received script:", len(script), "bytes")
+            self.executed += 1
+            execute_script(script, self.scope)
+
+            # A long script should not be followed by a burst of late frames
+            self.t_frame = ticks_ms()
+
+
+    def stats(self):
+        """
+        Returns:
+            dict: Idle and busy time since the last reset, and traffic counters.
+        """
+        elapsed = max(ticks_diff(ticks_us(), self.t_stats), 1)
+
+        return {'idle_pct': 100 * self.idle_us / elapsed,
+                'busy_pct': 100 * (elapsed - self.idle_us) / elapsed,
+                'loops': self.loops,
+                'viewers': self.viewers,
+                'frames': self.frames,
+                'sent': self.sent,
+                'skipped': self.skipped,
+                'kbytes': self.bytes // 1024,
+                'accepted': self.accepted,
+                'refused': self.refused,
+                'scripts': self.executed}
+
+
+    def report(self):
+        print(self.stats())
+        self.reset_stats()
+
+
+if __name__ == "__main__":
+    try:
+        import sensor
+    except ImportError:
+        sensor = None
+
+    if sensor is not None:
+        import network
+        from machine import LED
+
+        led = LED("LED_BLUE")
+        led.on()
+
+        # Initialize the camera sensor
+        sensor.reset()
+        sensor.set_pixformat(sensor.RGB565)
+        sensor.set_framesize(sensor.QVGA)
+        sensor.skip_frames(time=2000)
+
+        # Initialize and connect to WiFi
+        wlan = network.WLAN(network.STA_IF)
+        wlan.active(True)
+        wlan.connect(SSID, KEY)
+        while not wlan.isconnected():
+            time.sleep_ms(100)
+
+        print("WiFi Connected. IP:", wlan.ifconfig()[0])
+
+        def grab():
+            fb = sensor.get_fb()  # Get the framebuffer
+            if fb is None:
+                return None
+            return fb.compress(quality=35).bytearray()  # Compress the framebuffer
+    else:
+        # Host run with synthetic frames, e.g. as a target for load_test.py
+        import fake_board
+
+        frame = fake_board.fake_jpeg(12000)
+        print("Host run, streaming synthetic frames on port", PORT_STREAM)
+
+        def grab():
+            return frame
+
+    server = StreamServer(grab, scope=globals())
 
-    time.sleep_ms(10)  # Small delay to prevent a busy loop
+    while True:
+        server.run(5000)
+        server.report()
@@ -0,0 +1,225 @@
+"""
+Host side stand-in for boards running MV_image_streamer.py, to test the
+fleet manager and stream viewers without hardware.
+
+Each fake board serves the same protocol as the streamer: an HTTP
+multipart/x-mixed-replace stream (boundary 'openmv') of JPEG parts on its
+stream port, and a script port that reads a script until the sender closes
+its side. Frames are synthetic (valid JPEG markers around random bytes)
+carrying their send time (time.monotonic_ns(), 8 bytes little endian after
+the start marker) so viewers on the same machine can measure latency.
+Every telemetry_every frames a JSON telemetry part is sent as well.
+
+Example:
+python fake_board.py --count 20 --base-port 9000      # board i on ports 9000+2i, 9001+2i
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import struct
+import time
+
+BOUNDARY = b'openmv'
+STREAM_HEADER = (b"HTTP/1.1 200 OK\r\n"
+                 b"Server: OpenMV\r\n"
+                 b"Content-Type: multipart/x-mixed-replace;boundary=openmv\r\n"
+                 b"Cache-Control: no-cache\r\n"
+                 b"Pragma: no-cache\r\n\r\n")
+
+
+def part(data: bytes, content_type: bytes = b'image/jpeg') -> bytes:
+    """
+    Frame a payload as one part of the multipart stream, as the streamer does.
+
+    Args:
+        data (bytes): Payload.
+        content_type (bytes): MIME type of the payload.
+
+    Returns:
+        bytes: Boundary, headers and payload.
+    """
+    return (b"--" + BOUNDARY + b"\r\nContent-Type: " + content_type +
+            b"\r\nContent-Length: " + str(len(data)).encode() + b"\r\n\r\n" + data)
+
+
+def frame_time_ns(jpeg: bytes) -> int:
+    """
+    Args:
+        jpeg (bytes): Frame sent by a fake board.
+
+    Returns:
+        int: Send time of the frame (time.monotonic_ns()).
+    """
+    return struct.unpack_from('<Q', jpeg, 2)[0]
+
+
+def fake_jpeg(size: int) -> bytes:
+    """
+    Args:
+        size (int): Total size (bytes).
+
+    Returns:
+        bytes: Random bytes between JPEG start and end of image markers.
+    """
+    return b'\xff\xd8' + os.urandom(max(size - 4, 8)) + b'\xff\xd9'
+
+
+class FakeBoard(object):
+    """
+    A single fake board with a stream server and a script server.
+    """
+
+    def __init__(self, name: str, host: str = '127.0.0.1', stream_port: int = 8080,
+                 exec_port: int = 8081, fps: float = 20, frame_size: int = 12000,
+                 telemetry_every: int = 10, exec_delay: float = 0.0, max_clients: int = 1):
+        """
+        Args:
+            name (str): Board name, reported in telemetry.
+            host (str): Interface to listen on.
+            stream_port (int): Port of the video stream.
+            exec_port (int): Port of the script server.
+            fps (float): Frame rate of the stream.
+            frame_size (int): Size (bytes) of each synthetic JPEG.
+            telemetry_every (int): Frames between telemetry parts, 0 for none.
+            exec_delay (float): Extra time (s) taken to run each script.
+            max_clients (int): Simultaneous stream clients, the real streamer serves one.
+        """
+        self.name = name
+        self.host = host
+        self.stream_port = stream_port
+        self.exec_port = exec_port
+        self.fps = fps
+        self.frame_size = frame_size
+        self.telemetry_every = telemetry_every
+        self.exec_delay = exec_delay
+        self.max_clients = max_clients
+
+        # A few frames reused in turn, generating one per send would dominate the CPU
+        self.frames = [fake_jpeg(frame_size) for i in range(4)]
+        self.scripts = []
+        self.exec_connections = 0
+        self.clients = 0
+        self.frames_sent = 0
+        self.servers = []
+        self.writers = set()
+
+
+    async def start(self) -> None:
+        self.servers = [await asyncio.start_server(self.serve_stream, self.host, self.stream_port),
+                        await asyncio.start_server(self.serve_exec, self.host, self.exec_port)]
+
+
+    async def stop(self) -> None:
+        """
+        Stop listening and drop the connected clients, as if the board lost power.
+        """
+        for writer in list(self.writers):
+            writer.close()
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = []
+
+
+    async def serve_stream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Send frames at the board frame rate until the client disconnects.
+        """
+        if self.clients >= self.max_clients:
+            writer.close()
+            return
+
+        self.clients += 1
+        self.writers.add(writer)
+        period = 1 / self.fps
+        deadline = time.monotonic()
+        n = 0
+
+        try:
+            writer.write(STREAM_HEADER)
+            while True:
+                frame = self.frames[n % len(self.frames)]
+                data = part(frame[:2] + struct.pack('<Q', time.monotonic_ns()) + frame[10:])
+                if self.telemetry_every and n % self.telemetry_every == 0:
+                    telemetry = {'board': self.name, 'frame': n, 't_ms': int(time.monotonic() * 1000)}
+                    data += part(json.dumps(telemetry).encode(), b'application/json')
+
+                writer.write(data)
+                await writer.drain()
+                n += 1
+                self.frames_sent += 1
+
+                deadline += period
+                await asyncio.sleep(max(deadline - time.monotonic(), 0))
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients -= 1
+            self.writers.discard(writer)
+            writer.close()
+
+
+    async def serve_exec(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Read a script until the sender closes its side, then 'run' it.
+        """
+        self.exec_connections += 1
+        try:
+            script = await reader.read()
+            if script:
+                await asyncio.sleep(self.exec_delay)
+                self.scripts.append(script.decode())
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def start_boards(count: int, base_port: int = 9000, host: str = '127.0.0.1', **kwargs) -> list:
+    """
+    Start a number of fake boards, board i listens on base_port + 2i (stream)
+    and base_port + 2i + 1 (script).
+
+    Args:
+        count (int): Number of boards.
+        base_port (int): First port.
+        host (str): Interface to listen on.
+        kwargs: Extra FakeBoard arguments.
+
+    Returns:
+        list: The started boards.
+    """
+    boards = []
+    for i in range(count):
+        board = FakeBoard('board%d' % i, host, base_port + 2 * i, base_port + 2 * i + 1, **kwargs)
+        await board.start()
+        boards.append(board)
+
+    return boards
+
+
+async def main(args) -> None:
+    boards = await start_boards(args.count, args.base_port, args.host, fps=args.fps,
+                                frame_size=args.frame_size, max_clients=args.max_clients)
+    for board in boards:
+        print(board.name, args.host, board.stream_port, board.exec_port)
+
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run fake OpenMV streaming boards')
+    parser.add_argument('--count', type=int, default=1, help='Number of boards')
+    parser.add_argument('--base-port', type=int, default=9000, help='First port')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--fps', type=float, default=20, help='Frame rate of each board')
+    parser.add_argument('--frame-size', type=int, default=12000, help='JPEG size (bytes)')
+    parser.add_argument('--max-clients', type=int, default=1, help='Stream clients per board')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,405 @@
+"""
+Host side manager for a fleet of boards running MV_image_streamer.py.
+
+One asyncio process keeps a persistent stream connection to every board,
+reconnecting with backoff when a board drops, tracks per-board health, FPS,
+RTT and the latest frame/telemetry, and pushes scripts to all or some boards
+concurrently.
+
+Boards file, one board per line (ports default to 8080 and 8081):
+    # name  host          stream_port  exec_port
+    red     172.20.10.2
+    blue    172.20.10.3   8080         8081
+
+Example:
+python fleet.py boards.txt                                # monitor health
+python fleet.py boards.txt --push blob_track.py           # push to every board
+python fleet.py boards.txt --push blob_track.py --only red blue
+python fake_board.py --count 20 &
+python fleet.py --fake 20                                 # against local fake boards
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+BOUNDARY = b'--openmv'
+
+
+class Board(object):
+    """
+    Connection settings and health of a single board.
+    """
+
+    def __init__(self, name: str, host: str, stream_port: int = 8080, exec_port: int = 8081):
+        """
+        Args:
+            name (str): Board name.
+            host (str): IP address or host name.
+            stream_port (int): Port of the video stream.
+            exec_port (int): Port of the script server.
+        """
+        self.name = name
+        self.host = host
+        self.stream_port = stream_port
+        self.exec_port = exec_port
+
+        self.connected = False
+        self.connects = 0
+        self.errors = 0
+        self.last_error = None
+        self.frames = 0
+        self.bytes = 0
+        self.fps = 0.0
+        self.rtt_ms = None
+        self.t_frame = None
+        self.frame = None
+        self.telemetry = None
+        self.pushes = 0
+        self.push_errors = 0
+
+
+    def on_frame(self, jpeg: bytes, t: float, smoothing: float = 0.1) -> None:
+        """
+        Account for a received frame, keeping only the latest one.
+
+        Args:
+            jpeg (bytes): JPEG frame.
+            t (float): Receive time (s, time.monotonic()).
+            smoothing (float): Weight of the new FPS measurement (0 to 1).
+        """
+        if self.t_frame is not None and t > self.t_frame:
+            fps = 1 / (t - self.t_frame)
+            self.fps = fps if self.fps == 0 else self.fps + smoothing * (fps - self.fps)
+
+        self.t_frame = t
+        self.frame = jpeg
+        self.frames += 1
+        self.bytes += len(jpeg)
+
+
+    def on_rtt(self, rtt_ms: float, smoothing: float = 0.2) -> None:
+        self.rtt_ms = rtt_ms if self.rtt_ms is None else self.rtt_ms + smoothing * (rtt_ms - self.rtt_ms)
+
+
+    def health(self, stale_s: float = 2.0) -> dict:
+        """
+        Args:
+            stale_s (float): Time (s) without a frame after which a board is stale.
+
+        Returns:
+            dict: Health summary of the board.
+        """
+        age = time.monotonic() - self.t_frame if self.t_frame is not None else None
+        if not self.connected:
+            state = 'down'
+        elif age is None or age > stale_s:
+            state = 'stale'
+        else:
+            state = 'ok'
+
+        return {'state': state,
+                'fps': round(self.fps, 1),
+                'rtt_ms': round(self.rtt_ms, 1) if self.rtt_ms is not None else None,
+                'frame_age_s': round(age, 2) if age is not None else None,
+                'frames': self.frames,
+                'kbytes': self.bytes // 1024,
+                'connects': self.connects,
+                'errors': self.errors,
+                'last_error': self.last_error,
+                'pushes': self.pushes,
+                'push_errors': self.push_errors,
+                'telemetry': self.telemetry}
+
+
+class Fleet(object):
+    """
+    Keeps every board connected and exposes their health, from a single event loop.
+    """
+
+    def __init__(self, stale_s: float = 2.0, rtt_every_s: float = 5.0, max_backoff_s: float = 10.0,
+                 push_concurrency: int = 16, timeout_s: float = 5.0):
+        """
+        Args:
+            stale_s (float): Time (s) without data after which a stream is reconnected.
+            rtt_every_s (float): Interval (s) between RTT probes, 0 to disable.
+            max_backoff_s (float): Longest wait (s) between reconnection attempts.
+            push_concurrency (int): Largest number of scripts being pushed at once.
+            timeout_s (float): Connection and push timeout (s).
+        """
+        self.stale_s = stale_s
+        self.rtt_every_s = rtt_every_s
+        self.max_backoff_s = max_backoff_s
+        self.push_concurrency = push_concurrency
+        self.timeout_s = timeout_s
+
+        self.boards = {}
+        self.tasks = []
+
+
+    def add(self, name: str, host: str, stream_port: int = 8080, exec_port: int = 8081) -> Board:
+        """
+        Add a board, call before start().
+
+        Returns:
+            Board: The added board.
+        """
+        board = Board(name, host, stream_port, exec_port)
+        self.boards[name] = board
+
+        return board
+
+
+    def load(self, path: str) -> None:
+        """
+        Add the boards listed in a boards file, see the module docstring.
+
+        Args:
+            path (str): Path of the boards file.
+        """
+        with open(path) as file:
+            for line in file:
+                fields = line.split('#')[0].split()
+                if not fields:
+                    continue
+                ports = [int(p) for p in fields[2:4]]
+                self.add(fields[0], fields[1], *ports)
+
+
+    def start(self) -> None:
+        """
+        Start the stream and RTT tasks of every board, must be called from a running loop.
+        """
+        for board in self.boards.values():
+            self.tasks.append(asyncio.ensure_future(self._stream(board)))
+            if self.rtt_every_s:
+                self.tasks.append(asyncio.ensure_future(self._probe(board)))
+
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+
+    def select(self, names: list = None) -> list:
+        """
+        Args:
+            names (list): Board names, None for every board.
+
+        Returns:
+            list: The selected boards.
+        """
+        if names is None:
+            return list(self.boards.values())
+
+        return [self.boards[name] for name in names]
+
+
+    async def push(self, script: str, names: list = None) -> dict:
+        """
+        Send a script to the selected boards concurrently.
+
+        Args:
+            script (str): Python source to execute on the boards.
+            names (list): Board names, None for every board.
+
+        Returns:
+            dict: Board name to None on success or the error message.
+        """
+        data = script.encode()
+        limit = asyncio.Semaphore(self.push_concurrency)
+
+        async def push_one(board):
+            async with limit:
+                try:
+                    await asyncio.wait_for(self._send(board, data), self.timeout_s)
+                    board.pushes += 1
+                    return None
+                except (OSError, asyncio.TimeoutError) as e:
+                    board.push_errors += 1
+                    return repr(e)
+
+        boards = self.select(names)
+        results = await asyncio.gather(*[push_one(board) for board in boards])
+
+        return {board.name: result for board, result in zip(boards, results)}
+
+
+    def health(self) -> dict:
+        """
+        Returns:
+            dict: Board name to health summary.
+        """
+        return {name: board.health(self.stale_s) for name, board in self.boards.items()}
+
+
+    def report(self) -> None:
+        """
+        Print a health table of the fleet.
+        """
+        print('%-12s %-6s %6s %8s %8s %8s %6s' % ('board', 'state', 'fps', 'rtt_ms', 'frames',
+                                                   'connects', 'errors'))
+        for name, h in self.health().items():
+            print('%-12s %-6s %6.1f %8s %8d %8d %6d' % (name, h['state'], h['fps'],
+                                                         h['rtt_ms'], h['frames'],
+                                                         h['connects'], h['errors']))
+
+
+    async def _send(self, board: Board, data: bytes) -> None:
+        """
+        Send a script, closing the write side so the board knows it is complete.
+        """
+        t_start = time.monotonic()
+        reader, writer = await asyncio.open_connection(board.host, board.exec_port)
+        board.on_rtt((time.monotonic() - t_start) * 1000)
+
+        try:
+            writer.write(data)
+            await writer.drain()
+            writer.write_eof()
+        finally:
+            writer.close()
+
+
+    async def _probe(self, board: Board) -> None:
+        """
+        Measure RTT as the TCP connect time of the stream port. The connection
+        is closed straight away, so the board at most starts a stream header or
+        refuses it as over its viewer limit. The script port is not used, older
+        streamers run even an empty connection as a script.
+        """
+        while True:
+            try:
+                t_start = time.monotonic()
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(board.host, board.stream_port), self.timeout_s)
+                board.on_rtt((time.monotonic() - t_start) * 1000)
+                writer.close()
+            except (OSError, asyncio.TimeoutError):
+                pass
+
+            await asyncio.sleep(self.rtt_every_s)
+
+
+    async def _stream(self, board: Board) -> None:
+        """
+        Keep the stream of a board connected, reconnecting with exponential backoff.
+        """
+        backoff = 0.5
+
+        while True:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(board.host, board.stream_port), self.timeout_s)
+            except (OSError, asyncio.TimeoutError) as e:
+                board.errors += 1
+                board.last_error = repr(e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff_s)
+                continue
+
+            board.connected = True
+            board.connects += 1
+            frames = board.frames
+
+            try:
+                writer.write(b"GET / HTTP/1.1\r\nHost: " + board.host.encode() + b"\r\n\r\n")
+                await self._read_stream(board, reader)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                board.errors += 1
+                board.last_error = repr(e)
+            finally:
+                board.connected = False
+                writer.close()
+
+            # Back off from scratch if the stream delivered frames before dropping
+            if board.frames > frames:
+                backoff = 0.5
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff_s)
+
+
+    async def _read_stream(self, board: Board, reader: asyncio.StreamReader) -> None:
+        """
+        Parse the multipart stream, JPEG parts are frames and JSON parts telemetry.
+        """
+        async def readline():
+            return await asyncio.wait_for(reader.readline(), self.stale_s)
+
+        # HTTP response headers
+        while (await readline()).strip():
+            pass
+
+        while True:
+            line = await readline()
+            if not line:
+                raise ConnectionError('Stream closed')
+            if line.strip() != BOUNDARY:
+                continue
+
+            content_type = b''
+            length = None
+            while True:
+                line = (await readline()).strip()
+                if not line:
+                    break
+                key, _, value = line.partition(b':')
+                key = key.strip().lower()
+                if key == b'content-length':
+                    length = int(value)
+                elif key == b'content-type':
+                    content_type = value.strip()
+
+            if length is None:
+                raise ValueError('Part without Content-Length')
+
+            data = await asyncio.wait_for(reader.readexactly(length), self.stale_s)
+
+            if content_type == b'application/json':
+                board.telemetry = json.loads(data)
+            else:
+                board.on_frame(data, time.monotonic())
+
+
+async def main(args) -> None:
+    fleet = Fleet(stale_s=args.stale, rtt_every_s=args.rtt_every)
+    if args.boards:
+        fleet.load(args.boards)
+    for i in range(args.fake):
+        fleet.add('board%d' % i, '127.0.0.1', args.base_port + 2 * i, args.base_port + 2 * i + 1)
+
+    fleet.start()
+
+    if args.push:
+        with open(args.push) as file:
+            script = file.read()
+        for name, error in (await fleet.push(script, args.only)).items():
+            print(name, 'ok' if error is None else error)
+
+    try:
+        while True:
+            await asyncio.sleep(args.every)
+            fleet.report()
+    finally:
+        await fleet.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Manage a fleet of OpenMV streaming boards')
+    parser.add_argument('boards', nargs='?', help='Boards file')
+    parser.add_argument('--push', help='Script to push to the boards')
+    parser.add_argument('--only', nargs='+', help='Names of the boards to push to')
+    parser.add_argument('--fake', type=int, default=0, help='Add N local fake boards (fake_board.py)')
+    parser.add_argument('--base-port', type=int, default=9000, help='First port of the fake boards')
+    parser.add_argument('--every', type=float, default=2.0, help='Seconds between health reports')
+    parser.add_argument('--stale', type=float, default=2.0, help='Seconds without data before reconnecting')
+    parser.add_argument('--rtt-every', type=float, default=5.0, help='Seconds between RTT probes, 0 to disable')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,379 @@
+"""
+Load generator for the board stream and script protocols.
+
+Viewer side: N clients read the multipart/x-mixed-replace;boundary=openmv
+stream, each optionally throttled to a read rate to emulate slow links, and
+M script pushes of a given size are sent to the script port. Board side:
+the real MV_image_streamer.StreamServer poll loop run in a thread on CPython
+sockets (--board streamer), or an asyncio fake board (fake_board.py), both
+serving synthetic frames on the stream and script ports.
+
+Reports throughput, frame latency (local boards only, frames carry their send
+time) and inter-arrival percentiles, stalls and script push times, plus the
+streamer's own busy/idle and skip counters, so changes to the streamer loop
+can be compared run to run.
+
+Example:
+python load_test.py board --port 8080 --max-clients 8          # board side only
+python load_test.py self --board streamer --viewers 2 --rate 100  # the real poll loop
+python load_test.py view --host 172.20.10.2 --viewers 4 --rate 200   # viewers of a real board
+python load_test.py self --viewers 8 --rate 500 --scripts 20 --script-size 20000
+"""
+
+import argparse
+import asyncio
+import struct
+import threading
+import time
+
+import fake_board
+import MV_image_streamer
+
+BOUNDARY = b'--openmv'
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    Args:
+        values (list): Samples, sorted.
+        q (float): Percentile (0 to 100).
+
+    Returns:
+        float: Nearest rank percentile, 0 if there are no samples.
+    """
+    if not values:
+        return 0.0
+
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+
+class Viewer(object):
+    """
+    A single stream client, reading at most rate kB/s.
+    """
+
+    def __init__(self, host: str, port: int, rate_kbs: float = 0, chunk: int = 4096,
+                 stall_ms: float = 500, stamped: bool = False):
+        """
+        Args:
+            host (str): Board address.
+            port (int): Stream port.
+            rate_kbs (float): Read rate limit (kB/s), 0 for unlimited.
+            chunk (int): Read size (bytes) while throttled.
+            stall_ms (float): Gap (ms) between frames counted as a stall.
+            stamped (bool): Frames carry their send time (fake boards), measure latency.
+        """
+        self.host = host
+        self.port = port
+        self.rate_kbs = rate_kbs
+        self.chunk = chunk
+        self.stall_ms = stall_ms
+        self.stamped = stamped
+
+        self.frames = 0
+        self.bytes = 0
+        self.stalls = 0
+        self.errors = []
+        self.latency_ms = []
+        self.gap_ms = []
+        self.t_connect_ms = None
+
+
+    async def run(self, duration_s: float) -> None:
+        """
+        Read the stream for a time, any error ends the run and is recorded.
+        """
+        try:
+            await asyncio.wait_for(self._read(), duration_s)
+        except asyncio.TimeoutError:
+            pass
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            self.errors.append(repr(e))
+
+
+    async def _read(self) -> None:
+        t_start = time.monotonic()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.t_connect_ms = (time.monotonic() - t_start) * 1000
+
+        try:
+            writer.write(b"GET / HTTP/1.1\r\n\r\n")
+
+            while (await reader.readline()).strip():
+                pass
+
+            t_last = None
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError('Stream closed')
+                if line.strip() != BOUNDARY:
+                    continue
+
+                length = None
+                content_type = b''
+                while True:
+                    line = (await reader.readline()).strip()
+                    if not line:
+                        break
+                    key, _, value = line.partition(b':')
+                    if key.strip().lower() == b'content-length':
+                        length = int(value)
+                    elif key.strip().lower() == b'content-type':
+                        content_type = value.strip()
+
+                if length is None:
+                    raise ValueError('Part without Content-Length')
+
+                data = await self._read_payload(reader, length)
+                if content_type != b'image/jpeg':
+                    continue
+
+                t_now = time.monotonic()
+                if self.stamped:
+                    self.latency_ms.append((time.monotonic_ns() - fake_board.frame_time_ns(data)) / 1e6)
+                if t_last is not None:
+                    gap = (t_now - t_last) * 1000
+                    self.gap_ms.append(gap)
+                    if gap > self.stall_ms:
+                        self.stalls += 1
+                t_last = t_now
+
+                self.frames += 1
+                self.bytes += length
+        finally:
+            writer.close()
+
+
+    async def _read_payload(self, reader: asyncio.StreamReader, length: int) -> bytes:
+        """
+        Read a part payload, in chunks paced to the rate limit when throttled.
+        """
+        if not self.rate_kbs:
+            return await reader.readexactly(length)
+
+        parts = []
+        remaining = length
+        while remaining:
+            n = min(self.chunk, remaining)
+            parts.append(await reader.readexactly(n))
+            remaining -= n
+            await asyncio.sleep(n / (self.rate_kbs * 1024))
+
+        return b''.join(parts)
+
+
+class StreamerBoard(object):
+    """
+    MV_image_streamer.StreamServer run in a thread, serving stamped synthetic frames.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', stream_port: int = 8080, exec_port: int = 8081,
+                 fps: float = 20, frame_size: int = 12000, max_clients: int = 1, sndbuf: int = 8192):
+        """
+        Args:
+            host (str): Address to listen on.
+            stream_port (int): Port of the video stream.
+            exec_port (int): Port of the script server.
+            fps (float): Frame rate.
+            frame_size (int): Size (bytes) of each frame.
+            max_clients (int): Simultaneous stream clients, others are refused.
+            sndbuf (int): Send buffer (bytes) of stream sockets, about the board's, 0 for the host default.
+        """
+        frame = bytearray(fake_board.fake_jpeg(frame_size))
+
+        def grab():
+            # Send time at the same place as fake board frames, see fake_board.frame_time_ns()
+            struct.pack_into('<Q', frame, 2, time.monotonic_ns())
+            return frame
+
+        self.server = MV_image_streamer.StreamServer(grab, (host, stream_port), (host, exec_port), fps=fps,
+                                                     max_viewers=max_clients, scope={}, sndbuf=sndbuf)
+        self.running = False
+        self.thread = None
+
+
+    def start(self) -> None:
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+
+    def _run(self) -> None:
+        # Short runs so stop() is noticed, the loop itself is unchanged
+        while self.running:
+            self.server.run(100)
+
+
+    def stop(self) -> None:
+        """
+        Stop the loop and close every socket.
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        for sock in list(self.server.roles):
+            self.server.close(sock)
+
+
+async def push_script(host: str, port: int, size: int) -> float:
+    """
+    Send a script of a given size and wait for the board to close the connection.
+
+    Returns:
+        float: Time (ms) from connecting to the board closing the connection.
+    """
+    # A valid script, a comment padded to size so large scripts are harmless to run
+    script = b"#" + b"x" * max(size - 2, 0) + b"\n"
+
+    t_start = time.monotonic()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(script)
+        await writer.drain()
+        writer.write_eof()
+        await reader.read()
+    finally:
+        writer.close()
+
+    return (time.monotonic() - t_start) * 1000
+
+
+async def run_viewers(host: str, port: int, exec_port: int, viewers: int, rate_kbs: float,
+                      duration_s: float, scripts: int = 0, script_size: int = 2048,
+                      stall_ms: float = 500, stamped: bool = False) -> dict:
+    """
+    Run the viewers and script pushes concurrently.
+
+    Args:
+        host (str): Board address.
+        port (int): Stream port.
+        exec_port (int): Script port.
+        viewers (int): Number of stream clients.
+        rate_kbs (float): Read rate limit of each viewer (kB/s), 0 for unlimited.
+        duration_s (float): Length of the test (s).
+        scripts (int): Number of scripts pushed, spread over the test.
+        script_size (int): Size (bytes) of each script.
+        stall_ms (float): Gap (ms) between frames counted as a stall.
+        stamped (bool): Frames carry their send time, measure latency.
+
+    Returns:
+        dict: Results, see report().
+    """
+    clients = [Viewer(host, port, rate_kbs, stall_ms=stall_ms, stamped=stamped) for i in range(viewers)]
+    push_ms = []
+    push_errors = []
+
+    async def pushes():
+        for i in range(scripts):
+            await asyncio.sleep(duration_s / (scripts + 1))
+            try:
+                push_ms.append(await asyncio.wait_for(push_script(host, exec_port, script_size), duration_s))
+            except (OSError, asyncio.TimeoutError) as e:
+                push_errors.append(repr(e))
+
+    t_start = time.monotonic()
+    await asyncio.gather(pushes(), *[client.run(duration_s) for client in clients])
+    elapsed = time.monotonic() - t_start
+
+    latency = sorted(v for client in clients for v in client.latency_ms)
+    gaps = sorted(v for client in clients for v in client.gap_ms)
+    push_ms.sort()
+
+    return {'elapsed_s': elapsed,
+            'viewers': viewers,
+            'connected': sum(1 for client in clients if client.frames),
+            'frames': sum(client.frames for client in clients),
+            'fps_per_viewer': [round(client.frames / elapsed, 1) for client in clients],
+            'mbytes_s': sum(client.bytes for client in clients) / elapsed / 1e6,
+            'latency_ms': {q: percentile(latency, q) for q in (50, 95, 99, 100)},
+            'gap_ms': {q: percentile(gaps, q) for q in (50, 95, 99, 100)},
+            'stalls': sum(client.stalls for client in clients),
+            'errors': [e for client in clients for e in client.errors],
+            'pushes': len(push_ms),
+            'push_ms': {q: percentile(push_ms, q) for q in (50, 95, 100)},
+            'push_errors': push_errors}
+
+
+def report(results: dict) -> None:
+    """
+    Print the results of run_viewers().
+    """
+    print('Viewers: %d (%d received frames) over %.1fs' % (results['viewers'], results['connected'],
+                                                           results['elapsed_s']))
+    print('Throughput: %d frames, %.2f MB/s, fps per viewer %s' % (results['frames'], results['mbytes_s'],
+                                                                   results['fps_per_viewer']))
+    if results['latency_ms'][100]:
+        print('Latency (ms): p50 %.1f  p95 %.1f  p99 %.1f  max %.1f' % tuple(results['latency_ms'].values()))
+    print('Frame gap (ms): p50 %.1f  p95 %.1f  p99 %.1f  max %.1f' % tuple(results['gap_ms'].values()))
+    print('Stalls:', results['stalls'])
+    if results['pushes'] or results['push_errors']:
+        print('Scripts: %d pushed, p50 %.1f  p95 %.1f  max %.1f ms' % ((results['pushes'],) +
+                                                                      tuple(results['push_ms'].values())))
+    for error in results['errors'] + results['push_errors']:
+        print('Error:', error)
+
+
+async def main(args) -> None:
+    streamer = None
+    boards = []
+    if args.mode in ('board', 'self'):
+        max_clients = args.max_clients or args.viewers
+        if args.board == 'streamer':
+            streamer = StreamerBoard(args.host, args.port, args.port + 1, args.fps, args.frame_size, max_clients,
+                                     args.sndbuf)
+            streamer.start()
+        else:
+            boards = await fake_board.start_boards(1, args.port, args.host, fps=args.fps,
+                                                   frame_size=args.frame_size, max_clients=max_clients)
+        if args.mode == 'board':
+            print('%s board streaming on %s:%d, scripts on %d' % (args.board.capitalize(), args.host, args.port,
+                                                                  args.port + 1))
+            try:
+                await asyncio.Event().wait()
+            finally:
+                if streamer is not None:
+                    streamer.stop()
+
+    if streamer is not None:
+        streamer.server.reset_stats()
+
+    results = await run_viewers(args.host, args.port, args.port + 1 if args.mode == 'self' else args.exec_port,
+                                args.viewers, args.rate, args.duration, args.scripts, args.script_size,
+                                args.stall_ms, stamped=args.mode == 'self')
+    report(results)
+
+    if streamer is not None:
+        print('Streamer:', streamer.server.stats())
+        streamer.stop()
+    for board in boards:
+        await board.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test the board stream and script protocols')
+    parser.add_argument('mode', choices=['view', 'board', 'self'],
+                        help='view: viewers of a board, board: fake board only, self: both in one process')
+    parser.add_argument('--board', choices=['streamer', 'fake'], default='streamer',
+                        help='Local board: streamer runs the MV_image_streamer poll loop, fake an asyncio board')
+    parser.add_argument('--host', default='127.0.0.1', help='Board address')
+    parser.add_argument('--port', type=int, default=8080, help='Stream port (fake board scripts on port+1)')
+    parser.add_argument('--exec-port', type=int, default=8081, help='Script port of the board (view mode)')
+    parser.add_argument('--viewers', type=int, default=4, help='Number of stream viewers')
+    parser.add_argument('--rate', type=float, default=0, help='Read rate limit per viewer (kB/s), 0 for none')
+    parser.add_argument('--duration', type=float, default=10, help='Test length (s)')
+    parser.add_argument('--scripts', type=int, default=0, help='Scripts pushed during the test')
+    parser.add_argument('--script-size', type=int, default=2048, help='Script size (bytes)')
+    parser.add_argument('--stall-ms', type=float, default=500, help='Frame gap (ms) counted as a stall')
+    parser.add_argument('--fps', type=float, default=20, help='Local board frame rate')
+    parser.add_argument('--frame-size', type=int, default=12000, help='Local board JPEG size (bytes)')
+    parser.add_argument('--sndbuf', type=int, default=8192,
+                        help='Streamer board send buffer (bytes), 0 for the host default')
+    parser.add_argument('--max-clients', type=int, default=0,
+                        help='Local board stream clients, defaults to the number of viewers')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
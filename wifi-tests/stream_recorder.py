@@ -0,0 +1,567 @@
+"""
+Host side recorder for the MV_image_streamer.py MJPEG stream.
+
+JPEG parts are appended to frames.mjpeg exactly as received, and a fixed
+size record (byte offset, length, receive time) per frame is appended to
+index.bin, so memory use stays at one frame however long the session runs.
+Receive times are on a monotonic recording clock, which continues from the
+last frame when a recording is reopened, so the index stays sorted whatever
+the wall clock does. segments.jsonl maps the recording clock to wall time.
+Recordings are read back with memory maps: any frame in O(1), time ranges
+by binary search over the index, and a range can be exported to a replay
+session directory (replay.session format) or to a video with ffmpeg.
+
+Example:
+python stream_recorder.py record 172.20.10.2 rec0             # Ctrl+C to stop
+python stream_recorder.py info rec0
+python stream_recorder.py export rec0 --start 10 --end 25 --session rec0_replay
+python stream_recorder.py export rec0 --start 10 --end 25 --video clip.mkv
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import mmap
+import os
+import struct
+import subprocess
+import time
+
+BOUNDARY = b'--openmv'
+
+# Byte offset in frames.mjpeg, length, receive time (ns on the recording clock)
+INDEX_FORMAT = '<QIQ'
+INDEX_SIZE = struct.calcsize(INDEX_FORMAT)
+
+# replay.session index record and version, see recorder.INDEX_FORMAT
+SESSION_INDEX_FORMAT = '<IQIIfff'
+SESSION_VERSION = 2
+
+
+class StreamRecorder(object):
+    """
+    Writes a stream to a recording directory as it arrives.
+    """
+
+    def __init__(self, path: str, flush_every: int = 30):
+        """
+        Args:
+            path (str): Recording directory, created if missing. An existing recording is
+                appended to, after dropping a partly written last frame, see recover().
+            flush_every (int): Frames between file flushes, bounds what is lost on a crash.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+
+        n, self.offset, t_last = self.recover()
+        self.frames_file = open(os.path.join(path, 'frames.mjpeg'), 'ab')
+        self.index_file = open(os.path.join(path, 'index.bin'), 'ab')
+        self.telemetry_file = None
+
+        # The recording clock carries on after the last frame of an existing recording
+        self.t_base = t_last + 1 if n else 0
+        self.t_mono = time.monotonic_ns()
+        with open(os.path.join(path, 'segments.jsonl'), 'a') as file:
+            file.write(json.dumps({'frame': n, 't_ns': self.t_base, 'wall_ns': time.time_ns()}) + '\n')
+
+        self.frames = 0
+        self.bytes = 0
+        self.t_start = time.monotonic()
+
+
+    def recover(self) -> tuple:
+        """
+        Make an existing recording safe to append to after a crash: cut index.bin
+        to whole records whose frames were written completely, and frames.mjpeg
+        to the end of the last of them, so new records line up with their data.
+
+        Returns:
+            n (int), offset (int), t_ns (int): Frames kept, size of frames.mjpeg and
+                receive time of the last frame (0 if none).
+        """
+        frames_path = os.path.join(self.path, 'frames.mjpeg')
+        index_path = os.path.join(self.path, 'index.bin')
+        size = os.path.getsize(frames_path) if os.path.exists(frames_path) else 0
+        if not os.path.exists(index_path):
+            if size:
+                os.truncate(frames_path, 0)
+            return 0, 0, 0
+
+        n = os.path.getsize(index_path) // INDEX_SIZE
+        offset = 0
+        t_ns = 0
+        with open(index_path, 'rb') as file:
+            # Only the last records can point past the written data, step back from the end
+            while n:
+                file.seek((n - 1) * INDEX_SIZE)
+                offset, length, t_ns = struct.unpack(INDEX_FORMAT, file.read(INDEX_SIZE))
+                offset += length
+                if offset <= size:
+                    break
+                n -= 1
+        if not n:
+            offset = 0
+            t_ns = 0
+
+        if os.path.getsize(index_path) != n * INDEX_SIZE:
+            os.truncate(index_path, n * INDEX_SIZE)
+        if size != offset:
+            os.truncate(frames_path, offset)
+
+        return n, offset, t_ns
+
+
+    def now_ns(self) -> int:
+        """
+        Returns:
+            int: Time (ns) on the recording clock.
+        """
+        return self.t_base + time.monotonic_ns() - self.t_mono
+
+
+    def add(self, jpeg: bytes, t_ns: int = None) -> None:
+        """
+        Append a frame as is and its index record.
+
+        Args:
+            jpeg (bytes): JPEG part payload.
+            t_ns (int): Receive time (ns) on the recording clock, see now_ns(), now if None.
+        """
+        if t_ns is None:
+            t_ns = self.now_ns()
+
+        self.frames_file.write(jpeg)
+        self.index_file.write(struct.pack(INDEX_FORMAT, self.offset, len(jpeg), t_ns))
+        self.offset += len(jpeg)
+        self.frames += 1
+        self.bytes += len(jpeg)
+
+        if self.frames % self.flush_every == 0:
+            self.flush()
+
+
+    def add_telemetry(self, data: bytes, t_ns: int = None) -> None:
+        """
+        Append a JSON telemetry part to telemetry.jsonl with its receive time on the recording clock.
+        """
+        if self.telemetry_file is None:
+            self.telemetry_file = open(os.path.join(self.path, 'telemetry.jsonl'), 'a')
+
+        record = {'t_ns': t_ns if t_ns is not None else self.now_ns(), 'data': json.loads(data)}
+        self.telemetry_file.write(json.dumps(record) + '\n')
+
+
+    def flush(self) -> None:
+        # Frames before index records, so an index record never points past the data
+        self.frames_file.flush()
+        self.index_file.flush()
+        if self.telemetry_file is not None:
+            self.telemetry_file.flush()
+
+
+    def close(self) -> None:
+        self.flush()
+        self.frames_file.close()
+        self.index_file.close()
+        if self.telemetry_file is not None:
+            self.telemetry_file.close()
+
+
+    async def record(self, host: str, port: int = 8080, duration_s: float = None,
+                     reconnect_s: float = 1.0, report_s: float = 5.0) -> None:
+        """
+        Record a board's stream, reconnecting if it drops, until cancelled or for a time.
+
+        Args:
+            host (str): Board address.
+            port (int): Stream port.
+            duration_s (float): Time to record for (s), None until cancelled.
+            reconnect_s (float): Wait (s) before reconnecting after the stream drops.
+            report_s (float): Interval (s) between progress reports, 0 for none.
+        """
+        t_end = time.monotonic() + duration_s if duration_s is not None else None
+
+        async def session():
+            while True:
+                try:
+                    await self._read(host, port, report_s)
+                except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                    print('Stream dropped:', repr(e))
+                await asyncio.sleep(reconnect_s)
+
+        try:
+            if t_end is None:
+                await session()
+            else:
+                await asyncio.wait_for(session(), t_end - time.monotonic())
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.flush()
+
+
+    async def _read(self, host: str, port: int, report_s: float) -> None:
+        reader, writer = await asyncio.open_connection(host, port)
+        t_report = time.monotonic()
+        frames = self.frames
+
+        try:
+            writer.write(b"GET / HTTP/1.1\r\nHost: " + host.encode() + b"\r\n\r\n")
+
+            while (await reader.readline()).strip():
+                pass
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError('Stream closed')
+                if line.strip() != BOUNDARY:
+                    continue
+
+                length = None
+                content_type = b''
+                while True:
+                    line = (await reader.readline()).strip()
+                    if not line:
+                        break
+                    key, _, value = line.partition(b':')
+                    key = key.strip().lower()
+                    if key == b'content-length':
+                        length = int(value)
+                    elif key == b'content-type':
+                        content_type = value.strip()
+
+                if length is None:
+                    raise ValueError('Part without Content-Length')
+
+                data = await reader.readexactly(length)
+                t_ns = self.now_ns()
+
+                if content_type == b'application/json':
+                    self.add_telemetry(data, t_ns)
+                else:
+                    self.add(data, t_ns)
+
+                if report_s and time.monotonic() - t_report >= report_s:
+                    elapsed = time.monotonic() - t_report
+                    print('%d frames, %.1f fps, %.1f MB' % (self.frames, (self.frames - frames) / elapsed,
+                                                             self.bytes / 1e6))
+                    t_report = time.monotonic()
+                    frames = self.frames
+        finally:
+            writer.close()
+
+
+class _Times(object):
+    """
+    Read-only sequence of the receive times in an index, for bisect.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self) -> int:
+        return len(self.index) // INDEX_SIZE
+
+    def __getitem__(self, i: int) -> int:
+        return struct.unpack_from('<Q', self.index, i * INDEX_SIZE + 12)[0]
+
+
+class StreamRecording(object):
+    """
+    Memory mapped access to a recording directory.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Recording directory.
+        """
+        self.path = path
+        self._frames_file = open(os.path.join(path, 'frames.mjpeg'), 'rb')
+        self._index_file = open(os.path.join(path, 'index.bin'), 'rb')
+        self._frames = _map(self._frames_file)
+        self._index = _map(self._index_file) or b''
+
+        # Ignore a partly written last record, or records past the flushed data
+        n = len(self._index) // INDEX_SIZE
+        size = len(self._frames) if self._frames is not None else 0
+        while n and sum(struct.unpack_from('<QI', self._index, (n - 1) * INDEX_SIZE)) > size:
+            n -= 1
+        self.n = n
+        self.times = _Times(memoryview(self._index)[:n * INDEX_SIZE])
+
+        # Wall time at the start of each recording run, see StreamRecorder
+        self.segments = []
+        segments_path = os.path.join(path, 'segments.jsonl')
+        if os.path.exists(segments_path):
+            with open(segments_path) as file:
+                self.segments = [json.loads(line) for line in file if line.strip()]
+
+
+    def __len__(self) -> int:
+        return self.n
+
+
+    def record(self, i: int) -> tuple:
+        """
+        Args:
+            i (int): Frame number.
+
+        Returns:
+            offset (int), length (int), t_ns (int): Index record of the frame.
+        """
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+
+        return struct.unpack_from(INDEX_FORMAT, self._index, i * INDEX_SIZE)
+
+
+    def __getitem__(self, i: int) -> memoryview:
+        """
+        Args:
+            i (int): Frame number.
+
+        Returns:
+            memoryview: The JPEG bytes, a view into the memory map.
+        """
+        offset, length, t_ns = self.record(i)
+
+        return memoryview(self._frames)[offset:offset + length]
+
+
+    def wall_time_ns(self, i: int) -> int:
+        """
+        Args:
+            i (int): Frame number.
+
+        Returns:
+            int: Wall clock receive time (ns since the epoch) of the frame, as set at the
+                start of its recording run, None for recordings without segments.
+        """
+        t_ns = self.record(i)[2]
+        segment = None
+        for s in self.segments:
+            if s['frame'] > i:
+                break
+            segment = s
+
+        if segment is None:
+            return None
+
+        return segment['wall_ns'] + t_ns - segment['t_ns']
+
+
+    def index_at(self, t_ns: int) -> int:
+        """
+        Returns:
+            int: First frame received at or after t_ns, len(self) if none.
+        """
+        return bisect.bisect_left(self.times, t_ns)
+
+
+    def time_range(self, start_s: float = None, end_s: float = None) -> range:
+        """
+        Frames in a time range relative to the first frame.
+
+        Args:
+            start_s (float): Start (s), the first frame if None.
+            end_s (float): End (s, exclusive), the last frame if None.
+
+        Returns:
+            range: Frame numbers in the range.
+        """
+        if not self.n:
+            return range(0)
+
+        t0 = self.times[0]
+        lo = self.index_at(t0 + int(start_s * 1e9)) if start_s is not None else 0
+        hi = self.index_at(t0 + int(end_s * 1e9)) if end_s is not None else self.n
+
+        return range(lo, hi)
+
+
+    def duration_s(self) -> float:
+        return (self.times[self.n - 1] - self.times[0]) / 1e9 if self.n > 1 else 0.0
+
+
+    def export_session(self, out: str, frames: range, meta: dict = None) -> int:
+        """
+        Write a range of frames as a replay session (see replay.session), one frame at a time.
+
+        Args:
+            out (str): Session directory to create.
+            frames (range): Frame numbers to export.
+            meta (dict): Extra items for meta.json, e.g. the thresholds used on the board.
+
+        Returns:
+            int: Number of frames written.
+
+        Raises:
+            ValueError: If the frames add up to 4 GB or more, the limit of the session
+                frame offsets, nothing is written. Export the range in parts.
+        """
+        size = sum(self.record(i)[1] for i in frames)
+        if size > 0xFFFFFFFF:
+            raise ValueError('%d frames of %d bytes are over the 4 GB session limit, '
+                             'export the range in parts' % (len(frames), size))
+
+        os.makedirs(out, exist_ok=True)
+        width = height = 0
+        offset = 0
+        t0 = None
+
+        with open(os.path.join(out, 'frames.bin'), 'wb') as frames_file, \
+                open(os.path.join(out, 'index.bin'), 'wb') as index_file:
+            for seq, i in enumerate(frames):
+                data = self[i]
+                t_ns = self.record(i)[2]
+                t0 = t_ns if t0 is None else t0
+                if not width:
+                    width, height = jpeg_size(data)
+
+                frames_file.write(data)
+                index_file.write(struct.pack(SESSION_INDEX_FORMAT, seq, (t_ns - t0) // 1000,
+                                             offset, len(data), 0, 0, 0))
+                offset += len(data)
+
+        session_meta = {'version': SESSION_VERSION, 'format': 'jpeg', 'pixformat': 'rgb565',
+                        'width': width, 'height': height, 'frames': len(frames), 'captured': len(frames),
+                        'dropped': 0, 'oversize': 0, 'source': os.path.abspath(self.path)}
+        session_meta.update(meta or {})
+
+        with open(os.path.join(out, 'meta.json'), 'w') as file:
+            json.dump(session_meta, file)
+
+        return len(frames)
+
+
+    def export_video(self, out: str, frames: range, ffmpeg: str = 'ffmpeg', codec: str = 'copy') -> None:
+        """
+        Write a range of frames to a video with ffmpeg, piping one frame at a time.
+        The frame rate is the mean rate of the range.
+
+        Args:
+            out (str): Video file, .mkv or .avi to keep the JPEGs as is with codec 'copy'.
+            frames (range): Frame numbers to export.
+            ffmpeg (str): ffmpeg executable.
+            codec (str): Video codec, 'copy' keeps the JPEGs, e.g. 'libx264' re-encodes.
+        """
+        if len(frames) > 1:
+            span = (self.times[frames[-1]] - self.times[frames[0]]) / 1e9
+            fps = (len(frames) - 1) / span if span > 0 else 30
+        else:
+            fps = 30
+
+        process = subprocess.Popen([ffmpeg, '-y', '-loglevel', 'error', '-f', 'mjpeg',
+                                    '-framerate', '%.3f' % fps, '-i', '-', '-c:v', codec, out],
+                                   stdin=subprocess.PIPE)
+        try:
+            for i in frames:
+                process.stdin.write(self[i])
+        finally:
+            process.stdin.close()
+            process.wait()
+
+        if process.returncode:
+            raise RuntimeError('ffmpeg failed with exit code %d' % process.returncode)
+
+
+    def close(self) -> None:
+        self.times = None
+        self._frames = None
+        self._index = None
+        self._frames_file.close()
+        self._index_file.close()
+
+
+def jpeg_size(data) -> tuple:
+    """
+    Read the frame size from the start of frame header of a JPEG.
+
+    Returns:
+        width (int), height (int): Frame size, 0, 0 if there is no start of frame header.
+    """
+    data = bytes(data[:65536])
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            break
+        marker = data[i + 1]
+        length = (data[i + 2] << 8) | data[i + 3]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack_from('>HH', data, i + 5)
+            return width, height
+        i += 2 + length
+
+    return 0, 0
+
+
+def _map(file):
+    """
+    Memory map a file read-only, None if it is empty (mmap cannot map 0 bytes).
+    """
+    if os.fstat(file.fileno()).st_size == 0:
+        return None
+
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def main(args) -> None:
+    if args.command == 'record':
+        recorder = StreamRecorder(args.path)
+        try:
+            asyncio.run(recorder.record(args.host, args.port, args.duration))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            recorder.close()
+            print('Recorded', recorder.frames, 'frames,', recorder.bytes // 1024, 'kB')
+        return
+
+    recording = StreamRecording(args.path)
+
+    if args.command == 'info':
+        print('%d frames over %.1fs' % (len(recording), recording.duration_s()))
+        if len(recording):
+            print('Frame size:', jpeg_size(recording[0]))
+            wall_ns = recording.wall_time_ns(0)
+            if wall_ns is not None:
+                print('Started:', time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wall_ns / 1e9)))
+    elif args.command == 'export':
+        frames = recording.time_range(args.start, args.end)
+        if args.session:
+            meta = {'thresholds': json.loads(args.thresholds)} if args.thresholds else None
+            print('Exported', recording.export_session(args.session, frames, meta), 'frames')
+        if args.video:
+            recording.export_video(args.video, frames, codec=args.codec)
+            print('Exported', len(frames), 'frames to', args.video)
+
+    recording.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Record and export the OpenMV MJPEG stream')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help='Record a stream')
+    record.add_argument('host', help='Board address')
+    record.add_argument('path', help='Recording directory')
+    record.add_argument('--port', type=int, default=8080, help='Stream port')
+    record.add_argument('--duration', type=float, help='Seconds to record, until Ctrl+C if not given')
+
+    info = commands.add_parser('info', help='Describe a recording')
+    info.add_argument('path', help='Recording directory')
+
+    export = commands.add_parser('export', help='Export a time range')
+    export.add_argument('path', help='Recording directory')
+    export.add_argument('--start', type=float, help='Start (s from the first frame)')
+    export.add_argument('--end', type=float, help='End (s from the first frame)')
+    export.add_argument('--session', help='Replay session directory to write')
+    export.add_argument('--thresholds', help='Thresholds for the session meta.json, as JSON')
+    export.add_argument('--video', help='Video file to write with ffmpeg')
+    export.add_argument('--codec', default='copy', help='ffmpeg video codec')
+
+    main(parser.parse_args())